@@ -1,11 +1,13 @@
-from flask import Flask, request, jsonify, render_template, session, redirect, g
+from flask import Flask, request, jsonify, render_template, session, redirect, g, stream_with_context
 from flask_babel import Babel, _
-from bcrypt import hashpw, gensalt, checkpw
 from dotenv import load_dotenv
 from pymongo import MongoClient
 from bson import ObjectId
-import os, re, requests, json
+import os, re, requests, json, threading, time
 from datetime import datetime
+import keylog, logstore, indexes, grade_cache, grading, regrade, passwords, mongo_clients, progress, metrics, similarity
+from executor_client import ExecutorClient, CircuitOpen
+from cache import TTLCache
 
 
 load_dotenv()
@@ -32,26 +34,89 @@ def format_timestamp(value):
 app.jinja_env.filters['format_timestamp'] = format_timestamp
 
 
-# 기본 DB 클라이언트 (ACTIVE 고정)
-DEFAULT_DB_CLIENT = MongoClient(os.getenv('ACTIVE'))
+# DB 클라이언트 레지스트리 (DB 키당 MongoClient 하나, 설정은 mongo_clients.py 참고)
+MONGO = mongo_clients.ClientRegistry(idle_timeout=float(os.getenv('MONGO_CLIENT_IDLE', '600')))
+DEFAULT_DB_CLIENT = MONGO.client('ACTIVE')  # 기본 DB (ACTIVE 고정)
 DEFAULT_DB = DEFAULT_DB_CLIENT['Codelog']
-DB_CLIENTS = {}  # 전역 dict: {'ACTIVE': MongoClient(...), 'ARCHIVE': MongoClient(...)}
 
 def get_db():
-    uri = session.get('db_uri')
-    if not uri:
-        uri = os.getenv('ACTIVE')  # fallback
-    if uri not in DB_CLIENTS:
-        DB_CLIENTS[uri] = MongoClient(uri)
-    return DB_CLIENTS[uri]['Codelog']
+    # 관리자가 /select_db 로 고른 DB (없으면 ACTIVE)
+    return MONGO.db(session.get('db_key') or 'ACTIVE')
+
+def get_db_by_key(db_key):
+    # 요청(session) 밖에서 쓰는 용도 (채점 스레드 등)
+    return MONGO.db(db_key)
+
+# 인덱스는 gunicorn 마스터가 시작할 때 한 번 적용한다 (gunicorn.conf.py 의 on_starting, indexes.py 참고)
 
 def get_collections():
     db_selected = get_db()  # responses 전용
     return DEFAULT_DB['Problems'], DEFAULT_DB['Sheets'], db_selected['Responses'], DEFAULT_DB['Students']
 
-# # 비밀번호 해시 생성 함수
+def get_log_chunks():
+    # 키 입력 로그 버킷 (Responses 와 같은 DB)
+    return get_db()[logstore.COLLECTION]
+
+def get_log_keyframes():
+    # 재생 탐색용 keyframe 색인 (Responses 와 같은 DB)
+    return get_db()[logstore.KEYFRAMES]
+
+# 문제/시트 조회 캐시 (alias -> 도큐먼트, 없으면 None). Problems/Sheets 는 항상 ACTIVE 기준.
+# 다른 워커에서 수정한 내용은 TTL 이 지나거나, CACHE_CHANGE_STREAM=1 이면 change stream 으로 바로 반영된다.
+PROBLEM_CACHE = TTLCache(int(os.getenv('CACHE_MAXSIZE', '1024')), float(os.getenv('CACHE_TTL', '30')))
+SHEET_CACHE = TTLCache(int(os.getenv('CACHE_MAXSIZE', '1024')), float(os.getenv('CACHE_TTL', '30')))
+CACHE_CHANGE_STREAM = os.getenv('CACHE_CHANGE_STREAM', '0') == '1'
+_cache_watcher_pid = None
+_cache_watcher_lock = threading.Lock()
+
+def find_problem(alias):
+    return PROBLEM_CACHE.get_or_load(alias, lambda a: DEFAULT_DB['Problems'].find_one({"alias": a}, {"_id": 0}))
+
+def find_sheets(aliases):
+    def load(missing):
+        return {sheet["alias"]: sheet for sheet in DEFAULT_DB['Sheets'].find({"alias": {"$in": missing}}, {"_id": 0})}
+    return SHEET_CACHE.get_many(aliases, load)
+
+def find_sheet(alias):
+    return find_sheets([alias])[alias]
+
+def _watch_cache_invalidation():
+    caches = {'Problems': PROBLEM_CACHE, 'Sheets': SHEET_CACHE}
+    while True:
+        try:
+            with DEFAULT_DB.watch([{'$match': {'ns.coll': {'$in': list(caches)}}}]) as stream:
+                # 감시 시작 전에 바뀐 내용이 남지 않도록 비우고 시작
+                for cache in caches.values():
+                    cache.invalidate()
+                for change in stream:
+                    # delete 이벤트에는 alias 가 없으므로 해당 컬렉션 캐시를 통째로 비운다
+                    caches[change['ns']['coll']].invalidate()
+        except Exception as e:
+            print(f"[cache] change stream stopped: {e}")
+            time.sleep(5)
+
+@app.before_request
+def start_cache_watcher():
+    # gunicorn 워커(프로세스)마다 감시 스레드 하나 (gthread 워커라 요청 스레드끼리 겹치지 않게 lock)
+    global _cache_watcher_pid
+    if not CACHE_CHANGE_STREAM or _cache_watcher_pid == os.getpid():
+        return
+    with _cache_watcher_lock:
+        if _cache_watcher_pid != os.getpid():
+            _cache_watcher_pid = os.getpid()
+            threading.Thread(target=_watch_cache_invalidation, daemon=True).start()
+
+# # 비밀번호 해시 생성 함수 (bcrypt 는 별도 프로세스 풀에서 실행)
 def hash_password(password):
-    return hashpw(password.encode('utf-8'), gensalt()).decode('utf-8')
+    return passwords.hash_password(password)
+
+def check_password(student, password):
+    """저장된 학생 도큐먼트와 비밀번호 대조. cost 가 바뀌었으면 새 해시로 교체한다."""
+    ok, new_hash = passwords.check_login(student['studentid'], student['name'], password, student['password'])
+    if new_hash:
+        DEFAULT_DB['Students'].update_one({"_id": student["_id"], "password": student["password"]},
+                                          {"$set": {"password": new_hash}})
+    return ok
 
 @app.route('/')
 def index():
@@ -74,8 +139,7 @@ def logout():
 @app.route('/get_problem')
 def get_problem():
     alias = request.args.get('alias')
-    collection, *_ = get_collections()
-    problem = collection.find_one({"alias": alias})
+    problem = find_problem(alias)
 
     if problem:
         return jsonify({
@@ -90,43 +154,50 @@ def get_problem():
     else:
         return jsonify({"error": _("Problem not found")}), 404
 
-def get_data(alias, studentid, name):
-    _, sheets_collection, _, _ = get_collections()
-    data = []
-    sheet = sheets_collection.find_one({'alias': alias})
-    problem_list = sheet["problem_list"] if sheet else [alias]
+def get_sheets_data(aliases, studentid, name, responses_collection, by_problem=False):
+    """alias(시트)별 문제 응답 목록을 만든다.
 
-    for problem_alias in problem_list:
-        documents = get_problem_data(problem_alias, studentid, name)
-        data.extend(documents)
-    return data
+    시트 조회(캐시에 없는 것만) 1번 + 응답 조회 1번으로 모든 alias 를 한꺼번에 처리한다.
+    반환값은 aliases 순서대로 [문제별 응답 dict 목록] 의 리스트이며, 응답이 없는 문제는 빈 항목 하나로 채운다.
+    by_problem=True 면 시트 구분 없이 문제 단위 목록의 리스트를 반환한다.
+    """
+    sheets = find_sheets(aliases)
+    problem_lists = [(sheets[alias] or {}).get("problem_list") or [alias] for alias in aliases]
+    problem_aliases = list({p for problem_list in problem_lists for p in problem_list})
 
-def get_problem_data(alias, studentid, name):
-    responses_collection = DEFAULT_DB["Responses"]
+    responses = {}
     cursor = responses_collection.find(
-        {'problem_alias': alias, 'sid': studentid, 'name': name},
-        {'_id': 1, 'timestamp': 1, 'content': 1, 'success': 1}
+        {'problem_alias': {'$in': problem_aliases}, 'sid': studentid, 'name': name},
+        {'_id': 1, 'problem_alias': 1, 'timestamp': 1, 'content': 1, 'success': 1}
     ).sort('_id', -1)
-
-    results = []
     for doc in cursor:
-        results.append({
+        responses.setdefault(doc['problem_alias'], []).append({
             '_id': str(doc['_id']),
-            'problem_alias': alias,
+            'problem_alias': doc['problem_alias'],
             'timestamp': doc.get('timestamp', ""),
             'content': doc.get('content', ""),
             'result': doc.get('success', "")
         })
 
-    if not results:
-        results.append({
-            '_id': None,
-            'problem_alias': alias,
-            'timestamp': "",
-            'content': "",
-            'result': ""
-        })
-    return results
+    empty = lambda problem_alias: {
+        '_id': None,
+        'problem_alias': problem_alias,
+        'timestamp': "",
+        'content': "",
+        'result': ""
+    }
+    data = []
+    for problem_list in problem_lists:
+        sheet_data = []
+        for problem_alias in problem_list:
+            results = responses.get(problem_alias) or [empty(problem_alias)]
+            if by_problem:
+                data.append(results)
+            else:
+                sheet_data.extend(results)
+        if not by_problem:
+            data.append(sheet_data)
+    return data
 
 
 @app.route('/create')
@@ -148,34 +219,69 @@ def add_problem():
     problem_data = request.json
     alias = problem_data.get('alias')
 
-    # alias 중복 여부 확인
-    existing_problem = collection.find_one({'alias': alias})
-    existing_sheet = sheets_collection.find_one({'alias': alias})
+    # alias 중복 여부 확인 (캐시에 있으면 DB 조회 없이 거절, 없다는 결과는 DB 로 다시 확인)
+    existing_problem = PROBLEM_CACHE.get(alias) or collection.find_one({'alias': alias})
+    existing_sheet = SHEET_CACHE.get(alias) or sheets_collection.find_one({'alias': alias})
     if existing_problem or existing_sheet:
         return jsonify({"error": "Alias already exists. Please use a unique alias."}), 400
 
     # 데이터 추가
     collection.insert_one(problem_data)
+    PROBLEM_CACHE.invalidate(alias)
     return jsonify({"message": "Problem successfully added!"}), 201
 
 def get_test_data(alias):
-    collection, *_ = get_collections()
-    # alias로 검색하며 필요한 필드만 가져옴
-    document = collection.find_one(
-        {"alias": alias},
-        {"test.input": 1, "test.output": 1, "lang": 1, "_id": 0}  # Projection: 필요한 필드만 가져옴
-    )
-
-    # 결과 처리
-    if document and "test" in document:
-        test_data = {
-            "input": document["test"].get("input", ""),
-            "output": document["test"].get("output", ""),
-            "lang": document.get("lang", "")
-        }
-        return test_data
-    else:
-        return None  # alias가 존재하지 않거나 테스트 데이터가 없는 경우
+    return grading.test_data(find_problem(alias))
+
+def grade_submission(problem_alias, content):
+    """채점해서 (success, output, debug) 를 반환. success 는 json.dumps 된 문자열("true"/"false"/"null").
+    테스트가 없는 문제는 ("null", None, ""), 실행기 호출이 실패하면 RuntimeError."""
+    test_data = get_test_data(problem_alias)
+    if not test_data:
+        return json.dumps(None), None, ""
+    result = execute_test(content, test_data)
+    if result is None:
+        raise RuntimeError("code executor is unavailable")
+    output, debug = grading.format_result(result)
+    return json.dumps(result["success"]), output, debug
+
+# 비동기 채점 (GRADE_ASYNC=0 이면 예전처럼 save_response 안에서 바로 채점)
+GRADE_ASYNC = os.getenv('GRADE_ASYNC', '1') == '1'
+
+def get_grade_jobs():
+    return DEFAULT_DB[grading.COLLECTION]
+
+GRADE_WORKERS = grading.GradeWorkers(
+    get_grade_jobs(),
+    lambda job: grade_submission(job["problem_alias"], job["content"]),
+    lambda db_key: get_db_by_key(db_key)['Responses'],
+    threads=int(os.getenv('GRADE_WORKERS', '2')),
+    lease=int(os.getenv('GRADE_LEASE', '60')),
+    max_attempts=int(os.getenv('GRADE_MAX_ATTEMPTS', '3')),
+)
+
+@app.before_request
+def start_grade_workers():
+    if GRADE_ASYNC:
+        GRADE_WORKERS.start()
+
+@app.route('/grade_status')
+def grade_status():
+    # 비동기 채점 결과 조회 (클라이언트가 success 가 pending 이 아닐 때까지 폴링)
+    *x, responses_collection, x = get_collections()
+    try:
+        response_id = ObjectId(request.args.get('id'))
+    except Exception:
+        return jsonify({"error": "Invalid _id format"}), 400
+    document = responses_collection.find_one({"_id": response_id}, {"success": 1, "output": 1, "grade_job": 1})
+    if not document:
+        return jsonify({"error": "No document found with the provided _id"}), 404
+    success = document.get("success")
+    debug = ""
+    if success != grading.PENDING and document.get("grade_job") and 'login' in session and session['login'] in admin_list:
+        job = get_grade_jobs().find_one({"_id": document["grade_job"]}, {"debug": 1})
+        debug = (job or {}).get("debug", "")
+    return jsonify({"success": success, "pending": success == grading.PENDING, "output": document.get("output"), "debug": debug})
 
 @app.route('/save_response', methods=['POST'])
 def save_response():
@@ -185,43 +291,57 @@ def save_response():
         data = request.get_json()
         problemalias = data.get('problem_alias')
 
-        # 채점 가능하면 채점하기
-        test_data = get_test_data(problemalias)
-        if test_data:
-            result = execute_test(data['content'],test_data)
-            success = result["success"]
-            if 'login' in session and session['login'] in admin_list:
-                debug = str(
-                    '\n<div class="debug-text">'
-                    "----------\ntest debug\n----------"
-                    "\n<code>stdout:</code>\n" + result["stdout"] +
-                    "\n<code>stderr:</code>\n" + result["stderr"] +
-                    "\n<code>test output:</code>\n" + test_data["output"] +
-                    "\n<code>test code:</code>\n" + result["code"] +
-                    "\n</div>"
-                )
-            else:
-                debug = ""
-            output = str (
-                "\n<code>stdout:</code>\n" + result["stdout"] +
-                "\n<code>stderr:</code>\n" + result["stderr"] +
-                "\n<code>test output:</code>\n" + test_data["output"]
-                )
-        else:
-            debug = ""
-            success = None
-            output = None
-            result = {
-                "stdout": "",
-                "stderr": "",
-                "code": ""
-            }
-            test_data = {
-                "output": ""
-            }
-        success = json.dumps(success)
+        # 로그 형식 검사 후 keyframe + delta 형식으로 압축 (예전 형식으로 보내도 변환됨)
+        try:
+            keylog.validate_log(data.get('log', []))
+        except keylog.LogFormatError as e:
+            return jsonify({"error": str(e)}), 400
+        data['log'] = keylog.encode_log(data.get('log', []))
+        log_from = data.get('log_from', 0)
+        if not isinstance(log_from, int) or isinstance(log_from, bool) or log_from < 0:
+            return jsonify({"error": "log_from must be a non-negative integer"}), 400
+
+        is_admin = 'login' in session and session['login'] in admin_list
         # 유효성 검사: _id 필드 확인 (업데이트할 도큐먼트 식별용)
         document_id = data.get('_id')
+        response_id = ObjectId(document_id) if document_id else ObjectId()
+
+        if GRADE_ASYNC and get_test_data(problemalias):
+            # 채점은 채점 스레드에 맡기고 pending 으로 먼저 저장 (작업은 저장에 성공한 뒤 등록)
+            grade_job = ObjectId()
+            success, output, debug = grading.PENDING, None, ""
+        else:
+            # 채점 가능하면 채점하기
+            grade_job = None
+            success, output, debug = grade_submission(problemalias, data['content'])
+            if not is_admin:
+                debug = ""
+
+        def after_save(log_replaced=False):
+            # 현황판용 최신 판정 갱신 (pending 이면 채점 스레드가 끝난 뒤 다시 갱신)
+            progress.record(responses_collection.database[progress.COLLECTION], data['sid'], data['name'],
+                            problemalias, response_id, success)
+            # 행동 지표는 새로 저장된 로그만 읽어 누적 (실패해도 저장은 성공으로 둔다)
+            try:
+                metrics.update(responses_collection, get_log_chunks(), response_id, reset=log_replaced)
+            except Exception as e:
+                print(f"[save_response] metrics update failed for {response_id}: {e}")
+            # 재생 탐색용 keyframe 을 새로 저장된 구간만 이어서 색인 (첫 /get_snapshot 에서 전체를 훑지 않도록)
+            try:
+                logstore.build_keyframes(responses_collection, get_log_chunks(), get_log_keyframes(), response_id)
+            except Exception as e:
+                print(f"[save_response] keyframe indexing failed for {response_id}: {e}")
+            # 유사도 색인 (content 가 바뀐 경우만 다시 계산)
+            try:
+                similarity.update(responses_collection.database[similarity.COLLECTION], response_id, problemalias,
+                                  data['sid'], data['name'], data['content'],
+                                  (find_problem(problemalias) or {}).get("lang"))
+            except Exception as e:
+                print(f"[save_response] similarity update failed for {response_id}: {e}")
+            if grade_job:
+                grading.enqueue(get_grade_jobs(), grade_job, response_id, session.get('db_key') or 'ACTIVE',
+                                problemalias, data['content'])
+                GRADE_WORKERS.notify()
         # ================================
         # 요청 정보 프린트
         print(f"[save_response] sid: {data.get('sid')}, log_len: {len(data.get('log', []))}, timestamp: {data.get('timestamp')}")
@@ -231,37 +351,45 @@ def save_response():
             # _id 값을 ObjectId로 변환
             document_id = ObjectId(document_id)
 
-            # 기존 도큐먼트 업데이트 (log 필드 업데이트)
-            result = responses_collection.update_one(
-                {"_id": document_id},
-                {
-                    "$set": {
-                        "sid": data['sid'],
-                        "name": data['name'],
-                        "content": data['content'],
-                        "timestamp": data['timestamp'],
-                        "success": success,
-                        "output": output,
-                        "log": data['log'],
-                    }
-                }
-            )
-            # 업데이트 결과 확인
-            if result.matched_count > 0:
-                return jsonify({"success":success, "debug":debug, "message": _("Answer updated"), "_id": {"$oid": str(document_id)}}), 200
+            fields = {
+                "sid": data['sid'],
+                "name": data['name'],
+                "content": data['content'],
+                "timestamp": data['timestamp'],
+                "success": success,
+                "output": output,
+                "grade_job": grade_job,  # 이전 저장의 채점 작업이 이 판정을 덮어쓰지 않도록
+            }
+            if 'log_from' in data:
+                # 증분 동기화: 마지막으로 저장된 위치(log_from) 이후 항목만 이어 붙임
+                status, log_len = logstore.append(responses_collection, get_log_chunks(), document_id, data['log_from'], data['log'], fields)
+                if status == "conflict":
+                    return jsonify({"error": _("Log is out of sync"), "log_len": log_len}), 409
+                if status == "ok":
+                    after_save()
+                    return jsonify({"success":success, "debug":debug, "message": _("Answer updated"), "_id": {"$oid": str(document_id)}, "log_len": log_len}), 200
+            else:
+                # 기존 도큐먼트 업데이트 (로그 전체 교체, 예전 클라이언트용)
+                if logstore.replace(responses_collection, get_log_chunks(), document_id, data['log'], fields):
+                    after_save(log_replaced=True)
+                    return jsonify({"success":success, "debug":debug, "message": _("Answer updated"), "_id": {"$oid": str(document_id)}, "log_len": len(data['log'])}), 200
+            return jsonify({"error": _("Failed to save the answer")}), 404
         else:
             # local이면 data에서 _id 항목 삭제
             if '_id' in data:
                 del data['_id']
-            # 업데이트할 도큐먼트가 없으면 새로운 도큐먼트 생성
+            data.pop('log_from', None)
+            # 업데이트할 도큐먼트가 없으면 새로운 도큐먼트 생성 (로그는 LogChunks 에 먼저 저장)
+            data["_id"] = response_id
+            log = data.pop('log')
+            logstore.write_entries(get_log_chunks(), data["_id"], 0, log)
             data["success"] = success
-            data["output"] = str (
-                "\n<code>stdout:</code>\n" + result["stdout"] +
-                "\n<code>stderr:</code>\n" + result["stderr"] +
-                "\n<code>test output:</code>\n" + test_data["output"]
-                )
+            data["log_len"] = len(log)
+            data["output"] = output
+            data["grade_job"] = grade_job
             result = responses_collection.insert_one(data)
-            return jsonify({"success":success, "debug":debug, "message": _("New answer created"), "_id": {"$oid": str(result.inserted_id)}}), 200
+            after_save()
+            return jsonify({"success":success, "debug":debug, "message": _("New answer created"), "_id": {"$oid": str(result.inserted_id)}, "log_len": data["log_len"]}), 200
     except Exception as e:
         print(f"[save_response][ERROR] sid: {data.get('sid', 'N/A')}, log_len: {len(data.get('log', []))}, timestamp: {data.get('timestamp', 'N/A')}")
         print(_("Error occurred while saving answer: "), e)
@@ -269,34 +397,104 @@ def save_response():
 
 @app.route('/get_log', methods=['GET'])
 def get_log():
+    """키 입력 로그 조회.
+
+    - from_idx / to_idx : 로그 위치 범위 (to_idx 는 포함하지 않음)
+    - from_ts / to_ts   : timestamp 범위 (ms, 양끝 포함)
+    - meta=1            : 로그 대신 항목 수, 시간 범위, content 길이 범위만 반환
+    - stream=ndjson     : 한 줄에 항목 하나씩 (기본값은 JSON 배열을 조각내어 전송)
+    - format=compact    : 풀지 않고 저장된 압축 형식 그대로 (범위 지정 없이 전체만)
+    """
     *_, responses_collection, _ = get_collections()
     mongo_id = request.args.get('id')
     if not mongo_id:
         return jsonify({"error": "No MongoDB _id provided"}), 400
 
     try:
-        # Find the document by _id
-        from bson.objectid import ObjectId
-        document = responses_collection.find_one({"_id": ObjectId(mongo_id)})
-        if document is None:
+        document_id = ObjectId(mongo_id)
+        from_idx = request.args.get('from_idx', 0, type=int)
+        to_idx = request.args.get('to_idx', None, type=int)
+        from_ts = request.args.get('from_ts', None, type=float)
+        to_ts = request.args.get('to_ts', None, type=float)
+        chunks = get_log_chunks()
+
+        if request.args.get('format') == 'compact':
+            log = logstore.load_log(responses_collection, chunks, document_id)
+            if log is None:
+                return jsonify({"error": "No document found with the provided _id"}), 404
+            return jsonify(log)
+
+        entries = logstore.iter_log(responses_collection, chunks, document_id,
+                                    from_idx=max(from_idx, 0), to_idx=to_idx, from_ts=from_ts, to_ts=to_ts)
+        if entries is None:
             return jsonify({"error": "No document found with the provided _id"}), 404
 
-        # Return the log data
-        return jsonify(document.get("log", []))
+        if request.args.get('meta') in ('1', 'true'):
+            return jsonify(logstore.log_meta(entries))
+
+        if request.args.get('stream') == 'ndjson':
+            def generate_ndjson():
+                for _position, entry in entries:
+                    yield json.dumps(entry, ensure_ascii=False) + "\n"
+            return app.response_class(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+
+        def generate_json():
+            yield "["
+            first = True
+            for _position, entry in entries:
+                yield ("" if first else ",") + json.dumps(entry, ensure_ascii=False)
+                first = False
+            yield "]"
+        return app.response_class(stream_with_context(generate_json()), mimetype='application/json')
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
+@app.route('/get_snapshot', methods=['GET'])
+def get_snapshot():
+    """idx(로그 위치) 또는 ts(ms) 시점의 코드를 가장 가까운 keyframe 에서 재구성해 반환"""
+    *x, responses_collection, x = get_collections()
+    mongo_id = request.args.get('id')
+    idx = request.args.get('idx', None, type=int)
+    ts = request.args.get('ts', None, type=float)
+    if not mongo_id:
+        return jsonify({"error": "No MongoDB _id provided"}), 400
+    if (idx is None) == (ts is None):
+        return jsonify({"error": "Provide exactly one of idx or ts"}), 400
+
+    try:
+        result = logstore.snapshot(responses_collection, get_log_chunks(), get_log_keyframes(),
+                                   ObjectId(mongo_id), idx=idx, ts=ts)
+        if result is None:
+            return jsonify({"error": "No document found with the provided _id"}), 404
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/get_metrics', methods=['GET'])
+def get_metrics():
+    """응답 하나의 행동 지표 (metrics.py 참고). 아직 계산되지 않았으면 지금 계산해서 저장한다."""
+    *x, responses_collection, x = get_collections()
+    try:
+        response_id = ObjectId(request.args.get('id'))
+    except Exception:
+        return jsonify({"error": "Invalid _id format"}), 400
+    document = responses_collection.find_one({"_id": response_id}, {"metrics": 1})
+    if document is None:
+        return jsonify({"error": "No document found with the provided _id"}), 404
+    result = document.get("metrics")
+    if not result or result.get("version") != metrics.VERSION:
+        result = metrics.update(responses_collection, get_log_chunks(), response_id)
+    return jsonify(metrics.summary(result))
+
 @app.route('/get_sheet', methods=['GET'])
 def get_sheet():
-    x, sheets_collection, *x = get_collections()
-
     alias = request.args.get('alias')
 
     if not alias:
         return jsonify({"error": _("Alias parameter is missing")}), 400
 
     # alias를 기준으로 Sheets 컬렉션에서 문제 목록을 검색
-    sheet = sheets_collection.find_one({"alias": alias})
+    sheet = find_sheet(alias)
 
     if sheet and "problem_list" in sheet:
         return jsonify({"problem_list": sheet["problem_list"]})
@@ -319,10 +517,7 @@ def login():
         studentid = session['login']['studentid']
         name = session['login']['name']
         aliases = get_aliases(studentid, name)
-        for alias in aliases :
-            data = get_data(alias, studentid, name)
-            if (data and data != []):
-                sheets_response.append(data)
+        sheets_response = get_sheets_data(aliases, studentid, name, DEFAULT_DB["Responses"])
         number = len(aliases)
         return render_template("log.html", 
                             message = message, 
@@ -342,9 +537,15 @@ def login():
             # 학생 정보 확인
             existing_student = students_collection.find_one({"studentid": studentid, "name": name})
 
+            try:
+                password_ok = check_password(existing_student, password) if existing_student else None
+                hashed_password = None if existing_student else hash_password(password)
+            except passwords.PasswordBusy:
+                return render_template("log.html", message = _("Too many login attempts right now. Please try again shortly."),
+                                       studentid = "", name = "", sheets = [], number = 0, password = "")
             if existing_student:
                 # 비밀번호 대조
-                if checkpw(password.encode('utf-8'), existing_student['password'].encode('utf-8')):
+                if password_ok:
                     # 로그인 성공 시 alias 리스트 반환
                     aliases = get_aliases(studentid, name)
                     message = _("Login successful!")
@@ -357,19 +558,17 @@ def login():
                     name=""
             else:
                 # 새로운 학생 등록
-                hashed_password = hash_password(password)
                 new_student = {
                     "studentid": studentid,
                     "name": name,
                     "password": hashed_password
                 }
                 students_collection.insert_one(new_student)
+                passwords.remember(studentid, name, password, hashed_password)
                 aliases = get_aliases(studentid, name)
                 message = _("Account created and logged in successfully!")
                 session["login"] = {"studentid": studentid, "name": name}
-            for alias in aliases :
-                data = get_data(alias, studentid, name)
-                sheets_response.append(data)
+            sheets_response = get_sheets_data(aliases, studentid, name, DEFAULT_DB["Responses"])
             number = len(aliases)
     return render_template("log.html", 
                             message = message, 
@@ -382,59 +581,37 @@ def login():
 def get_aliases(studentid, name):
     
     *_, responses_collection, _ = get_collections()
-    documents = responses_collection.find(
-    {"sid": studentid, "name": name},
-    {"_id": 0, "alias": 1}  # Projection: alias 필드만 반환
-    )
-
-    aliases = set()
-    for doc in documents:
-        if "alias" in doc:
-            aliases.add(doc["alias"])
-    aliases = list(aliases)
-    aliases.sort()
-    return aliases
+    # 서버에서 중복 제거 (응답 도큐먼트를 하나씩 가져오지 않음)
+    aliases = responses_collection.distinct("alias", {"sid": studentid, "name": name})
+    return sorted(alias for alias in aliases if alias is not None)
 
 def check_single(s):
     # 정규식: 영어 소문자, 숫자, 그리고 특수문자로만 이루어진 문자열 검사
     return bool(re.fullmatch(r'(?=.*[a-z])[a-z0-9!@#$%^&*(),.?":{}|<>\-_]+', s))
 
-def c_test_insert(source_code, insert_string):
-    # 'int main' 패턴을 찾는 정규식 (다양한 스타일 지원)
-    pattern = r"(.*?)(int\s+main\s*\(\s*(?:void)?\s*\)\s*\{)([\s\S]*?)(^\})\s*(.*)"
-
-    match = re.search(pattern, source_code, re.DOTALL | re.MULTILINE)
-    
-    if match:
-        # 그룹화된 부분 추출
-        before_main = match.group(1)  # 'int main()' 앞의 모든 코드
-        main_signature = match.group(2).strip()  # 'int main(void) {' (공백 제거)
-        main_body = match.group(3).strip()  # '{...}' 내부 코드 (공백 제거)
-        closing_brace = match.group(4)  # '}' 닫는 중괄호 (줄바꿈 포함)
-        after_main = match.group(5)  # '}' 이후의 모든 코드
-
-        # `return` 문 찾기
-        return_match = re.search(r"^\s*(return\s+[^;]+;)", main_body, re.MULTILINE)
-
-        if return_match:
-            # `return` 문을 찾아 저장 후 삭제
-            return_statement = return_match.group(1)
-            main_body = re.sub(r"^\s*return\s+[^;]+;", "", main_body, flags=re.MULTILINE).strip()
-
-            # 새로운 코드 삽입 후 return 추가
-            updated_main_body = main_body + "printf(\"\\n\"); //test code begins"+"\n" + insert_string + "\n" + return_statement
-        else:
-            # `return`이 없는 경우 그냥 추가
-            updated_main_body = main_body + "\nprintf(\"\\n\"); //test code begins"+"\n" + insert_string
-
-        # 최종 코드 조합
-        return f"{before_main}{main_signature}\n{updated_main_body}\n{closing_brace}{after_main}"
-    else:
-        return source_code  # 패턴이 없으면 원본 반환
-
 
 LAMBDA_BASE_URL = os.getenv("LAMBDA_BASE_URL")
 
+# lambda-lite 호출용 공유 클라이언트 (keep-alive 연결 풀 + 연결 오류 재시도 + circuit breaker)
+# 풀 크기 기본값: gunicorn gthread 워커 1개가 동시에 내보내는 호출 수 = 요청 처리 스레드 수 + 채점 스레드 수
+# (GUNICORN_THREADS 는 gunicorn.conf.py 와 같은 환경 변수)
+EXECUTOR = ExecutorClient(
+    LAMBDA_BASE_URL,
+    pool_size=int(os.getenv('LAMBDA_POOL_SIZE', str(int(os.getenv('GUNICORN_THREADS', '8'))
+                                                    + int(os.getenv('GRADE_WORKERS', '2'))))),
+    connect_timeout=float(os.getenv('LAMBDA_CONNECT_TIMEOUT', '2')),
+    read_timeout=float(os.getenv('LAMBDA_READ_TIMEOUT', '15')),
+    retries=int(os.getenv('LAMBDA_CONNECT_RETRIES', '2')),
+    failure_threshold=int(os.getenv('LAMBDA_FAILURE_THRESHOLD', '5')),
+    reset_after=float(os.getenv('LAMBDA_RESET_AFTER', '10')),
+)
+
+# 채점 결과 캐시 (같은 문제 + 같은 최종 코드면 lambda-lite 호출 생략)
+GRADE_CACHE = grade_cache.GradeCache(
+    TTLCache(int(os.getenv('GRADE_CACHE_MAXSIZE', '4096')), float(os.getenv('GRADE_CACHE_TTL', '3600'))),
+    DEFAULT_DB[grade_cache.COLLECTION] if os.getenv('GRADE_CACHE_SHARED', '0') == '1' else None,
+)
+
 @app.route("/api/lambda/invoke", methods=["POST"])
 def proxy_lambda_invoke():
     if not request.is_json:
@@ -443,11 +620,7 @@ def proxy_lambda_invoke():
     payload = request.get_json()
 
     try:
-        resp = requests.post(
-            f"{LAMBDA_BASE_URL}/invoke",
-            json=payload,
-            timeout=10
-        )
+        resp = EXECUTOR.post("/invoke", payload)
 
         return (
             resp.text,
@@ -455,6 +628,12 @@ def proxy_lambda_invoke():
             {"Content-Type": resp.headers.get("Content-Type", "application/json")}
         )
 
+    except CircuitOpen as e:
+        # 실행기가 과부하/장애 상태: 기다리지 않고 바로 거절
+        return jsonify({
+            "error": "Lambda service unavailable",
+            "detail": str(e)
+        }), 503, {"Retry-After": str(int(EXECUTOR.reset_after))}
     except requests.exceptions.RequestException as e:
         return jsonify({
             "error": "Lambda service unavailable",
@@ -463,46 +642,24 @@ def proxy_lambda_invoke():
 
 
 def execute_test(code, test_data):
-    input = test_data["input"]
-    output = test_data["output"]
-    lang = test_data["lang"]
-    if (lang=='c'):
-        code = c_test_insert(code, input)
-        # print(code)
-    else:
-        code  = code+"\n"+input
-    # Lambda Function URL
-    url = f"{LAMBDA_BASE_URL}/invoke"
+    """테스트 케이스로 채점 (반환 형식은 judge 참고). 실행기 호출이 실패하면 None."""
+    # 같은 테스트 버전 + 같은 코드면 이전 판정 재사용
+    cache_key = grade_cache.key(grade_cache.test_version(test_data), test_data["lang"], code)
+    cached = GRADE_CACHE.get(cache_key)
+    if cached:
+        return cached
 
     # 요청 데이터
-    payload = {
-        "code": code,
-        "language": lang
-    }
+    payload, codes = grading.test_payload(code, test_data)
     try:
-        # POST 요청 보내기
-        response = requests.post(
-            url,
-            headers={
-                "Content-Type": "application/json"  # JSON 데이터 형식 명시
-            },
-            data=json.dumps(payload)  # JSON 형식으로 데이터 직렬화
-        )
+        # POST 요청 보내기 (공유 연결 풀 사용)
+        response = EXECUTOR.post("/invoke", payload)
         # 응답 상태 확인
         if response.status_code == 200:
-            # JSON 응답 파싱
-            data = response.json()
-            lambda_output = data.get('stdout')  # Lambda에서 반환된 출력
-            def normalize(text):
-                """불필요한 공백과 줄바꿈을 제거하고, 텍스트를 비교-friendly하게 변환"""
-                return re.sub(r'\s+', '', text).strip()  # 연속된 공백을 단일 공백으로 변환
-            normal_output = normalize(output)
-            normal_lambda_output = normalize(lambda_output)
-            # print(normal_output)
-            # print(normal_lambda_output)
-            data["success"] = normalize(normal_lambda_output).endswith(normal_output)
-            data["code"] = code
-            # 결과 비교
+            # JSON 응답 파싱 후 결과 비교
+            data = grading.judge(response.json(), codes, test_data)
+            if grade_cache.cacheable(data):
+                GRADE_CACHE.put(cache_key, data)
             return data
         else:
             print(f"HTTP error! Status code: {response.status_code}, Response: {response.text}")
@@ -511,6 +668,55 @@ def execute_test(code, test_data):
         print("Error calling Lambda Function:", e)
         return None
     
+def make_grader(problem_alias):
+    """regrade 용 채점기 (테스트가 없는 문제면 None). 방금 고친 테스트를 쓰도록 캐시를 거치지 않는다."""
+    PROBLEM_CACHE.invalidate(problem_alias)
+    return grading.make_grader(get_test_data(problem_alias), EXECUTOR)
+
+def get_regrade_jobs():
+    return DEFAULT_DB[regrade.COLLECTION]
+
+@app.route('/admin/regrade', methods=['POST'])
+def admin_regrade():
+    # 선택한 DB(select_db)의 Responses 중 problem_alias 를 모두 재채점. {"problem_alias"} 또는 {"resume": 작업 id}
+    if not ('login' in session and session['login'] in admin_list):
+        return jsonify({"error": "not admin"}), 403
+    data = request.get_json() or {}
+    jobs = get_regrade_jobs()
+    if data.get("resume"):
+        try:
+            job = jobs.find_one({"_id": ObjectId(data["resume"])})
+        except Exception:
+            return jsonify({"error": "Invalid _id format"}), 400
+        if job is None:
+            return jsonify({"error": "No regrade job found"}), 404
+        job_id, problem_alias, db_key = job["_id"], job["problem_alias"], job["db_key"]
+    else:
+        problem_alias = data.get("problem_alias")
+        if not problem_alias:
+            return jsonify({"error": "problem_alias is required"}), 400
+        db_key = session.get('db_key') or 'ACTIVE'
+        job_id = None
+    grader = make_grader(problem_alias)
+    if grader is None:
+        return jsonify({"error": "Problem has no test data"}), 400
+    if job_id is None:
+        job_id = regrade.create(jobs, problem_alias, db_key)
+    regrade.start_background(jobs, job_id, get_db_by_key(db_key)['Responses'], grader)
+    return jsonify({"job_id": str(job_id), "problem_alias": problem_alias, "db": db_key}), 202
+
+@app.route('/admin/regrade_status')
+def admin_regrade_status():
+    if not ('login' in session and session['login'] in admin_list):
+        return jsonify({"error": "not admin"}), 403
+    try:
+        job = get_regrade_jobs().find_one({"_id": ObjectId(request.args.get('id'))})
+    except Exception:
+        return jsonify({"error": "Invalid _id format"}), 400
+    if job is None:
+        return jsonify({"error": "No regrade job found"}), 404
+    return jsonify(regrade.status(job))
+
 @app.route('/code_login', methods=['POST'])
 def code_login():
     *x, students_collection = get_collections()
@@ -535,9 +741,15 @@ def code_login():
         # 학생 정보 확인
         existing_student = students_collection.find_one({"studentid": studentid, "name": name})
 
+        try:
+            password_ok = check_password(existing_student, password) if existing_student else None
+            hashed_password = None if existing_student else hash_password(password)
+        except passwords.PasswordBusy:
+            return jsonify({"message": _("Too many login attempts right now. Please try again shortly."), "status": "fail"}), 503
+
         if existing_student:
             # 비밀번호 대조
-            if checkpw(password.encode('utf-8'), existing_student['password'].encode('utf-8')):
+            if password_ok:
                 # 로그인 성공 시 alias 리스트 반환
                 message = _("Login successful!")
                 status = "success"
@@ -547,14 +759,13 @@ def code_login():
                 status = "fail"
         else:
             # 새로운 학생 등록
-            hashed_password = hash_password(password)
-
             new_student = {
                 "studentid": studentid,
                 "name": name,
                 "password": hashed_password
             }
             students_collection.insert_one(new_student)
+            passwords.remember(studentid, name, password, hashed_password)
             message = _("Account created and logged in successfully!")
             status = "success"
         data = {
@@ -597,14 +808,15 @@ def add_sheet():
         "problem_list": problem_list
     }
 
-    existing_problem = collection.find_one({'alias': alias})
-    existing_sheet = sheets_collection.find_one({'alias': alias})
+    existing_problem = PROBLEM_CACHE.get(alias) or collection.find_one({'alias': alias})
+    existing_sheet = SHEET_CACHE.get(alias) or sheets_collection.find_one({'alias': alias})
 
     if existing_problem or existing_sheet:
         return jsonify({"error": "Alias already exists. Please use a unique alias."}), 400
 
     try:
         sheets_collection.insert_one(sheet_data)  # Insert into MongoDB
+        SHEET_CACHE.invalidate(alias)
         return jsonify({'message': 'Sheet successfully added!'})
     except Exception as e:
         return jsonify({'error': f'An error occurred: {str(e)}'}), 500
@@ -678,24 +890,86 @@ def search():
     problem_aliases = responses_collection.distinct("problem_alias", {"alias": alias})
     return render_template("list.html", problem_aliases=problem_aliases)
 
+# /get_responses 페이지 크기와 돌려줄 수 있는 필드
+RESPONSES_PAGE = int(os.getenv('RESPONSES_PAGE', '100'))
+RESPONSES_PAGE_MAX = int(os.getenv('RESPONSES_PAGE_MAX', '500'))
+RESPONSE_FIELDS = ("sid", "name", "content", "success", "output", "timestamp")
+RESPONSE_FIELDS_ALLOWED = RESPONSE_FIELDS + ("alias", "problem_alias", "log_len", "metrics")
+
 # 특정 problem_alias에 대한 데이터 반환
 @app.route("/get_responses", methods=["GET"])
 def get_responses():
+    """문제 하나의 응답 목록 (최신순, _id 기준 keyset 페이지).
+    - problem_alias : 필수
+    - limit         : 한 페이지 응답 수 (기본 RESPONSES_PAGE, 최대 RESPONSES_PAGE_MAX)
+    - after         : 이전 응답 헤더의 X-Next-Cursor 값 (그보다 오래된 응답부터)
+    - fields        : 돌려줄 필드 (쉼표 구분, 기본 sid,name,content,success,output,timestamp)
+    - latest=1      : 학생(sid, name)마다 가장 최근 응답 하나만
+    - count=1       : 전체 개수를 X-Total-Count 헤더로 (latest=1 이면 학생 수)
+    다음 페이지가 있으면 X-Next-Cursor 헤더를 주고, 본문은 JSON 배열을 조각내어 전송한다.
+    """
     *_, responses_collection,_ = get_collections()
 
     problem_alias = request.args.get("problem_alias")
     if not problem_alias:
         return jsonify([])
 
-    # 해당 problem_alias의 데이터 검색
-    responses = responses_collection.find({"problem_alias": problem_alias}, {"_id": 1, "sid":1, "name": 1, "content": 1, "success": 1, "output":1, "timestamp": 1})
-    
-    # ObjectId를 문자열로 변환하여 리스트 생성
-    response_list = [
-        {**doc, "_id": str(doc["_id"])} for doc in responses
-    ]
-
-    return jsonify(response_list)
+    limit = request.args.get("limit", RESPONSES_PAGE, type=int)
+    if limit is None or limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    limit = min(limit, RESPONSES_PAGE_MAX)
+    fields = request.args.get("fields")
+    fields = [f for f in fields.split(",") if f] if fields else list(RESPONSE_FIELDS)
+    unknown = [f for f in fields if f not in RESPONSE_FIELDS_ALLOWED]
+    if unknown:
+        return jsonify({"error": f"unknown fields: {', '.join(unknown)}"}), 400
+    try:
+        after = ObjectId(request.args["after"]) if request.args.get("after") else None
+    except Exception:
+        return jsonify({"error": "invalid cursor"}), 400
+    latest = request.args.get("latest") in ("1", "true")
+
+    # 1) 이번 페이지의 _id 만 먼저 뽑는다 (인덱스만 읽음) -> 다음 커서를 헤더에 넣을 수 있음
+    query = {"problem_alias": problem_alias}
+    if latest:
+        # (problem_alias, sid, name, _id desc) 인덱스 순서대로 읽으면 학생마다 첫 _id 가 최신 응답
+        pipeline = [
+            {"$match": query},
+            {"$sort": {"sid": 1, "name": 1, "_id": -1}},
+            {"$group": {"_id": {"sid": "$sid", "name": "$name"}, "latest": {"$first": "$_id"}}},
+            {"$sort": {"latest": -1}},
+        ]
+        if after:
+            pipeline.append({"$match": {"latest": {"$lt": after}}})
+        pipeline.append({"$limit": limit + 1})
+        ids = [d["latest"] for d in responses_collection.aggregate(pipeline)]
+    else:
+        page = {**query, "_id": {"$lt": after}} if after else query
+        ids = [d["_id"] for d in responses_collection.find(page, {"_id": 1}).sort("_id", -1).limit(limit + 1)]
+
+    headers = {}
+    if len(ids) > limit:
+        ids = ids[:limit]
+        headers["X-Next-Cursor"] = str(ids[-1])
+    if request.args.get("count") in ("1", "true"):
+        if latest:
+            counted = list(responses_collection.aggregate([
+                {"$match": query}, {"$group": {"_id": {"sid": "$sid", "name": "$name"}}}, {"$count": "n"}]))
+            headers["X-Total-Count"] = str(counted[0]["n"] if counted else 0)
+        else:
+            headers["X-Total-Count"] = str(responses_collection.count_documents(query))
+
+    # 2) 본문은 도큐먼트를 읽는 대로 내보냄 (목록 전체를 메모리에 올리지 않음)
+    def generate_json():
+        yield "["
+        first = True
+        cursor = responses_collection.find({"_id": {"$in": ids}}, {f: 1 for f in fields}).sort("_id", -1).batch_size(50)
+        for doc in cursor:
+            doc["_id"] = str(doc["_id"])
+            yield ("" if first else ",") + json.dumps(doc, ensure_ascii=False, default=str)
+            first = False
+        yield "]"
+    return app.response_class(stream_with_context(generate_json()), mimetype='application/json', headers=headers)
 
 @app.route('/update_problem', methods=['POST'])
 def update_problem():
@@ -719,6 +993,7 @@ def update_problem():
 
     # Upsert: 기존 문서는 업데이트, 없으면 삽입
     collection.update_one({"alias": data["alias"]}, {"$set": problem}, upsert=True)
+    PROBLEM_CACHE.invalidate(data["alias"])
     return jsonify({"message": "Problem successfully updated!"})
 
 @app.context_processor
@@ -729,6 +1004,99 @@ def inject_is_admin():
     else:
         return {'is_admin': False}
 
+@app.route('/admin/cache_stats')
+def cache_stats():
+    # 현재 워커 프로세스의 캐시 통계 (워커마다 따로 집계됨)
+    if not ('login' in session and session['login'] in admin_list):
+        return jsonify({"error": "not admin"}), 403
+    return jsonify({
+        "pid": os.getpid(),
+        "change_stream": CACHE_CHANGE_STREAM,
+        "problems": PROBLEM_CACHE.stats(),
+        "sheets": SHEET_CACHE.stats(),
+        "grades": GRADE_CACHE.stats(),
+        "grading": GRADE_WORKERS.stats() if GRADE_ASYNC else None,
+        "executor": EXECUTOR.stats(),
+        "passwords": passwords.VERIFIED.stats(),
+    })
+
+@app.route('/admin/progress')
+def admin_progress():
+    """시트 × 학생 현황판. aliases=sm0,sm1,... (sids=... 를 주면 그 학생만, 응답이 없어도 포함)
+    상태는 danger(안 푼 문제 있음) / warning(틀린 문제 있음) / success. Progress 를 한 번만 조회한다."""
+    if not ('login' in session and session['login'] in admin_list):
+        return jsonify({"error": "not admin"}), 403
+    aliases = [a for a in request.args.get("aliases", "").split(",") if a]
+    if not aliases:
+        return jsonify({"error": "aliases is required"}), 400
+    sids = [s for s in request.args.get("sids", "").split(",") if s]
+    sheets = find_sheets(aliases)
+    sheet_problems = [(alias, (sheets[alias] or {}).get("problem_list") or [alias]) for alias in aliases]
+    return jsonify(progress.matrix(get_db()[progress.COLLECTION], sheet_problems, sids))
+
+@app.route('/admin/similar')
+def admin_similar():
+    """같은 문제에서 이 응답(id)과 비슷한 다른 학생 응답 상위 k 개 (similarity.py 참고)"""
+    if not ('login' in session and session['login'] in admin_list):
+        return jsonify({"error": "not admin"}), 403
+    try:
+        response_id = ObjectId(request.args.get('id'))
+        k = min(int(request.args.get('k', 10)), 100)
+        threshold = float(request.args.get('threshold', 0))
+    except Exception:
+        return jsonify({"error": "invalid id, k or threshold"}), 400
+    index = get_db()[similarity.COLLECTION]
+    result = similarity.similar(index, response_id, k, threshold)
+    if result is None:
+        # 아직 색인되지 않은 응답이면 지금 색인하고 다시 조회
+        *x, responses_collection, x = get_collections()
+        document = responses_collection.find_one({"_id": response_id}, {"problem_alias": 1, "sid": 1, "name": 1, "content": 1})
+        if document is None:
+            return jsonify({"error": "No document found with the provided _id"}), 404
+        similarity.update(index, response_id, document.get("problem_alias"), document.get("sid"), document.get("name"),
+                          document.get("content"), (find_problem(document.get("problem_alias")) or {}).get("lang"))
+        result = similarity.similar(index, response_id, k, threshold) or []
+    return jsonify(result)
+
+@app.route('/admin/similarity_clusters')
+def admin_similarity_clusters():
+    """문제(problem_alias) 안에서 서로 threshold 이상 비슷한 응답 묶음"""
+    if not ('login' in session and session['login'] in admin_list):
+        return jsonify({"error": "not admin"}), 403
+    problem_alias = request.args.get('problem_alias')
+    if not problem_alias:
+        return jsonify({"error": "problem_alias is required"}), 400
+    try:
+        threshold = float(request.args.get('threshold', similarity.THRESHOLD))
+    except ValueError:
+        return jsonify({"error": "invalid threshold"}), 400
+    return jsonify(similarity.clusters(get_db()[similarity.COLLECTION], problem_alias, threshold))
+
+@app.route('/admin/paste_check')
+def admin_paste_check():
+    """응답(id)의 붙여넣기 항목마다 그 내용이 들어 있는 같은 문제의 다른 학생 응답"""
+    if not ('login' in session and session['login'] in admin_list):
+        return jsonify({"error": "not admin"}), 403
+    try:
+        response_id = ObjectId(request.args.get('id'))
+        threshold = float(request.args.get('threshold', 0.5))
+    except Exception:
+        return jsonify({"error": "invalid id or threshold"}), 400
+    *x, responses_collection, x = get_collections()
+    problem_alias = (responses_collection.find_one({"_id": response_id}, {"problem_alias": 1}) or {}).get("problem_alias")
+    result = similarity.paste_check(responses_collection, get_log_chunks(), get_db()[similarity.COLLECTION], response_id,
+                                    (find_problem(problem_alias) or {}).get("lang"), threshold)
+    if result is None:
+        return jsonify({"error": "No document found with the provided _id"}), 404
+    return jsonify(result)
+
+@app.route('/admin/mongo_stats')
+def mongo_stats():
+    # 현재 워커 프로세스의 MongoClient 커넥션 풀 통계 (워커마다 따로 집계됨)
+    if not ('login' in session and session['login'] in admin_list):
+        return jsonify({"error": "not admin"}), 403
+    return jsonify(MONGO.stats())
+
 @app.route('/get_selected_db')
 def get_selected_db():
     return jsonify({"selected": session.get('db_key', '')})
@@ -747,55 +1115,21 @@ def select_db():
     if not db_uri:
         return jsonify({"error": "DB URI not set in .env"}), 500
 
-    session['db_uri'] = db_uri           # 실사용용 Mongo URI
-    session['db_key'] = chosen_db        # 드롭다운 선택 상태 유지용
+    session.pop('db_uri', None)          # 예전 세션에 남은 URI (이제는 키로만 찾음)
+    session['db_key'] = chosen_db        # get_db() 가 MONGO 레지스트리에서 찾는 키
 
     return jsonify({"status": "ok", "chosen_db": chosen_db})
 
 
 
-def get_data_selecteddb(studentid, name, responses_collection, sheets_collection):
-    aliases = []
-    sheets_response = []
-
+def get_data_selecteddb(studentid, name, responses_collection, sheets_collection=None):
+    # 시트는 항상 ACTIVE 의 Sheets 를 쓰므로 sheets_collection 대신 캐시(find_sheets)를 거친다
     # alias 목록 추출
-    alias_cursor = responses_collection.find(
-        {"sid": studentid, "name": name},
-        {"_id": 0, "alias": 1}
-    )
-    alias_set = {doc["alias"] for doc in alias_cursor if "alias" in doc}
-    aliases = sorted(alias_set)
+    alias_set = responses_collection.distinct("alias", {"sid": studentid, "name": name})
+    aliases = sorted(alias for alias in alias_set if alias is not None)
 
-    # 각 alias에 대한 응답 데이터 수집
-    for alias in aliases:
-        # 해당 sheet 정보 확인
-        sheet = sheets_collection.find_one({"alias": alias})
-        problem_list = sheet["problem_list"] if sheet else [alias]
-        print(problem_list)
-        for problem_alias in problem_list:
-            response_cursor = responses_collection.find(
-                {'problem_alias': problem_alias, 'sid': studentid, 'name': name},
-                {'_id': 1, 'timestamp': 1, 'content': 1, 'success': 1}
-            ).sort('_id', -1)
-
-            results = [{
-                '_id': str(doc['_id']),
-                'problem_alias': problem_alias,
-                'timestamp': doc.get('timestamp', ""),
-                'content': doc.get('content', ""),
-                'result': doc.get('success', "")
-            } for doc in response_cursor]
-
-            if not results:
-                results.append({
-                    '_id': None,
-                    'problem_alias': problem_alias,
-                    'timestamp': "",
-                    'content': "",
-                    'result': ""
-                })
-            sheets_response.append(results)
-    print(sheets_response)
+    # 각 alias 에 대한 응답 데이터 수집 (문제 단위)
+    sheets_response = get_sheets_data(aliases, studentid, name, responses_collection, by_problem=True)
     return aliases, sheets_response, len(aliases)
 
 """
@@ -1019,4 +1353,6 @@ def admin_log():
 """
 
 if __name__ == '__main__':
+    if os.getenv('ENSURE_INDEXES', '1') == '1':
+        threading.Thread(target=indexes.bootstrap_env, daemon=True).start()
     app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
@@ -0,0 +1,274 @@
+# ==== ACTIVE -> ARCHIVE 이관 ====
+# 오래된 응답(또는 끝난 시트/문제의 응답)을 ACTIVE 에서 ARCHIVE 로 옮겨 ACTIVE 의 작업 집합을 작게 유지한다.
+#   - Responses 를 _id 순서로 batch 개씩 읽어 ARCHIVE 에 _id 기준 upsert (LogChunks, LogKeyframes, Similarity 도 같이)
+#   - ARCHIVE 에서 다시 읽어 개수와 checksum 이 같을 때만 ACTIVE 에서 지운다
+#   - 로그는 응답이 실제로 지워진 뒤에, 그 사이 이어 붙은 버킷까지 다시 복사하고 나서 지운다
+#   - 복사하는 동안 학생이 다시 저장한 응답(timestamp/log_len/success 가 바뀐 것)은 지우지 않고
+#     ARCHIVE 쪽 복사본을 되돌린다. 채점 중(pending)인 응답은 고르지 않는다.
+#   - 진행 상황(last_id, copied, deleted ...)은 ACTIVE 의 ArchiveJobs 에 batch 마다 저장 -> --resume 으로 이어서 실행
+#   - --rate 로 초당 옮기는 응답 수를 제한해 시험 중에도 돌릴 수 있게 한다
+#
+#   python archiver.py --before 2025-03-01                    # 2025-03-01 이전에 만든 응답
+#   python archiver.py --alias sm3 --alias sm4 --dry-run      # 시트 alias 기준 (개수만 확인)
+#   python archiver.py --problem-alias sm3-1 --rate 100
+#   python archiver.py --resume <job id>
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import DeleteOne, MongoClient, ReplaceOne, ReturnDocument
+
+import grading
+import indexes
+import logstore
+import similarity
+
+COLLECTION = 'ArchiveJobs'
+BATCH = 200
+RATE = 200   # 초당 옮기는 응답 수 상한
+LEASE = 300  # batch 하나를 처리하는 동안 다른 프로세스가 같은 작업을 가져가지 못하게 하는 시간(초)
+# response_id 로 응답에 딸린 컬렉션 (응답과 함께 옮기고 지운다)
+LOG_COLLECTIONS = (logstore.COLLECTION, logstore.KEYFRAMES, similarity.COLLECTION)
+# 이 필드가 복사할 때와 달라졌으면 그 사이에 다시 저장/채점된 응답
+UNCHANGED_FIELDS = ("timestamp", "log_len", "success")
+
+
+class VerificationError(Exception):
+    pass
+
+
+def selection(before=None, aliases=(), problem_aliases=()):
+    """옮길 Responses 조건. 여러 조건을 주면 모두 만족하는 응답만."""
+    query = {"success": {"$ne": grading.PENDING}}
+    if before:
+        query["_id"] = {"$lt": ObjectId.from_datetime(before)}
+    if aliases:
+        query["alias"] = {"$in": list(aliases)}
+    if problem_aliases:
+        query["problem_alias"] = {"$in": list(problem_aliases)}
+    return query
+
+
+def create(jobs, source_key, target_key, before=None, aliases=(), problem_aliases=()):
+    job_id = ObjectId()
+    jobs.insert_one({
+        "_id": job_id,
+        "source": source_key,
+        "target": target_key,
+        "before": before,
+        "aliases": list(aliases),
+        "problem_aliases": list(problem_aliases),
+        "state": "queued",
+        "last_id": None,
+        "cleanup": [],
+        "total": None,
+        "copied": 0,
+        "deleted": 0,
+        "skipped": 0,
+        "lease_until": 0,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    })
+    return job_id
+
+
+def claim(jobs, job_id):
+    """실행 권한 획득 (다른 곳에서 실행 중이거나 끝난 작업이면 None)"""
+    now = time.time()
+    return jobs.find_one_and_update(
+        {"_id": job_id, "state": {"$in": ["queued", "running", "failed"]}, "lease_until": {"$lt": now}},
+        {"$set": {"state": "running", "lease_until": now + LEASE, "error": None, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def checksum(documents):
+    """_id 순서로 정렬한 도큐먼트 목록의 sha256 (필드 순서와 무관)"""
+    digest = hashlib.sha256()
+    for document in sorted(documents, key=lambda d: str(d["_id"])):
+        digest.update(json.dumps(document, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _copy(target, documents):
+    if documents:
+        target.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in documents], ordered=False)
+
+
+def _verify(name, target, documents):
+    ids = [d["_id"] for d in documents]
+    copied = list(target.find({"_id": {"$in": ids}})) if ids else []
+    if len(copied) != len(documents):
+        raise VerificationError(f"{name}: {len(copied)} of {len(documents)} documents found in the archive")
+    if checksum(copied) != checksum(documents):
+        raise VerificationError(f"{name}: checksum mismatch after copy")
+
+
+def _logs(db, response_ids):
+    return {name: list(db[name].find({"response_id": {"$in": response_ids}})) for name in LOG_COLLECTIONS}
+
+
+def _move_logs(source_db, target_db, response_ids):
+    """ACTIVE 에서 지워졌고 ARCHIVE 에 있는 응답의 로그를 마저 옮긴다 (중간에 멈춘 batch 를 이어서 정리할 때도 안전).
+    처음 복사한 뒤 응답이 지워지기 전에 들어온 logstore.append 가 버킷을 더 썼을 수 있으므로
+    지금 남아 있는 것을 다시 복사·검증하고, ARCHIVE 의 log_len 을 버킷 끝까지 늘린 다음 지운다."""
+    if not response_ids:
+        return 0
+    remaining = {d["_id"] for d in source_db['Responses'].find({"_id": {"$in": response_ids}}, {"_id": 1})}
+    archived = {d["_id"] for d in target_db['Responses'].find({"_id": {"$in": response_ids}}, {"_id": 1})}
+    gone = [response_id for response_id in response_ids if response_id not in remaining and response_id in archived]
+    if not gone:
+        return 0
+    logs = _logs(source_db, gone)
+    for name in LOG_COLLECTIONS:
+        _copy(target_db[name], logs[name])
+        _verify(name, target_db[name], logs[name])
+    ends = {}
+    for bucket in logs[logstore.COLLECTION]:
+        end = bucket.get("start", 0) + bucket.get("n", len(bucket.get("entries", [])))
+        ends[bucket["response_id"]] = max(ends.get(bucket["response_id"], 0), end)
+    for response_id, end in ends.items():
+        target_db['Responses'].update_one({"_id": response_id}, {"$max": {"log_len": end}})
+    for name in LOG_COLLECTIONS:
+        source_db[name].delete_many({"response_id": {"$in": gone}})
+    return len(gone)
+
+
+def archive_batch(source_db, target_db, documents):
+    """batch 하나 복사 -> 검증 -> 삭제. (지운 수, 바뀌어서 남겨 둔 응답 _id 목록)"""
+    ids = [d["_id"] for d in documents]
+    logs = _logs(source_db, ids)
+
+    # 로그를 먼저 복사해야 ARCHIVE 에 응답만 있고 로그가 없는 순간이 생기지 않는다
+    for name in LOG_COLLECTIONS:
+        _copy(target_db[name], logs[name])
+    _copy(target_db['Responses'], documents)
+
+    for name in LOG_COLLECTIONS:
+        _verify(name, target_db[name], logs[name])
+    _verify('Responses', target_db['Responses'], documents)
+
+    source_db['Responses'].bulk_write(
+        [DeleteOne({"_id": d["_id"], **{f: d.get(f) for f in UNCHANGED_FIELDS}}) for d in documents], ordered=False)
+    kept = [d["_id"] for d in source_db['Responses'].find({"_id": {"$in": ids}}, {"_id": 1})]
+    if kept:
+        # 복사 뒤에 바뀐 응답은 ACTIVE 에 두고 ARCHIVE 쪽 복사본(로그 포함)을 되돌림
+        target_db['Responses'].delete_many({"_id": {"$in": kept}})
+        for name in LOG_COLLECTIONS:
+            target_db[name].delete_many({"response_id": {"$in": kept}})
+    # 로그는 조건부 삭제가 실제로 지운 응답의 것만, 응답을 지운 뒤에 옮기고 지운다
+    _move_logs(source_db, target_db, [i for i in ids if i not in kept])
+    return len(ids) - len(kept), kept
+
+
+def run(jobs, job_id, source_db, target_db, batch=BATCH, rate=RATE, progress=None):
+    """이관 실행. 반환값은 마지막 작업 상태 도큐먼트. 이미 실행 중이거나 끝난 작업이면 None."""
+    job = claim(jobs, job_id)
+    if job is None:
+        return None
+    query = selection(job["before"], job["aliases"], job["problem_aliases"])
+    if job["total"] is None:
+        job["total"] = source_db['Responses'].count_documents(query)
+        jobs.update_one({"_id": job_id}, {"$set": {"total": job["total"]}})
+
+    try:
+        # 지난 실행이 응답 삭제 뒤 로그 정리 전에 멈췄으면 마저 정리
+        _move_logs(source_db, target_db, job["cleanup"])
+        while True:
+            started = time.monotonic()
+            page = dict(query)
+            if job["last_id"]:
+                page["_id"] = {**query.get("_id", {}), "$gt": job["last_id"]}
+            documents = list(source_db['Responses'].find(page).sort("_id", 1).limit(batch))
+            if not documents:
+                break
+            jobs.update_one({"_id": job_id}, {"$set": {"cleanup": [d["_id"] for d in documents],
+                                                       "lease_until": time.time() + LEASE}})
+            deleted, kept = archive_batch(source_db, target_db, documents)
+            job["last_id"] = documents[-1]["_id"]
+            job["copied"] += len(documents)
+            job["deleted"] += deleted
+            job["skipped"] += len(kept)
+            jobs.update_one({"_id": job_id}, {"$set": {
+                "last_id": job["last_id"], "cleanup": [], "copied": job["copied"], "deleted": job["deleted"],
+                "skipped": job["skipped"], "lease_until": time.time() + LEASE, "updated_at": datetime.utcnow(),
+            }})
+            if progress:
+                progress(job)
+            # 초당 rate 개를 넘지 않도록 쉼
+            if rate:
+                time.sleep(max(0.0, len(documents) / rate - (time.monotonic() - started)))
+    except Exception as e:
+        jobs.update_one({"_id": job_id}, {"$set": {"state": "failed", "error": str(e), "lease_until": 0,
+                                                   "updated_at": datetime.utcnow()}})
+        raise
+    jobs.update_one({"_id": job_id}, {"$set": {"state": "done", "lease_until": 0, "updated_at": datetime.utcnow()}})
+    job["state"] = "done"
+    return job
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move Responses (with their keystroke logs) from ACTIVE to ARCHIVE")
+    parser.add_argument("--before", help="archive responses created before this date (YYYY-MM-DD)")
+    parser.add_argument("--alias", action="append", default=[], help="sheet alias to archive (repeatable)")
+    parser.add_argument("--problem-alias", action="append", default=[], help="problem_alias to archive (repeatable)")
+    parser.add_argument("--source", default="ACTIVE", help="env key of the MongoDB URI to move from")
+    parser.add_argument("--target", default="ARCHIVE", help="env key of the MongoDB URI to move to")
+    parser.add_argument("--batch", type=int, default=BATCH, help="responses copied per batch")
+    parser.add_argument("--rate", type=float, default=RATE, help="max responses moved per second (0 = unlimited)")
+    parser.add_argument("--resume", help="ArchiveJobs _id of an interrupted run")
+    parser.add_argument("--dry-run", action="store_true", help="only count the responses that would be moved")
+    args = parser.parse_args()
+    if not (args.before or args.alias or args.problem_alias or args.resume):
+        parser.error("--before, --alias, --problem-alias or --resume is required")
+    before = datetime.strptime(args.before, "%Y-%m-%d") if args.before else None
+
+    load_dotenv()
+    jobs_db = MongoClient(os.getenv('ACTIVE'))['Codelog']
+    jobs = jobs_db[COLLECTION]
+    if args.resume:
+        job_id = ObjectId(args.resume)
+        job = jobs.find_one({"_id": job_id})
+        if job is None:
+            parser.error(f"no archive job {args.resume}")
+        source_key, target_key = job["source"], job["target"]
+    else:
+        job_id, source_key, target_key = None, args.source, args.target
+    for db_key in (source_key, target_key):
+        if not os.getenv(db_key):
+            parser.error(f"{db_key} is not set in .env")
+    if os.getenv(source_key) == os.getenv(target_key):
+        parser.error("source and target are the same database")
+    source_db = MongoClient(os.getenv(source_key))['Codelog']
+    target_db = MongoClient(os.getenv(target_key))['Codelog']
+
+    if args.dry_run:
+        query = selection(before, args.alias, args.problem_alias)
+        print(f"[archiver] {source_db['Responses'].count_documents(query)} responses would move "
+              f"from {source_key} to {target_key}")
+        return
+
+    for name, error in indexes.ensure(target_db, indexes.collections_for(target_key)):
+        print(f"[archiver] {target_key}.{name}: {error}")
+    if job_id is None:
+        job_id = create(jobs, source_key, target_key, before, args.alias, args.problem_alias)
+
+    print(f"[archiver] job {job_id}: {source_key} -> {target_key}")
+    started = time.time()
+    job = run(jobs, job_id, source_db, target_db, batch=args.batch, rate=args.rate,
+              progress=lambda j: print(f"[archiver] {j['copied']}/{j['total']} responses copied, "
+                                       f"{j['deleted']} deleted, {j['skipped']} changed during copy"))
+    if job is None:
+        print(f"[archiver] job {job_id} is already running or finished")
+        return
+    print(f"[archiver] done in {time.time() - started:.1f}s: {job['deleted']} responses moved, "
+          f"{job['skipped']} left in {source_key} (changed during copy)")
+
+
+if __name__ == '__main__':
+    main()
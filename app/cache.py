@@ -0,0 +1,94 @@
+# ==== 프로세스 내 TTL/LRU 캐시 ====
+# 시험 중에는 같은 문제/시트 alias 를 수천 번 조회하므로 gunicorn 워커마다 조회 결과를 잠깐 들고 있는다.
+# 항목은 ttl 초가 지나면 만료되고, maxsize 를 넘으면 가장 오래 쓰지 않은 항목부터 버린다.
+# 없는 alias(None)도 그대로 캐시한다 (존재하지 않는 alias 를 반복 조회하는 경우 대비).
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (만료 시각, 값)
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        # lock 을 잡은 상태에서 호출
+        item = self._data.get(key)
+        if item is None:
+            return _MISSING
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        """통계에 잡히지 않는 조회 (캐시에 없으면 default)"""
+        with self._lock:
+            value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        """캐시에 없으면 loader(key) 결과를 저장하고 반환"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = loader(key)
+        self.set(key, value)
+        return value
+
+    def get_many(self, keys, loader):
+        """여러 key 를 한 번에 조회. loader(없는 key 목록) 는 {key: 값} 을 반환하며, 빠진 key 는 None 으로 저장한다."""
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                value = self._lookup(key)
+                if value is _MISSING:
+                    missing.append(key)
+                else:
+                    found[key] = value
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing:
+            loaded = loader(missing)
+            for key in missing:
+                found[key] = loaded.get(key)
+                self.set(key, found[key])
+        return found
+
+    def invalidate(self, key=_MISSING):
+        """key 하나, 또는 인자가 없으면 전체를 비운다"""
+        with self._lock:
+            if key is _MISSING:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
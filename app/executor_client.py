@@ -0,0 +1,99 @@
+# ==== lambda-lite 호출 클라이언트 ====
+# 워커 프로세스마다 requests.Session 하나를 공유해 keep-alive 연결을 재사용한다.
+#   - 연결 풀 크기는 한 프로세스에서 동시에 나가는 호출 수(요청 처리 스레드 + 채점 스레드)에 맞춘다.
+#   - 연결 단계 오류만 backoff 를 두고 재시도한다 (요청이 전달되지 않았으므로 POST 라도 안전).
+#   - 연속 실패(연결 오류, 시간 초과, 429/5xx)가 failure_threshold 번 쌓이면 reset_after 초 동안
+#     호출하지 않고 바로 CircuitOpen 을 던진다. 그 뒤 한 번 시험 호출해서 성공하면 다시 연다.
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class CircuitOpen(requests.exceptions.RequestException):
+    pass
+
+
+class ExecutorClient:
+    def __init__(self, base_url, pool_size=4, connect_timeout=2, read_timeout=15, retries=2, backoff=0.2,
+                 failure_threshold=5, reset_after=10):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.session = requests.Session()
+        retry = Retry(total=retries, connect=retries, read=0, redirect=0, status=0, backoff_factor=backoff)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry, pool_block=False)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None  # None 이면 닫힘(정상)
+        self._trial = False     # 열린 뒤 시험 호출 진행 중
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+
+    def _before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self._trial or time.monotonic() - self._opened_at < self.reset_after:
+                self.rejected += 1
+                raise CircuitOpen("code executor is temporarily unavailable")
+            self._trial = True  # 이 호출 하나만 통과시켜 본다
+
+    def _record(self, ok):
+        with self._lock:
+            self.calls += 1
+            self._trial = False
+            if ok:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self.errors += 1
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def post(self, path, payload):
+        """JSON POST. 연결/시간 초과 오류는 requests 예외 그대로, 회로가 열려 있으면 CircuitOpen."""
+        self._before_call()
+        try:
+            response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        except Exception:
+            self._record(False)
+            raise
+        # 429(대기열 가득 참)와 5xx 는 과부하로 보고 실패로 센다
+        self._record(response.status_code != 429 and response.status_code < 500)
+        return response
+
+    def invoke_batch(self, jobs):
+        """/invoke_batch 호출. 끝나는 순서대로 {"index", "id", "result"} 를 yield 한다.
+        과부하(429) 등 200 이 아니면 requests.HTTPError."""
+        self._before_call()
+        try:
+            response = self.session.post(f"{self.base_url}/invoke_batch", json={"jobs": jobs},
+                                         timeout=self.timeout, stream=True)
+        except Exception:
+            self._record(False)
+            raise
+        self._record(response.status_code != 429 and response.status_code < 500)
+        with response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': 'closed' if self._opened_at is None else 'open',
+                'consecutive_failures': self._failures,
+                'calls': self.calls,
+                'errors': self.errors,
+                'rejected': self.rejected,
+            }
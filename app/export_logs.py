@@ -0,0 +1,429 @@
+# ==== 키 입력 로그 분석용 내보내기 (Parquet / Arrow) ====
+# Responses 와 로그(LogChunks, 예전 inline 로그)를 batch 단위로 읽어 로그 항목 한 줄 = 한 행인 컬럼 형식으로 저장한다.
+#   out/entries/problem_alias=<alias>/part-<실행 시각>.parquet   로그 항목 (problem_alias 로 파티션)
+#   out/responses-<실행 시각>.parquet                            응답별 요약
+# - 항목에서 값만 꺼내 배열에 담고, 파생 값(content 길이, 직전 항목과의 간격, 응답별 합계)은 NumPy 로 한 번에 계산한다.
+#   delta 항목은 코드를 풀지 않고 편집 연산의 길이만으로 content 길이를 구한다.
+# - Responses 를 (problem_alias, _id) 순서로 읽으므로 파티션 파일은 한 번에 하나만 열려 있고,
+#   메모리는 batch 하나 분량만 쓴다.
+# numpy, pyarrow 는 이 스크립트에만 필요하다 (requirements-analytics.txt, app 이미지에는 기본으로 설치).
+#
+#   python export_logs.py --db ARCHIVE --out /data/export
+#   python export_logs.py --db ACTIVE --problem-alias sm3-1 --format arrow --out /tmp/sm3-1
+import argparse
+import os
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 분석용 선택 의존성
+    np = pa = pq = None
+
+import keylog
+import logstore
+
+BATCH = 100          # 한 번에 읽는 응답 수
+IDLE_MS = 30000      # 이보다 긴 간격은 쉰 시간으로 본다 (metrics.py 와 같은 기준)
+KINDS = ("edit", "v", "o", "e", "s", "u", "a", "d", "other")
+_KIND_CODE = {kind: code for code, kind in enumerate(KINDS)}
+EDIT, PASTE, OUTPUT, ERROR = (_KIND_CODE[k] for k in ("edit", "v", "o", "e"))
+
+
+def entry_schema():
+    return pa.schema([
+        ("response_id", pa.string()),
+        ("sid", pa.string()),
+        ("problem_alias", pa.string()),
+        ("position", pa.int32()),
+        ("kind", pa.dictionary(pa.int8(), pa.string())),
+        ("key_idx", pa.int32()),
+        ("timestamp", pa.int64()),
+        ("interval", pa.float64()),
+        ("content_len", pa.int32()),
+        ("delta_pos", pa.int32()),
+        ("delta_del", pa.int32()),
+        ("delta_ins", pa.string()),
+        ("gap_ms", pa.float64()),
+        ("len_change", pa.int32()),
+    ])
+
+
+def response_schema():
+    return pa.schema([
+        ("response_id", pa.string()),
+        ("sid", pa.string()),
+        ("name", pa.string()),
+        ("alias", pa.string()),
+        ("problem_alias", pa.string()),
+        ("success", pa.string()),
+        ("entries", pa.int32()),
+        ("keystrokes", pa.int32()),
+        ("pastes", pa.int32()),
+        ("pasted_chars", pa.int64()),
+        ("runs", pa.int32()),
+        ("run_errors", pa.int32()),
+        ("first_ts", pa.int64()),
+        ("last_ts", pa.int64()),
+        ("active_ms", pa.float64()),
+        ("idle_ms", pa.float64()),
+        ("final_len", pa.int32()),
+    ])
+
+
+class Columns:
+    """batch 하나의 로그 항목 값을 열별 리스트로 모은다 (dict 는 여기서 한 번만 훑는다)"""
+
+    def __init__(self):
+        self.response = []     # batch 안의 응답 번호
+        self.position = []
+        self.kind = []
+        self.key_idx = []
+        self.timestamp = []
+        self.interval = []
+        self.keyframe = []     # content 가 통째로 있는 키 입력 (길이 기준점)
+        self.length = []       # keyframe 이나 문자 항목의 content 길이
+        self.change = []       # delta 항목의 길이 변화
+        self.delta_pos = []
+        self.delta_del = []
+        self.delta_ins = []
+
+    def __len__(self):
+        return len(self.position)
+
+    def add(self, response, entries):
+        for position, entry in enumerate(entries):
+            idx = entry.get("idx")
+            timestamp = entry.get("timestamp")
+            interval = entry.get("time interval")
+            self.response.append(response)
+            self.position.append(position)
+            self.timestamp.append(timestamp if isinstance(timestamp, (int, float)) else np.nan)
+            self.interval.append(interval if isinstance(interval, (int, float)) else np.nan)
+            if keylog.is_edit(entry):
+                self.kind.append(EDIT)
+                self.key_idx.append(idx)
+                ops = entry.get("delta")
+                if ops is None:
+                    self.keyframe.append(True)
+                    self.length.append(keylog.utf16_len(entry.get("content") or ""))
+                    self.change.append(0)
+                    self.delta_pos.append(-1)
+                    self.delta_del.append(-1)
+                    self.delta_ins.append(None)
+                else:
+                    inserted = [op[2] for op in ops]
+                    self.keyframe.append(False)
+                    self.length.append(0)
+                    self.change.append(sum(keylog.utf16_len(ins) - op[1] for op, ins in zip(ops, inserted)))
+                    self.delta_pos.append(ops[0][0] if ops else -1)
+                    self.delta_del.append(sum(op[1] for op in ops))
+                    self.delta_ins.append("".join(inserted))
+            else:
+                self.kind.append(_KIND_CODE.get(idx, _KIND_CODE["other"]))
+                self.key_idx.append(-1)
+                self.keyframe.append(False)
+                content = entry.get("content")
+                self.length.append(keylog.utf16_len(content) if isinstance(content, str) else -1)
+                self.change.append(0)
+                self.delta_pos.append(-1)
+                self.delta_del.append(-1)
+                self.delta_ins.append(None)
+
+
+def derive(columns, responses):
+    """열 리스트 -> NumPy 배열 + 파생 열. responses 는 batch 안의 응답 수."""
+    response = np.asarray(columns.response, dtype=np.int32)
+    kind = np.asarray(columns.kind, dtype=np.int8)
+    timestamp = np.asarray(columns.timestamp, dtype=np.float64)
+    keyframe = np.asarray(columns.keyframe, dtype=bool)
+    length = np.asarray(columns.length, dtype=np.float64)
+    change = np.asarray(columns.change, dtype=np.float64)
+    rows = len(response)
+    first = np.ones(rows, dtype=bool)
+    first[1:] = response[1:] != response[:-1]
+
+    # 직전 항목과의 시간 간격 (응답의 첫 항목은 없음)
+    gap = np.full(rows, np.nan)
+    gap[1:] = timestamp[1:] - timestamp[:-1]
+    gap[first] = np.nan
+
+    # 키 입력의 content 길이: 마지막 keyframe 길이 + 그 뒤 delta 들의 길이 변화 누적.
+    # 응답이 keyframe 없이 delta 로 시작하면 첫 keyframe 전까지는 알 수 없음(NaN).
+    content_len = np.where(kind == EDIT, np.nan, length)
+    content_len[(kind != EDIT) & (length < 0)] = np.nan
+    len_change = np.full(rows, np.nan)
+    edits = np.flatnonzero(kind == EDIT)
+    if len(edits):
+        e_response = response[edits]
+        e_first = np.ones(len(edits), dtype=bool)
+        e_first[1:] = e_response[1:] != e_response[:-1]
+        anchor = keyframe[edits] | e_first
+        base = np.where(keyframe[edits], length[edits], np.nan)
+        cumulative = np.cumsum(change[edits])
+        start = np.maximum.accumulate(np.where(anchor, np.arange(len(edits)), 0))
+        e_len = base[start] + cumulative - cumulative[start]
+        content_len[edits] = e_len
+        e_change = np.full(len(edits), np.nan)
+        e_change[1:] = e_len[1:] - e_len[:-1]
+        e_change[e_first] = np.nan
+        len_change[edits] = e_change
+
+    # 응답별 합계 (bincount 로 한 번에)
+    def total(weights=None, mask=None):
+        w = np.ones(rows) if weights is None else weights
+        if mask is not None:
+            w = np.where(mask, w, 0)
+        return np.bincount(response, weights=w, minlength=responses)
+
+    known_gap = np.nan_to_num(gap, nan=0.0)
+    paste_len = np.where((kind == PASTE) & (length > 0), length, 0)
+    has_ts = ~np.isnan(timestamp)
+    first_ts = np.full(responses, np.inf)
+    last_ts = np.full(responses, -np.inf)
+    np.minimum.at(first_ts, response[has_ts], timestamp[has_ts])
+    np.maximum.at(last_ts, response[has_ts], timestamp[has_ts])
+    first_ts[np.isinf(first_ts)] = np.nan
+    last_ts[np.isinf(last_ts)] = np.nan
+    final_len = np.full(responses, np.nan)
+    if len(edits):
+        last_edit = np.flatnonzero(np.r_[response[edits][1:] != response[edits][:-1], True])
+        final_len[response[edits][last_edit]] = content_len[edits][last_edit]
+
+    summary = {
+        "entries": total(),
+        "keystrokes": total(mask=kind == EDIT),
+        "pastes": total(mask=kind == PASTE),
+        "pasted_chars": total(paste_len),
+        "runs": total(mask=(kind == OUTPUT) | (kind == ERROR)),
+        "run_errors": total(mask=kind == ERROR),
+        "first_ts": first_ts,
+        "last_ts": last_ts,
+        "active_ms": total(known_gap, mask=(known_gap >= 0) & (known_gap <= IDLE_MS)),
+        "idle_ms": total(known_gap, mask=known_gap > IDLE_MS),
+        "final_len": final_len,
+    }
+    entries = {
+        "response": response, "kind": kind, "timestamp": timestamp, "gap_ms": gap,
+        "content_len": content_len, "len_change": len_change,
+    }
+    return entries, summary
+
+
+def _int_array(values, dtype, missing):
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        mask = np.isnan(values)
+    else:
+        mask = values == missing if missing is not None else np.zeros(len(values), dtype=bool)
+    return pa.array(np.where(mask, 0, values).astype(dtype), mask=mask)
+
+
+def _float_array(values):
+    values = np.asarray(values, dtype=np.float64)
+    return pa.array(values, mask=np.isnan(values))
+
+
+def entry_table(columns, meta, entries):
+    response = entries["response"]
+    ids = np.asarray([m["response_id"] for m in meta], dtype=object)
+    sids = np.asarray([m["sid"] for m in meta], dtype=object)
+    problems = np.asarray([m["problem_alias"] for m in meta], dtype=object)
+    return pa.Table.from_arrays([
+        pa.array(ids[response], type=pa.string()),
+        pa.array(sids[response], type=pa.string()),
+        pa.array(problems[response], type=pa.string()),
+        pa.array(np.asarray(columns.position, dtype=np.int32)),
+        pa.DictionaryArray.from_arrays(pa.array(entries["kind"]), pa.array(KINDS)),
+        _int_array(columns.key_idx, np.int32, -1),
+        _int_array(entries["timestamp"], np.int64, None),
+        _float_array(columns.interval),
+        _int_array(entries["content_len"], np.int32, None),
+        _int_array(columns.delta_pos, np.int32, -1),
+        _int_array(columns.delta_del, np.int32, -1),
+        pa.array(columns.delta_ins, type=pa.string()),
+        _float_array(entries["gap_ms"]),
+        _int_array(entries["len_change"], np.int32, None),
+    ], schema=entry_schema())
+
+
+def response_table(meta, summary):
+    def text(field):
+        return pa.array([m[field] for m in meta], type=pa.string())
+    return pa.Table.from_arrays([
+        text("response_id"), text("sid"), text("name"), text("alias"), text("problem_alias"), text("success"),
+        _int_array(summary["entries"], np.int32, None),
+        _int_array(summary["keystrokes"], np.int32, None),
+        _int_array(summary["pastes"], np.int32, None),
+        _int_array(summary["pasted_chars"], np.int64, None),
+        _int_array(summary["runs"], np.int32, None),
+        _int_array(summary["run_errors"], np.int32, None),
+        _int_array(summary["first_ts"], np.int64, None),
+        _int_array(summary["last_ts"], np.int64, None),
+        _float_array(summary["active_ms"]),
+        _float_array(summary["idle_ms"]),
+        _int_array(summary["final_len"], np.int32, None),
+    ], schema=response_schema())
+
+
+def open_writer(path, schema, fmt):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == "arrow":
+        return pa.ipc.new_file(path, schema)
+    return pq.ParquetWriter(path, schema, compression="zstd")
+
+
+class PartitionedWriter:
+    """problem_alias 파티션별 파일. 입력이 problem_alias 순서라 열린 파일은 항상 하나."""
+
+    def __init__(self, root, run, fmt):
+        self.root = root
+        self.run = run
+        self.fmt = fmt
+        self.current = None
+        self.writer = None
+        self.files = 0
+        self.rows = 0
+
+    def write(self, table):
+        if table.num_rows == 0:
+            return
+        problems = table.column("problem_alias").to_numpy(zero_copy_only=False)
+        cuts = np.flatnonzero(problems[1:] != problems[:-1]) + 1
+        for start, stop in zip(np.r_[0, cuts], np.r_[cuts, len(problems)]):
+            problem_alias = problems[start]
+            if problem_alias != self.current:
+                self.close()
+                value = "__HIVE_DEFAULT_PARTITION__" if problem_alias is None else quote(str(problem_alias), safe='')
+                directory = os.path.join(self.root, f"problem_alias={value}")
+                self.writer = open_writer(os.path.join(directory, f"part-{self.run}.{self.fmt}"),
+                                          table.schema, self.fmt)
+                self.current = problem_alias
+                self.files += 1
+            self.writer.write_table(table.slice(start, stop - start))
+            self.rows += stop - start
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.current = None
+
+
+def load_logs(chunks, documents):
+    """batch 의 응답들 로그 (압축 형식). 버킷은 한 번의 조회로 읽는다."""
+    logs = {d["_id"]: d["log"] for d in documents if isinstance(d.get("log"), list)}
+    bucketed = [d["_id"] for d in documents if d["_id"] not in logs]
+    for d in bucketed:
+        logs[d] = []
+    if bucketed:
+        cursor = chunks.find({"response_id": {"$in": bucketed}}, {"response_id": 1, "b": 1, "entries": 1}) \
+            .sort([("response_id", 1), ("b", 1)])
+        for bucket in cursor:
+            logs[bucket["response_id"]].extend(bucket["entries"])
+    return logs
+
+
+def export_batch(documents, chunks, entries_writer, responses_writer):
+    logs = load_logs(chunks, documents)
+    columns = Columns()
+    meta = []
+    for number, document in enumerate(documents):
+        meta.append({
+            "response_id": str(document["_id"]),
+            "sid": document.get("sid"),
+            "name": document.get("name"),
+            "alias": document.get("alias"),
+            "problem_alias": document.get("problem_alias"),
+            "success": document.get("success"),
+        })
+        columns.add(number, logs[document["_id"]])
+    entries, summary = derive(columns, len(documents))
+    if len(columns):
+        entries_writer.write(entry_table(columns, meta, entries))
+    responses_writer.write_table(response_table(meta, summary))
+    return len(columns)
+
+
+def selection(problem_aliases=(), aliases=(), since=None, before=None):
+    from bson import ObjectId
+    query = {}
+    if problem_aliases:
+        query["problem_alias"] = {"$in": list(problem_aliases)}
+    if aliases:
+        query["alias"] = {"$in": list(aliases)}
+    if since or before:
+        query["_id"] = {}
+        if since:
+            query["_id"]["$gte"] = ObjectId.from_datetime(since)
+        if before:
+            query["_id"]["$lt"] = ObjectId.from_datetime(before)
+    return query
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Export Responses and keystroke logs to partitioned Parquet/Arrow files")
+    parser.add_argument("--db", default="ACTIVE", help="env key of the MongoDB URI (ACTIVE, ARCHIVE, ...)")
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--format", choices=("parquet", "arrow"), default="parquet")
+    parser.add_argument("--problem-alias", action="append", default=[], help="only this problem_alias (repeatable)")
+    parser.add_argument("--alias", action="append", default=[], help="only this sheet alias (repeatable)")
+    parser.add_argument("--since", help="responses created on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--before", help="responses created before this date (YYYY-MM-DD)")
+    parser.add_argument("--batch", type=int, default=BATCH, help="responses read per batch")
+    args = parser.parse_args()
+    if np is None:
+        parser.error("numpy and pyarrow are required for exports: pip install -r requirements-analytics.txt")
+
+    load_dotenv()
+    uri = os.getenv(args.db)
+    if not uri:
+        parser.error(f"{args.db} is not set in .env")
+    db = MongoClient(uri)['Codelog']
+    responses = db['Responses']
+    chunks = db[logstore.COLLECTION]
+
+    parse = lambda value: datetime.strptime(value, "%Y-%m-%d") if value else None
+    query = selection(args.problem_alias, args.alias, parse(args.since), parse(args.before))
+    total = responses.count_documents(query)
+    print(f"[export_logs] {args.db}: {total} responses -> {args.out}")
+
+    run = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    entries_writer = PartitionedWriter(os.path.join(args.out, "entries"), run, args.format)
+    responses_writer = open_writer(os.path.join(args.out, f"responses-{run}.{args.format}"), response_schema(),
+                                   args.format)
+    projection = {"sid": 1, "name": 1, "alias": 1, "problem_alias": 1, "success": 1, "log": 1}
+    # (problem_alias, _id) 인덱스(indexes.py 의 problem_id)가 있으면 planner 가 쓴다. 인덱스가 없는 DB
+    # (DS_URI, SM2_URI 등)에서도 돌도록 hint 는 주지 않고, 메모리 정렬 한도를 넘으면 디스크를 쓰게 한다.
+    cursor = responses.find(query, projection, no_cursor_timeout=True, allow_disk_use=True) \
+        .sort([("problem_alias", 1), ("_id", 1)]).batch_size(args.batch)
+    started = time.time()
+    done = rows = 0
+    batch = []
+    try:
+        for document in cursor:
+            batch.append(document)
+            if len(batch) >= args.batch:
+                rows += export_batch(batch, chunks, entries_writer, responses_writer)
+                done += len(batch)
+                batch = []
+                print(f"[export_logs] {done}/{total} responses, {rows} log rows")
+        if batch:
+            rows += export_batch(batch, chunks, entries_writer, responses_writer)
+            done += len(batch)
+    finally:
+        cursor.close()
+        entries_writer.close()
+        responses_writer.close()
+    print(f"[export_logs] done in {time.time() - started:.1f}s: {done} responses, {rows} log rows "
+          f"in {entries_writer.files} partition files")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# ==== 채점 결과 캐시 ====
+# 같은 문제에 같은 코드를 다시 저장하면 lambda-lite 에 다시 보내지 않고 이전 판정(success, stdout, stderr 등)을 쓴다.
+# 키는 (테스트 버전, 언어, 제출 코드) 의 해시이며, 테스트 버전은 문제의 test 블록
+# (케이스 목록/early_exit/lang) 해시이므로 테스트 케이스를 고치면 예전 판정은 자연히 쓰이지 않는다.
+# 워커 내 TTLCache 를 먼저 보고, GRADE_CACHE_SHARED=1 이면 Mongo GradeCache 컬렉션을 워커끼리 공유한다.
+import hashlib
+import json
+from datetime import datetime
+
+from pymongo.errors import PyMongoError
+
+COLLECTION = 'GradeCache'
+FIELDS = ('success', 'stdout', 'stderr', 'code', 'expected', 'passed', 'total')
+
+
+def test_version(test_data):
+    """test 블록의 버전 (내용 해시)"""
+    block = {k: test_data.get(k, "") for k in ('cases', 'early_exit', 'lang')}
+    return hashlib.sha256(json.dumps(block, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def key(version, lang, code):
+    h = hashlib.sha256()
+    h.update(f"{version}\0{lang}\0".encode())
+    h.update(code.encode())
+    return h.hexdigest()
+
+
+def cacheable(result):
+    # 시간 초과/실행기 오류는 부하에 따라 달라질 수 있으므로 저장하지 않는다
+    return not (result.get('timeout') or result.get('lambda_error') or result.get('errorMessage'))
+
+
+class GradeCache:
+    def __init__(self, local, collection=None):
+        self.local = local
+        self.collection = collection  # 오래된 항목은 created_at TTL 인덱스(indexes.py)가 지운다
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def get(self, cache_key):
+        verdict = self.local.get(cache_key)
+        if verdict is None and self.collection is not None:
+            verdict = self._load_shared(cache_key)
+            if verdict:
+                self.local.set(cache_key, verdict)
+                self.shared_hits += 1
+        elif verdict is not None:
+            self.hits += 1
+        if verdict is None:
+            self.misses += 1
+            return None
+        return dict(verdict)
+
+    def _load_shared(self, cache_key):
+        try:
+            return self.collection.find_one({"_id": cache_key}, {"_id": 0, **{f: 1 for f in FIELDS}})
+        except PyMongoError as e:
+            print(f"[grade_cache] shared lookup failed: {e}")
+            return None
+
+    def put(self, cache_key, result):
+        verdict = {f: result.get(f) for f in FIELDS}
+        self.local.set(cache_key, verdict)
+        if self.collection is None:
+            return
+        try:
+            self.collection.update_one(
+                {"_id": cache_key},
+                {"$set": {**verdict, "created_at": datetime.utcnow()}},
+                upsert=True,
+            )
+        except PyMongoError as e:
+            print(f"[grade_cache] shared store failed: {e}")
+
+    def stats(self):
+        return {
+            'size': self.local.stats()['size'],
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'shared': self.collection is not None,
+        }
@@ -0,0 +1,307 @@
+# ==== 비동기 채점 큐 ====
+# save_response 는 응답을 success="pending" 으로 먼저 저장한 뒤 GradeJobs 에 작업을 넣는다.
+# 각 gunicorn 워커의 채점 스레드가 작업을 lease 로 가져가 채점한 뒤 Responses 의 success/output 을 채운다.
+#   - lease 가 끝나도록 완료되지 않은 작업(워커가 죽은 경우)은 다른 스레드가 다시 가져간다.
+#   - 채점 실패(실행기 오류 등)는 max_attempts 까지 점점 늦게 재시도하고, 그래도 안 되면 failed 로 둔다.
+#   - Responses.grade_job 이 작업 _id 와 같을 때만 결과를 쓰므로, 그 사이 새로 저장된 답안의 판정을 덮어쓰지 않는다.
+#   - 결과를 쓴 응답은 Progress(학생·문제별 최신 판정)에도 반영한다.
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+from pymongo import ReturnDocument
+
+import progress
+
+COLLECTION = 'GradeJobs'
+PENDING = 'pending'
+
+
+def enqueue(jobs, job_id, response_id, db_key, problem_alias, content):
+    """채점 작업 추가. Responses.grade_job 에 job_id 를 먼저 저장한 뒤 호출한다."""
+    jobs.insert_one({
+        "_id": job_id,
+        "response_id": response_id,
+        "db_key": db_key,
+        "problem_alias": problem_alias,
+        "content": content,
+        "state": "queued",
+        "attempts": 0,
+        "run_after": 0,
+        "lease_until": 0,
+        "created_at": datetime.utcnow(),
+    })
+
+
+class GradeWorkers:
+    """grade(job) -> (success, output, debug) 를 스레드 여러 개에서 돌린다.
+
+    responses_for(db_key) 는 해당 DB 의 Responses 컬렉션을 반환한다.
+    """
+
+    def __init__(self, jobs, grade, responses_for, threads=2, lease=60, max_attempts=3, poll=1.0):
+        self.jobs = jobs
+        self.grade = grade
+        self.responses_for = responses_for
+        self.threads = threads
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.poll = poll
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.done = 0
+        self.failed = 0
+        self.retried = 0
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """프로세스(pid)마다 한 번만 스레드를 띄운다 (fork 이후 호출돼도 안전)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            for n in range(self.threads):
+                threading.Thread(target=self._loop, name=f'grade-{n}', daemon=True).start()
+
+    def notify(self):
+        # 같은 워커에서 넣은 작업은 폴링을 기다리지 않고 바로 처리
+        self._wakeup.set()
+
+    def _claim(self):
+        now = time.time()
+        return self.jobs.find_one_and_update(
+            {"$or": [
+                {"state": "queued", "run_after": {"$lte": now}},
+                {"state": "running", "lease_until": {"$lt": now}},
+            ]},
+            {"$set": {"state": "running", "lease_until": now + self.lease, "worker": self.worker_id},
+             "$inc": {"attempts": 1}},
+            sort=[("_id", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def _write_verdict(self, job, success, output):
+        responses = self.responses_for(job["db_key"])
+        document = responses.find_one_and_update(
+            {"_id": job["response_id"], "grade_job": job["_id"]},
+            {"$set": {"success": success, "output": output}},
+            projection={"sid": 1, "name": 1, "problem_alias": 1, "success": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if document:
+            progress.record_response(responses, document)
+
+    def _finish(self, job, success, output, debug):
+        self._write_verdict(job, success, output)
+        self.jobs.update_one(
+            {"_id": job["_id"], "worker": self.worker_id},
+            {"$set": {"state": "done", "success": success, "debug": debug, "finished_at": datetime.utcnow()}},
+        )
+
+    def _fail(self, job, error):
+        if job["attempts"] < self.max_attempts:
+            # 재시도: 2, 4, 8 ... 초 뒤
+            self.retried += 1
+            self.jobs.update_one(
+                {"_id": job["_id"], "worker": self.worker_id},
+                {"$set": {"state": "queued", "run_after": time.time() + 2 ** job["attempts"], "error": error}},
+            )
+            return
+        self.failed += 1
+        self._write_verdict(job, "null", None)
+        self.jobs.update_one(
+            {"_id": job["_id"], "worker": self.worker_id},
+            {"$set": {"state": "failed", "error": error, "finished_at": datetime.utcnow()}},
+        )
+
+    def run_once(self):
+        """작업 하나 처리. 처리할 작업이 없으면 False"""
+        job = self._claim()
+        if job is None:
+            return False
+        try:
+            success, output, debug = self.grade(job)
+        except Exception as e:
+            self._fail(job, str(e))
+            return True
+        self.done += 1
+        self._finish(job, success, output, debug)
+        return True
+
+    def _loop(self):
+        while True:
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                print(f"[grading] worker error: {e}")
+            self._wakeup.wait(self.poll)
+            self._wakeup.clear()
+
+    def stats(self):
+        counts = {state: 0 for state in ("queued", "running", "done", "failed")}
+        for row in self.jobs.aggregate([{"$group": {"_id": "$state", "n": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["n"]
+        return {
+            "worker": self.worker_id,
+            "threads": self.threads,
+            "done": self.done,
+            "failed": self.failed,
+            "retried": self.retried,
+            "jobs": counts,
+        }
+
+
+# ==== 채점 규칙 (Flask 앱과 regrade.py 가 같이 쓴다) ====
+def test_data(document):
+    """Problems 도큐먼트 -> 채점용 {cases, early_exit, lang} (테스트가 없으면 None)"""
+
+    # 결과 처리: test 는 {input, output} 하나, 또는 {"cases": [{input, output}, ...], "early_exit": bool}, 또는 케이스 목록
+    if document and "test" in document:
+        test = document["test"]
+        early_exit = False
+        if isinstance(test, list):
+            cases = test
+        elif "cases" in test:
+            cases, early_exit = test["cases"], test.get("early_exit", False)
+        else:
+            cases = [test]
+        if not cases:
+            return None
+        test_data = {
+            "cases": [{"input": case.get("input", ""), "output": case.get("output", "")} for case in cases],
+            "early_exit": bool(early_exit),
+            "lang": document.get("lang", "")
+        }
+        return test_data
+    else:
+        return None  # alias가 존재하지 않거나 테스트 데이터가 없는 경우
+
+
+def c_test_insert(source_code, insert_string):
+    # 'int main' 패턴을 찾는 정규식 (다양한 스타일 지원)
+    pattern = r"(.*?)(int\s+main\s*\(\s*(?:void)?\s*\)\s*\{)([\s\S]*?)(^\})\s*(.*)"
+
+    match = re.search(pattern, source_code, re.DOTALL | re.MULTILINE)
+    
+    if match:
+        # 그룹화된 부분 추출
+        before_main = match.group(1)  # 'int main()' 앞의 모든 코드
+        main_signature = match.group(2).strip()  # 'int main(void) {' (공백 제거)
+        main_body = match.group(3).strip()  # '{...}' 내부 코드 (공백 제거)
+        closing_brace = match.group(4)  # '}' 닫는 중괄호 (줄바꿈 포함)
+        after_main = match.group(5)  # '}' 이후의 모든 코드
+
+        # `return` 문 찾기
+        return_match = re.search(r"^\s*(return\s+[^;]+;)", main_body, re.MULTILINE)
+
+        if return_match:
+            # `return` 문을 찾아 저장 후 삭제
+            return_statement = return_match.group(1)
+            main_body = re.sub(r"^\s*return\s+[^;]+;", "", main_body, flags=re.MULTILINE).strip()
+
+            # 새로운 코드 삽입 후 return 추가
+            updated_main_body = main_body + "printf(\"\\n\"); //test code begins"+"\n" + insert_string + "\n" + return_statement
+        else:
+            # `return`이 없는 경우 그냥 추가
+            updated_main_body = main_body + "\nprintf(\"\\n\"); //test code begins"+"\n" + insert_string
+
+        # 최종 코드 조합
+        return f"{before_main}{main_signature}\n{updated_main_body}\n{closing_brace}{after_main}"
+    else:
+        return source_code  # 패턴이 없으면 원본 반환
+
+
+def test_payload(code, test_data):
+    """실행기 /invoke 요청 본문과 케이스별 최종 코드(테스트 입력이 덧붙은 코드) 목록"""
+    cases = test_data["cases"]
+    lang = test_data["lang"]
+
+    def with_input(input):
+        if (lang=='c'):
+            return c_test_insert(code, input)
+        else:
+            return code+"\n"+input
+    codes = [with_input(case["input"]) for case in cases]
+
+    # 케이스가 여럿이면 실행기에서 병렬로 돌리고 케이스별 통과 여부를 받는다
+    if len(cases) == 1:
+        payload = {
+            "code": codes[0],
+            "language": lang
+        }
+    else:
+        payload = {
+            "language": lang,
+            "cases": [{"code": c, "expected": case["output"]} for c, case in zip(codes, cases)],
+            "early_exit": test_data["early_exit"]
+        }
+    return payload, codes
+
+def judge(data, codes, test_data):
+    """실행기 응답 -> 실행 결과(stdout/stderr 등) + success, code(실행한 최종 코드), expected(비교한 출력), passed/total.
+    여러 케이스면 처음 실패한 케이스(없으면 마지막 케이스)의 결과를 담는다."""
+    cases = test_data["cases"]
+    if len(cases) == 1:
+        lambda_output = data.get('stdout')  # Lambda에서 반환된 출력
+        def normalize(text):
+            """불필요한 공백과 줄바꿈을 제거하고, 텍스트를 비교-friendly하게 변환"""
+            return re.sub(r'\s+', '', text).strip()  # 연속된 공백을 단일 공백으로 변환
+        normal_output = normalize(cases[0]["output"])
+        normal_lambda_output = normalize(lambda_output)
+        data["success"] = normalize(normal_lambda_output).endswith(normal_output)
+        data["passed"], data["total"] = int(data["success"]), 1
+        data["code"] = codes[0]
+        data["expected"] = cases[0]["output"]
+        return data
+    results = data["cases"]
+    shown = next((i for i, r in enumerate(results) if r.get("passed") is False), len(results) - 1)
+    passed, total = data["passed"], data["total"]
+    data = dict(results[shown])
+    data["success"] = passed == total
+    data["passed"], data["total"] = passed, total
+    data["code"] = codes[shown]
+    data["expected"] = cases[shown]["output"]
+    return data
+
+
+def format_result(result):
+    """execute_test 결과 -> (output, debug) HTML 문자열"""
+    debug = str(
+        '\n<div class="debug-text">'
+        "----------\ntest debug\n----------"
+        "\n<code>stdout:</code>\n" + result["stdout"] +
+        "\n<code>stderr:</code>\n" + result["stderr"] +
+        "\n<code>test output:</code>\n" + result["expected"] +
+        "\n<code>test code:</code>\n" + result["code"] +
+        "\n</div>"
+    )
+    output = str (
+        "\n<code>stdout:</code>\n" + result["stdout"] +
+        "\n<code>stderr:</code>\n" + result["stderr"] +
+        "\n<code>test output:</code>\n" + result["expected"]
+        )
+    if result["total"] > 1:
+        output += f"\n<code>passed:</code> {result['passed']}/{result['total']}"
+    return output, debug
+
+
+def make_grader(test_data, client):
+    """재채점(regrade.run)용 채점기. test_data 가 없으면 None.
+    client 는 invoke_batch 를 제공하는 실행기 클라이언트 (executor_client.ExecutorClient)."""
+    if not test_data:
+        return None
+
+    def verdict(data, codes):
+        result = judge(data, codes, test_data)
+        output, _debug = format_result(result)
+        return json.dumps(result["success"]), output
+
+    return SimpleNamespace(client=client, payload=lambda content: test_payload(content, test_data), verdict=verdict)
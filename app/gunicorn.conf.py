@@ -0,0 +1,24 @@
+# ==== gunicorn 설정 ====
+# gthread 워커: 요청 하나가 기다리는 동안(bcrypt, 채점 결과 등) 같은 워커의 다른 스레드가 나머지 요청을 처리한다.
+import os
+import sys
+import threading
+
+bind = "0.0.0.0:8080"
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+
+def on_starting(server):
+    # 인덱스는 워커마다가 아니라 마스터가 시작할 때 한 번만 적용한다 (이미 있으면 no-op, ENSURE_INDEXES=0 이면 건너뜀).
+    # 큰 컬렉션의 인덱스 빌드가 부팅을 막지 않도록 백그라운드 스레드에서.
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if os.getenv('ENSURE_INDEXES', '1') != '1':
+        return
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import indexes
+
+    threading.Thread(target=indexes.bootstrap_env, daemon=True).start()
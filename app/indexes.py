@@ -0,0 +1,208 @@
+# ==== 컬렉션 인덱스 정의 ====
+# app.py 의 주요 조회가 모두 인덱스를 타도록 컬렉션별 인덱스를 한곳에 선언한다.
+# 인덱스 정의는 여기에만 둔다 (init-*.js 는 컬렉션만 만들고, logstore 도 이 정의를 쓴다).
+# gunicorn 마스터가 시작할 때 한 번(ENSURE_INDEXES=1, 기본값, gunicorn.conf.py)과 CLI 에서 같은 정의를 적용하며,
+# create_indexes 는 이미 같은 인덱스가 있으면 아무것도 하지 않으므로 여러 번 실행해도 된다.
+#
+#   python indexes.py                      # ACTIVE, ARCHIVE 에 적용
+#   python indexes.py --db ARCHIVE
+#   python indexes.py --check              # explain() 으로 COLLSCAN 여부만 확인
+import argparse
+import os
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+import grade_cache
+import grading
+import logstore
+import progress
+import similarity
+
+INDEXES = {
+    'Responses': [
+        # /log 대시보드: 학생의 문제별 응답을 최신순으로
+        IndexModel([('problem_alias', ASCENDING), ('sid', ASCENDING), ('name', ASCENDING), ('_id', DESCENDING)],
+                   name='problem_student_recent'),
+        # 학생이 응시한 시트(alias) 목록 (distinct)
+        IndexModel([('sid', ASCENDING), ('name', ASCENDING), ('alias', ASCENDING)], name='student_alias'),
+        # /search: 시트의 문제 목록 (distinct)
+        IndexModel([('alias', ASCENDING), ('problem_alias', ASCENDING)], name='alias_problem'),
+        # 문제별 응답을 _id 순서로 페이지 단위 조회 (재채점 등)
+        IndexModel([('problem_alias', ASCENDING), ('_id', ASCENDING)], name='problem_id'),
+    ],
+    'Problems': [IndexModel([('alias', ASCENDING)], name='alias')],
+    'Sheets': [IndexModel([('alias', ASCENDING)], name='alias')],
+    'Students': [IndexModel([('studentid', ASCENDING), ('name', ASCENDING)], name='student')],
+    logstore.COLLECTION: [
+        IndexModel([('response_id', ASCENDING), ('b', ASCENDING)], unique=True, name='response_bucket'),
+    ],
+    logstore.KEYFRAMES: [
+        IndexModel([('response_id', ASCENDING), ('i', ASCENDING)], unique=True, name='response_position'),
+        IndexModel([('response_id', ASCENDING), ('t', ASCENDING)], name='response_time'),
+    ],
+    # 학생·문제별 최신 판정 (record 의 upsert 와 backfill 의 $merge 가 이 유일 인덱스에 기대고 있음)
+    progress.COLLECTION: [
+        IndexModel([('problem_alias', ASCENDING), ('sid', ASCENDING), ('name', ASCENDING)], unique=True,
+                   name='problem_student'),
+    ],
+    # 유사도 색인: 응답당 하나, 같은 문제에서 밴드 해시가 겹치는 응답(LSH 후보) 조회
+    similarity.COLLECTION: [
+        IndexModel([('response_id', ASCENDING)], unique=True, name='response'),
+        IndexModel([('problem_alias', ASCENDING), ('bands', ASCENDING)], name='problem_bands'),
+    ],
+    # 공유 채점 캐시: 7일 지난 판정은 Mongo 가 지운다
+    grade_cache.COLLECTION: [
+        IndexModel([('created_at', ASCENDING)], expireAfterSeconds=7 * 24 * 3600, name='expire'),
+    ],
+    # 비동기 채점 작업: 대기 작업 / lease 만료 작업 조회, 끝난 작업은 1일 뒤 삭제
+    grading.COLLECTION: [
+        IndexModel([('state', ASCENDING), ('run_after', ASCENDING)], name='state_run_after'),
+        IndexModel([('state', ASCENDING), ('lease_until', ASCENDING)], name='state_lease'),
+        IndexModel([('finished_at', ASCENDING)], expireAfterSeconds=24 * 3600, name='expire'),
+    ],
+}
+
+# ACTIVE 외의 DB(ARCHIVE, DS_URI, ...)에는 Responses 와 로그, 진행 상황, 유사도 색인 컬렉션만 있다
+RESPONSE_COLLECTIONS = ('Responses', logstore.COLLECTION, logstore.KEYFRAMES, progress.COLLECTION,
+                        similarity.COLLECTION)
+
+# app.py 의 대표 조회 (explain 용). 값은 플랜 선택에 영향이 없으므로 빈 값을 쓴다.
+CHECKS = [
+    ('Responses', 'dashboard responses', {
+        'find': 'Responses',
+        'filter': {'problem_alias': {'$in': ['']}, 'sid': '', 'name': ''},
+        'sort': {'_id': -1},
+    }),
+    ('Responses', 'student aliases', {'distinct': 'Responses', 'key': 'alias', 'query': {'sid': '', 'name': ''}}),
+    ('Responses', 'sheet problems', {'distinct': 'Responses', 'key': 'problem_alias', 'query': {'alias': ''}}),
+    ('Responses', 'problem responses', {'find': 'Responses', 'filter': {'problem_alias': ''}}),
+    ('Responses', 'problem responses by _id', {
+        'find': 'Responses',
+        'filter': {'problem_alias': '', '_id': {'$gt': ''}},
+        'sort': {'_id': 1},
+        'limit': 500,
+    }),
+    ('Responses', 'problem responses page', {
+        'find': 'Responses',
+        'filter': {'problem_alias': '', '_id': {'$lt': ''}},
+        'projection': {'_id': 1},
+        'sort': {'_id': -1},
+        'limit': 101,
+    }),
+    (progress.COLLECTION, 'progress matrix', {
+        'find': progress.COLLECTION,
+        'filter': {'problem_alias': {'$in': ['']}},
+        'projection': {'_id': 0, 'sid': 1, 'name': 1, 'problem_alias': 1, 'success': 1},
+    }),
+    ('Problems', 'problem by alias', {'find': 'Problems', 'filter': {'alias': ''}, 'limit': 1}),
+    ('Sheets', 'sheet by alias', {'find': 'Sheets', 'filter': {'alias': {'$in': ['']}}}),
+    ('Students', 'student login', {'find': 'Students', 'filter': {'studentid': '', 'name': ''}, 'limit': 1}),
+    (logstore.COLLECTION, 'log buckets', {
+        'find': logstore.COLLECTION,
+        'filter': {'response_id': '', 'b': {'$gte': 0}},
+        'sort': {'b': 1},
+    }),
+    (logstore.KEYFRAMES, 'keyframe by time', {
+        'find': logstore.KEYFRAMES,
+        'filter': {'response_id': '', 't': {'$lte': 0}},
+        'sort': {'t': -1},
+        'limit': 1,
+    }),
+]
+
+
+def collections_for(db_key):
+    return list(INDEXES) if db_key == 'ACTIVE' else list(RESPONSE_COLLECTIONS)
+
+
+def ensure(db, collections):
+    """인덱스 정의 적용. 충돌 등으로 실패한 컬렉션은 건너뛰고 (컬렉션, 오류) 목록을 반환한다."""
+    failed = []
+    for name in collections:
+        try:
+            db[name].create_indexes(INDEXES[name])
+        except OperationFailure as e:
+            failed.append((name, str(e)))
+    return failed
+
+
+def _stages(plan):
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_stages(value))
+    return stages
+
+
+def check(db, collections):
+    """대표 조회를 explain 해서 [(컬렉션, 설명, 단계 목록, COLLSCAN 여부)] 를 반환"""
+    report = []
+    for name, label, command in CHECKS:
+        if name not in collections:
+            continue
+        explain = db.command('explain', command, verbosity='queryPlanner')
+        stages = _stages(explain.get('queryPlanner', {}).get('winningPlan', {}))
+        report.append((name, label, stages, 'COLLSCAN' in stages))
+    return report
+
+
+def bootstrap(clients):
+    """앱 시작 시 호출. clients: {db_key: MongoClient}. 실패해도 앱은 계속 뜬다."""
+    for db_key, client in clients.items():
+        try:
+            for name, error in ensure(client['Codelog'], collections_for(db_key)):
+                print(f"[indexes] {db_key}.{name}: {error}")
+        except Exception as e:
+            print(f"[indexes] {db_key}: index bootstrap failed: {e}")
+
+
+def bootstrap_env(db_keys=('ACTIVE', 'ARCHIVE')):
+    """.env 의 DB 들에 bootstrap. 클라이언트는 따로 만들고 끝나면 닫는다 (워커가 쓰는 레지스트리와 섞이지 않도록)."""
+    from pymongo import MongoClient
+
+    clients = {db_key: MongoClient(os.getenv(db_key)) for db_key in db_keys if os.getenv(db_key)}
+    try:
+        bootstrap(clients)
+    finally:
+        for client in clients.values():
+            client.close()
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Create (or check) the indexes used by the Flask app")
+    parser.add_argument("--db", action="append", help="env key of the MongoDB URI (default: ACTIVE and ARCHIVE)")
+    parser.add_argument("--check", action="store_true", help="only explain() the app's queries and report COLLSCANs")
+    args = parser.parse_args()
+
+    load_dotenv()
+    collscans = 0
+    for db_key in args.db or ['ACTIVE', 'ARCHIVE']:
+        uri = os.getenv(db_key)
+        if not uri:
+            print(f"[indexes] {db_key} is not set in .env, skipped")
+            continue
+        db = MongoClient(uri)['Codelog']
+        collections = collections_for(db_key)
+        if not args.check:
+            failed = ensure(db, collections)
+            for name, error in failed:
+                print(f"[indexes] {db_key}.{name}: {error}")
+            print(f"[indexes] {db_key}: {len(collections) - len(failed)}/{len(collections)} collections indexed")
+        for name, label, stages, collscan in check(db, collections):
+            collscans += collscan
+            print(f"[indexes] {db_key}.{name} {label}: {' > '.join(stages)}{'  <-- COLLSCAN' if collscan else ''}")
+    if collscans:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+# ==== 키 입력 로그 압축 포맷 ====
+# 정수 idx(키 입력) 항목은 전체 코드를 매번 저장하지 않고
+#   - keyframe: {"idx": n, "timestamp", "time interval", "content": 전체 코드}
+#   - delta   : {"idx": n, "timestamp", "time interval", "delta": [[pos, del, ins], ...]}
+# 로 저장한다. delta 는 직전 키 입력 시점의 코드에 순서대로 적용하는 편집 연산이며
+# pos/del 은 브라우저(JS 문자열)와 같은 UTF-16 코드 단위 기준이다.
+# KEYFRAME_INTERVAL 개의 delta 마다 keyframe 을 하나씩 둔다.
+# 문자 idx 항목(v, o, e, s, u, a, d)은 기존 형식 그대로 둔다.
+# 예전(전체 스냅샷) 로그는 모든 항목이 keyframe 인 로그로 해석되므로 그대로 읽힌다.
+import re
+import sys
+from array import array
+
+KEYFRAME_INTERVAL = 50
+
+_ASTRAL = re.compile('[\U00010000-\U0010FFFF]')
+
+
+class LogFormatError(ValueError):
+    pass
+
+
+def is_edit(entry):
+    """정수 idx(키 입력) 항목 여부"""
+    idx = entry.get('idx')
+    return isinstance(idx, int) and not isinstance(idx, bool)
+
+
+def _units(text):
+    # BMP 밖 문자가 있으면 UTF-16 단위로 다뤄야 JS 오프셋과 맞는다
+    if _ASTRAL.search(text):
+        return text.encode('utf-16-le', 'surrogatepass'), 2
+    return text, 1
+
+
+def _text(units, width):
+    if width == 2:
+        return units.decode('utf-16-le', 'surrogatepass')
+    return units
+
+
+def _code_units(text):
+    units = array('H')
+    units.frombytes(text.encode('utf-16-le', 'surrogatepass'))
+    if sys.byteorder == 'big':
+        units.byteswap()
+    return units
+
+
+def _common_prefix(a, b):
+    # 슬라이스 비교(C 수준)로 이분 탐색
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix(a, b, floor):
+    lo, hi = 0, min(len(a), len(b)) - floor
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def utf16_len(text):
+    return len(text) + len(_ASTRAL.findall(text))
+
+
+def diff(old, new):
+    """old → new 편집 연산 목록 (공통 접두/접미를 뺀 단일 치환, 같으면 [])"""
+    if old == new:
+        return []
+    utf16 = bool(_ASTRAL.search(old) or _ASTRAL.search(new))
+    a, b = (_code_units(old), _code_units(new)) if utf16 else (old, new)
+    start = _common_prefix(a, b)
+    tail = _common_suffix(a, b, start)
+    end_a, end_b = len(a) - tail, len(b) - tail
+    if utf16:
+        # 서로게이트 쌍을 가르지 않도록 경계를 넓힌다
+        if start > 0 and 0xD800 <= a[start - 1] <= 0xDBFF:
+            start -= 1
+        if end_a < len(a) and 0xDC00 <= a[end_a] <= 0xDFFF:
+            end_a += 1
+            end_b += 1
+        ins = b[start:end_b].tobytes().decode('utf-16-le', 'surrogatepass')
+    else:
+        ins = b[start:end_b]
+    return [[start, end_a - start, ins]]
+
+
+def apply_delta(content, ops):
+    units, width = _units(content)
+    if width == 1 and any(_ASTRAL.search(op[2]) for op in ops):
+        units, width = content.encode('utf-16-le', 'surrogatepass'), 2
+    for pos, length, ins in ops:
+        p, n = pos * width, length * width
+        if p + n > len(units):
+            raise LogFormatError(f"delta out of range: pos={pos}, del={length}")
+        piece = ins.encode('utf-16-le', 'surrogatepass') if width == 2 else ins
+        units = units[:p] + piece + units[p + n:]
+    return _text(units, width)
+
+
+def _check_ops(ops):
+    if not isinstance(ops, list):
+        raise LogFormatError("delta must be a list")
+    for op in ops:
+        if (not isinstance(op, list) or len(op) != 3
+                or not all(isinstance(v, int) and not isinstance(v, bool) and v >= 0 for v in op[:2])
+                or not isinstance(op[2], str)):
+            raise LogFormatError(f"invalid delta op: {op!r}")
+
+
+def validate_log(entries, base=None):
+    """로그 형식 검사. base(직전 코드)를 알면 delta 적용 범위까지 확인한다."""
+    if not isinstance(entries, list):
+        raise LogFormatError("log must be a list")
+    content = base
+    for entry in entries:
+        if not isinstance(entry, dict) or 'idx' not in entry:
+            raise LogFormatError("log entry must be an object with idx")
+        if not isinstance(entry.get('timestamp'), (int, float)):
+            raise LogFormatError("log entry must have a numeric timestamp")
+        if not is_edit(entry):
+            continue
+        has_content = 'content' in entry
+        has_delta = 'delta' in entry
+        if has_content == has_delta:
+            raise LogFormatError("edit entry needs exactly one of content/delta")
+        if has_content:
+            if not isinstance(entry['content'], str):
+                raise LogFormatError("content must be a string")
+            content = entry['content']
+        else:
+            _check_ops(entry['delta'])
+            if content is not None:
+                content = apply_delta(content, entry['delta'])
+
+
+def encode_log(entries, keyframe_interval=KEYFRAME_INTERVAL):
+    """전체 스냅샷 항목을 keyframe + delta 형식으로 바꾼다 (이미 압축된 항목은 유지)"""
+    encoded = []
+    content = None
+    since_keyframe = 0
+    for entry in entries:
+        if not is_edit(entry):
+            encoded.append(entry)
+            continue
+        if 'delta' in entry:
+            if content is not None:
+                content = apply_delta(content, entry['delta'])
+            since_keyframe += 1
+            encoded.append(entry)
+            continue
+        new = entry['content']
+        if content is None or since_keyframe >= keyframe_interval:
+            encoded.append(entry)
+            since_keyframe = 0
+        else:
+            compact = {k: v for k, v in entry.items() if k != 'content'}
+            compact['delta'] = diff(content, new)
+            encoded.append(compact)
+            since_keyframe += 1
+        content = new
+    return encoded
+
+
+def decode_log(entries, base=None):
+    """압축 로그를 모든 키 입력 항목에 content 가 있는 예전 형식으로 풀어서 yield"""
+    content = base
+    for entry in entries:
+        if is_edit(entry) and 'delta' in entry:
+            if content is None:
+                raise LogFormatError("delta entry before any keyframe")
+            content = apply_delta(content, entry['delta'])
+            decoded = {k: v for k, v in entry.items() if k != 'delta'}
+            decoded['content'] = content
+            yield decoded
+        else:
+            if is_edit(entry):
+                content = entry['content']
+            yield entry
+
+
+def snapshot_at(entries, position, base=None):
+    """position 번째 항목까지 적용했을 때의 코드 (키 입력 기준)"""
+    content = base
+    for entry in entries[:position + 1]:
+        if not is_edit(entry):
+            continue
+        if 'delta' in entry:
+            if content is None:
+                raise LogFormatError("delta entry before any keyframe")
+            content = apply_delta(content, entry['delta'])
+        else:
+            content = entry['content']
+    return content
@@ -0,0 +1,392 @@
+# ==== 키 입력 로그 저장소 (LogChunks) ====
+# 로그는 Responses 도큐먼트 안에 두지 않고 LogChunks 컬렉션에 고정 크기 버킷으로 나눠 저장한다.
+#   {response_id, b, start, base, n, t0, t1, entries: [...]}
+# - b      : 버킷 번호 (전체 로그에서 b*BUCKET_SIZE 번째 항목부터 담음)
+# - base   : 버킷 첫 항목 직전의 코드 (버킷만 읽어도 delta 를 풀 수 있도록)
+# - n      : 버킷에 저장된 항목 수 / t0, t1: 타임스탬프 범위
+# Responses 에는 요약 필드(content, success, timestamp, log_len)만 남는다.
+#
+# 재생 화면의 탐색(seek)을 위해 LogKeyframes 컬렉션에 keyframe 색인을 따로 둔다.
+#   {response_id, i, t, content}  — i 번째 항목(키 입력)을 적용한 직후의 코드
+# KEYFRAME_EVERY 항목 또는 KEYFRAME_SECONDS 초마다 하나씩, 저장할 때(또는 아직 없으면 처음 조회될 때) 만들고
+# 이후에는 새로 추가된 로그만 이어서 색인한다. 로그 전체를 교체하면 색인도 지우고 다시 만든다.
+# 예전 도큐먼트(Responses.log 에 로그가 그대로 있는 경우)도 그대로 읽고 이어 쓸 수 있다.
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import keylog
+
+BUCKET_SIZE = 256
+COLLECTION = 'LogChunks'
+
+KEYFRAMES = 'LogKeyframes'
+KEYFRAME_EVERY = 64
+KEYFRAME_SECONDS = 30
+
+_indexed = set()
+
+
+def _ensure(collection):
+    # 정의는 indexes.py 에 있다 (indexes 가 이 모듈을 import 하므로 여기서 불러온다)
+    import indexes
+
+    key = (collection.database.name, collection.name, id(collection.database.client))
+    if key in _indexed:
+        return
+    collection.create_indexes(indexes.INDEXES[collection.name])
+    _indexed.add(key)
+
+
+def ensure_indexes(chunks):
+    # (response_id, b) 유일 인덱스가 있어야 버킷 upsert 가 중복 없이 동작한다.
+    # 인덱스를 bootstrap 하지 않은 DB(migrate_logs.py 등)에서도 처음 쓸 때 한 번 만든다.
+    _ensure(chunks)
+
+
+def ensure_keyframe_indexes(keyframes):
+    _ensure(keyframes)
+
+
+def _state_before(chunks, response_id, position):
+    """position 번째 항목 직전의 코드 (position 이 속한/직전 버킷 하나만 읽음)"""
+    if position == 0:
+        return None
+    b = (position - 1) // BUCKET_SIZE
+    bucket = chunks.find_one({"response_id": response_id, "b": b}, {"base": 1, "entries": 1})
+    if bucket is None:
+        return None
+    upto = position - b * BUCKET_SIZE
+    return keylog.snapshot_at(bucket["entries"][:upto], upto - 1, base=bucket.get("base"))
+
+
+def _write_bucket(chunks, response_id, b, offset, part, base):
+    """버킷 b 의 offset 위치부터 part 를 저장. 이미 저장된 항목은 건너뛴다(재시도 안전)."""
+    while part:
+        update = {
+            "$push": {"entries": {"$each": part}},
+            "$inc": {"n": len(part)},
+        }
+        times = [e["timestamp"] for e in part if isinstance(e.get("timestamp"), (int, float))]
+        if times:
+            update["$min"] = {"t0": min(times)}
+            update["$max"] = {"t1": max(times)}
+        if offset == 0:
+            update["$setOnInsert"] = {"start": b * BUCKET_SIZE, "base": base}
+        try:
+            result = chunks.update_one({"response_id": response_id, "b": b, "n": offset}, update, upsert=(offset == 0))
+            if result.matched_count or result.upserted_id is not None:
+                return
+        except DuplicateKeyError:
+            pass
+        existing = chunks.find_one({"response_id": response_id, "b": b}, {"n": 1})
+        stored = existing["n"] if existing else 0
+        if stored < offset:
+            raise RuntimeError(f"log bucket {b} of {response_id} is missing entries")
+        part = part[stored - offset:]
+        offset = stored
+
+
+def write_entries(chunks, response_id, start, entries):
+    """entries 를 전체 로그의 start 번째 위치부터 버킷에 나눠 저장"""
+    if not entries:
+        return
+    ensure_indexes(chunks)
+    end = start + len(entries)
+    crosses = any(p % BUCKET_SIZE == 0 for p in range(max(start, 1), end))
+    state = _state_before(chunks, response_id, start) if crosses and start > 0 else None
+
+    position = start
+    while position < end:
+        b = position // BUCKET_SIZE
+        stop = min(end, (b + 1) * BUCKET_SIZE)
+        part = entries[position - start:stop - start]
+        offset = position - b * BUCKET_SIZE
+        base = state if offset == 0 else None
+        _write_bucket(chunks, response_id, b, offset, part, base)
+        if crosses:
+            state = keylog.snapshot_at(part, len(part) - 1, base=state)
+        position = stop
+
+
+def truncate(chunks, response_id, length):
+    """length 번째 이후의 항목을 버킷에서 지운다 (반영되지 못한 append 가 남긴 항목 정리)"""
+    b, offset = divmod(length, BUCKET_SIZE)
+    if offset:
+        chunks.update_one(
+            {"response_id": response_id, "b": b, "n": {"$gt": offset}},
+            {"$push": {"entries": {"$each": [], "$slice": offset}}, "$set": {"n": offset}}
+        )
+        b += 1
+    chunks.delete_many({"response_id": response_id, "b": {"$gte": b}})
+
+
+def append(responses, chunks, response_id, log_from, entries, fields):
+    """log_from 번째 이후의 로그 항목을 이어 붙이고 Responses 의 fields 를 갱신한다.
+
+    같은 요청을 다시 보내도 이미 저장된 항목은 건너뛰므로 안전하다(idempotent).
+    반환값: (상태, 서버에 저장된 로그 개수) — 상태는 "ok" / "conflict" / "missing"
+    """
+    for _attempt in range(3):
+        document = responses.find_one(
+            {"_id": response_id},
+            {"log_len": 1, "inline": {"$isArray": "$log"}, "log_size": {"$size": {"$ifNull": ["$log", []]}}}
+        )
+        if document is None:
+            return "missing", 0
+        current = document.get("log_len", document["log_size"])
+        if log_from > current:
+            return "conflict", current
+        new_entries = entries[current - log_from:]
+
+        if document["inline"]:
+            # 예전 도큐먼트: Responses.log 에 계속 이어 붙인다
+            if "log_len" in document:
+                guard = {"_id": response_id, "log_len": current}
+            else:
+                guard = {"_id": response_id, "log_len": {"$exists": False}}
+            update = {"$set": dict(fields, log_len=current + len(new_entries))}
+            if new_entries:
+                update["$push"] = {"log": {"$each": new_entries}}
+            # log_len 이 그대로일 때만 반영 (동시에 들어온 저장과 겹치면 다시 시도)
+            if responses.update_one(guard, update).matched_count > 0:
+                return "ok", current + len(new_entries)
+            continue
+
+        write_entries(chunks, response_id, current, new_entries)
+        result = responses.update_one(
+            {"_id": response_id},
+            {"$set": fields, "$max": {"log_len": current + len(new_entries)}}
+        )
+        if result.matched_count == 0:
+            # 그 사이 응답이 지워짐 (이관·관리자 삭제): 방금 쓴 항목을 버킷에서 치우고 실패로 알린다
+            truncate(chunks, response_id, current)
+            return "missing", current
+        return "ok", current + len(new_entries)
+    return "conflict", current
+
+
+def replace(responses, chunks, response_id, entries, fields):
+    """로그 전체를 entries 로 교체 (log_from 없이 전체 로그를 보내는 예전 클라이언트용)"""
+    if responses.find_one({"_id": response_id}, {"_id": 1}) is None:
+        return False
+    # 예전 로그로 만든 keyframe 이 남으면 snapshot 이 틀린 코드를 돌려주므로 색인도 처음부터
+    keyframes = chunks.database[KEYFRAMES]
+    keyframes.delete_many({"response_id": response_id})
+    chunks.delete_many({"response_id": response_id})
+    write_entries(chunks, response_id, 0, entries)
+    responses.update_one(
+        {"_id": response_id},
+        {"$set": dict(fields, log_len=len(entries)), "$unset": {"log": "", "keyframes_upto": ""}}
+    )
+    # 교체하는 동안 예전 로그로 색인한 요청이 넣었을 수 있는 keyframe 도 지운다
+    keyframes.delete_many({"response_id": response_id})
+    return True
+
+
+def iter_entries(chunks, response_id):
+    """버킷 순서대로 로그 항목(압축 형식)을 yield"""
+    for bucket in chunks.find({"response_id": response_id}, {"entries": 1}).sort("b", 1):
+        yield from bucket["entries"]
+
+
+def load_log(responses, chunks, response_id):
+    """압축 형식 로그 전체 (예전 inline 로그 포함). 도큐먼트가 없으면 None"""
+    document = responses.find_one({"_id": response_id}, {"log": 1})
+    if document is None:
+        return None
+    if "log" in document:
+        return document["log"]
+    return list(iter_entries(chunks, response_id))
+
+
+def iter_log(responses, chunks, response_id, from_idx=0, to_idx=None, from_ts=None, to_ts=None):
+    """from_idx ≤ 위치 < to_idx (그리고 from_ts ≤ timestamp ≤ to_ts) 범위의 로그를
+    (위치, 풀어낸 항목) 으로 yield 하는 제너레이터.
+
+    버킷 단위로 읽어 각 버킷의 base 부터 풀기 때문에 메모리 사용량이 로그 길이와 무관하다.
+    도큐먼트가 없으면 None 을 반환한다.
+    """
+    document = responses.find_one({"_id": response_id}, {"inline": {"$isArray": "$log"}})
+    if document is None:
+        return None
+
+    def in_range(position, entry):
+        if position < from_idx or (to_idx is not None and position >= to_idx):
+            return False
+        timestamp = entry.get("timestamp")
+        if from_ts is not None and not (isinstance(timestamp, (int, float)) and timestamp >= from_ts):
+            return False
+        if to_ts is not None and not (isinstance(timestamp, (int, float)) and timestamp <= to_ts):
+            return False
+        return True
+
+    def generate():
+        if document["inline"]:
+            # 예전 도큐먼트: Responses.log 전체를 읽어 잘라낸다
+            log = responses.find_one({"_id": response_id}, {"log": 1}).get("log", [])
+            for position, entry in enumerate(keylog.decode_log(log)):
+                if in_range(position, entry):
+                    yield position, entry
+            return
+        query = {"response_id": response_id, "b": {"$gte": from_idx // BUCKET_SIZE}}
+        if to_idx is not None:
+            query["b"]["$lte"] = max(to_idx - 1, 0) // BUCKET_SIZE
+        if from_ts is not None:
+            query["t1"] = {"$gte": from_ts}
+        if to_ts is not None:
+            query["t0"] = {"$lte": to_ts}
+        cursor = chunks.find(query, {"b": 1, "base": 1, "entries": 1}).sort("b", 1)
+        for bucket in cursor:
+            position = bucket["b"] * BUCKET_SIZE
+            for entry in keylog.decode_log(bucket["entries"], base=bucket.get("base")):
+                if to_idx is not None and position >= to_idx:
+                    return
+                if in_range(position, entry):
+                    yield position, entry
+                position += 1
+
+    return generate()
+
+
+def log_meta(entries):
+    """(위치, 항목) 목록에서 play.html 의 handleLoadedLogData 가 계산하던 요약값을 구한다"""
+    count = 0
+    edit_count = 0
+    start_ts = end_ts = None
+    min_len = max_len = None
+    for _position, entry in entries:
+        count += 1
+        timestamp = entry.get("timestamp")
+        if entry.get("idx") not in ("a", "d") and isinstance(timestamp, (int, float)):
+            start_ts = timestamp if start_ts is None else min(start_ts, timestamp)
+            end_ts = timestamp if end_ts is None else max(end_ts, timestamp)
+        if keylog.is_edit(entry):
+            edit_count += 1
+            length = keylog.utf16_len(entry["content"])
+            min_len = length if min_len is None else min(min_len, length)
+            max_len = length if max_len is None else max(max_len, length)
+    return {
+        "count": count,
+        "edit_count": edit_count,
+        "start_timestamp": start_ts,
+        "end_timestamp": end_ts,
+        "min_content_length": min_len,
+        "max_content_length": max_len,
+    }
+
+
+def iter_raw(chunks, response_id, from_idx, to_idx=None):
+    """풀지 않은(압축 형식) 항목을 (위치, 항목) 으로 yield"""
+    query = {"response_id": response_id, "b": {"$gte": from_idx // BUCKET_SIZE}}
+    if to_idx is not None:
+        query["b"]["$lte"] = max(to_idx - 1, 0) // BUCKET_SIZE
+    for bucket in chunks.find(query, {"b": 1, "entries": 1}).sort("b", 1):
+        position = bucket["b"] * BUCKET_SIZE
+        for entry in bucket["entries"]:
+            if to_idx is not None and position >= to_idx:
+                return
+            if position >= from_idx:
+                yield position, entry
+            position += 1
+
+
+def build_keyframes(responses, chunks, keyframes, response_id):
+    """아직 색인하지 않은 로그 구간의 keyframe 을 만들어 저장. 도큐먼트가 없으면 None"""
+    document = responses.find_one(
+        {"_id": response_id},
+        {"log_len": 1, "keyframes_upto": 1, "inline": {"$isArray": "$log"}}
+    )
+    if document is None or document["inline"]:
+        # 예전 inline 로그는 도큐먼트 하나에 모두 있으므로 색인하지 않는다
+        return document
+    upto = document.get("keyframes_upto", 0)
+    if upto >= document.get("log_len", 0):
+        return document
+
+    ensure_keyframe_indexes(keyframes)
+    last = keyframes.find_one({"response_id": response_id}, {"i": 1, "t": 1}, sort=[("i", -1)])
+    last_i, last_t = (last["i"], last["t"]) if last else (None, None)
+    batch = []
+    end = upto
+    for position, entry in iter_log(responses, chunks, response_id, from_idx=upto):
+        end = position + 1
+        if not keylog.is_edit(entry):
+            continue
+        timestamp = entry["timestamp"]
+        if (last_i is None or position - last_i >= KEYFRAME_EVERY
+                or timestamp - last_t >= KEYFRAME_SECONDS * 1000):
+            batch.append({"response_id": response_id, "i": position, "t": timestamp, "content": entry["content"]})
+            last_i, last_t = position, timestamp
+    if batch:
+        try:
+            keyframes.insert_many(batch, ordered=False)
+        except BulkWriteError:
+            pass  # 동시에 색인한 요청이 먼저 넣은 keyframe (중복) 은 무시
+    responses.update_one({"_id": response_id}, {"$max": {"keyframes_upto": end}})
+    document["keyframes_upto"] = end
+    return document
+
+
+def snapshot(responses, chunks, keyframes, response_id, idx=None, ts=None):
+    """idx 번째 항목(또는 ts 시점)까지 적용한 코드를 가장 가까운 keyframe 부터 재구성.
+
+    반환값: {"idx", "timestamp", "content", "keyframe"} / 도큐먼트가 없으면 None
+    """
+    document = build_keyframes(responses, chunks, keyframes, response_id)
+    if document is None:
+        return None
+
+    if document["inline"]:
+        log = responses.find_one({"_id": response_id}, {"log": 1}).get("log", [])
+        raw = list(enumerate(log))
+        base, start = None, None
+    else:
+        if idx is not None:
+            keyframe = keyframes.find_one({"response_id": response_id, "i": {"$lte": idx}}, sort=[("i", -1)])
+        else:
+            keyframe = keyframes.find_one({"response_id": response_id, "t": {"$lte": ts}}, sort=[("t", -1)])
+        if keyframe is None:
+            base, start = None, None
+            raw = iter_raw(chunks, response_id, 0, None if idx is None else idx + 1)
+        else:
+            base, start = keyframe["content"], keyframe["i"]
+            raw = iter_raw(chunks, response_id, start + 1, None if idx is None else idx + 1)
+
+    content = base
+    position, timestamp = start, None
+    if start is not None:
+        timestamp = keyframe["t"]
+    for pos, entry in raw:
+        if idx is not None and pos > idx:
+            break
+        if ts is not None and isinstance(entry.get("timestamp"), (int, float)) and entry["timestamp"] > ts:
+            break
+        if keylog.is_edit(entry):
+            if "delta" in entry:
+                content = keylog.apply_delta(content, entry["delta"])
+            else:
+                content = entry["content"]
+        position, timestamp = pos, entry.get("timestamp")
+    return {"idx": position, "timestamp": timestamp, "content": content, "keyframe": start}
+
+
+def migrate_document(responses, chunks, document, attempts=5):
+    """inline 로그를 LogChunks 로 옮기고 Responses.log 를 제거. 옮긴 항목 수를 반환한다.
+
+    옮기는 동안 저장(append 의 inline 분기)이 Responses.log 에 항목을 더 붙였으면 log 길이가 달라
+    제거하지 않고 다시 읽어서 옮긴다 (이미 버킷에 쓴 항목은 write_entries 가 건너뛴다).
+    """
+    response_id = document["_id"]
+    for _attempt in range(attempts):
+        entries = document.get("log") or []
+        write_entries(chunks, response_id, 0, entries)
+        result = responses.update_one(
+            {"_id": response_id, "log": {"$exists": True}, "$expr": {"$eq": [{"$size": "$log"}, len(entries)]}},
+            {"$unset": {"log": ""}, "$set": {"log_len": len(entries)}}
+        )
+        if result.matched_count:
+            return len(entries)
+        document = responses.find_one({"_id": response_id, "log": {"$exists": True}}, {"log": 1})
+        if document is None:
+            # 다른 실행이 먼저 옮겼거나 로그 전체가 교체됨 / 응답이 지워짐
+            return 0
+    raise RuntimeError(f"inline log of {response_id} kept changing while migrating")
@@ -0,0 +1,186 @@
+# ==== 응답별 코딩 행동 지표 ====
+# 키 입력 로그에서 응답 하나의 행동 지표를 계산해 Responses.metrics 에 저장한다.
+# 저장할 때마다 전체 로그를 다시 읽지 않고, 지난번에 처리한 위치(n) 이후의 새 항목만 읽어 누적한다.
+#   - keystrokes / inserted / deleted / churn   : 키 입력 수, 넣고 지운 글자 수(UTF-16 단위)
+#   - active_ms / idle_ms                       : 항목 사이 간격이 IDLE_MS 이하면 작업 시간, 넘으면 쉰 시간
+#   - pauses                                    : 키 입력 사이 간격 히스토그램 (PAUSE_BUCKETS 초 경계)
+#   - pastes / pasted_chars / paste_ratio       : 붙여넣기·드롭(v) 횟수와 글자 수, 넣은 글자 중 붙여넣은 비율
+#   - runs / run_errors                         : 실행 결과(o) + 오류(e), 그중 오류
+#   - submits_success / submits_fail            : 채점 결과(s / u)
+#   - first_success_ms                          : 첫 항목부터 처음 맞을 때(s)까지 걸린 시간
+#   - switches                                  : 다른 문제로 갔다가 돌아온 횟수(a)
+# 나머지 필드(n, last_*)는 이어서 계산하기 위한 상태다. VERSION 이 바뀌면 처음부터 다시 계산한다.
+#
+#   python metrics.py --db ACTIVE                       # metrics 가 없거나 오래된 응답을 모두 계산
+#   python metrics.py --db ACTIVE --problem-alias sm3-1
+import argparse
+import os
+from bisect import bisect_right
+
+import keylog
+import logstore
+
+VERSION = 1
+IDLE_MS = 30000
+PAUSE_BUCKETS = (1, 2, 5, 10, 30, 60, 300)  # 초. 마지막 칸은 300초 이상
+PAUSE_LABELS = tuple(f"<{b}s" for b in PAUSE_BUCKETS) + (f">={PAUSE_BUCKETS[-1]}s",)
+
+
+def empty():
+    return {
+        "version": VERSION,
+        "n": 0,
+        "keystrokes": 0,
+        "inserted": 0,
+        "deleted": 0,
+        "churn": 0,
+        "active_ms": 0,
+        "idle_ms": 0,
+        "pauses": {label: 0 for label in PAUSE_LABELS},
+        "pastes": 0,
+        "pasted_chars": 0,
+        "paste_ratio": 0.0,
+        "runs": 0,
+        "run_errors": 0,
+        "submits_success": 0,
+        "submits_fail": 0,
+        "first_success_ms": None,
+        "switches": 0,
+        "first_ts": None,
+        "last_ts": None,
+        "last_edit": None,     # 마지막으로 처리한 키 입력 항목의 위치 (다음 키 입력의 diff 기준)
+        "last_edit_ts": None,
+        "last_len": 0,
+    }
+
+
+def accumulate(metrics, entries, base=None):
+    """(위치, 풀어낸 항목) 들을 metrics 에 누적. base 는 첫 항목 직전 키 입력의 코드."""
+    content = base
+    for position, entry in entries:
+        idx = entry.get("idx")
+        timestamp = entry.get("timestamp")
+        if isinstance(timestamp, (int, float)):
+            if metrics["first_ts"] is None:
+                metrics["first_ts"] = timestamp
+            if metrics["last_ts"] is not None and timestamp >= metrics["last_ts"]:
+                gap = timestamp - metrics["last_ts"]
+                metrics["active_ms" if gap <= IDLE_MS else "idle_ms"] += gap
+            metrics["last_ts"] = max(timestamp, metrics["last_ts"] or timestamp)
+
+        if keylog.is_edit(entry):
+            metrics["keystrokes"] += 1
+            new = entry["content"]
+            if content is not None:
+                for _pos, length, ins in keylog.diff(content, new):
+                    metrics["inserted"] += keylog.utf16_len(ins)
+                    metrics["deleted"] += length
+            if metrics["last_edit_ts"] is not None and isinstance(timestamp, (int, float)):
+                pause = max(timestamp - metrics["last_edit_ts"], 0) / 1000
+                metrics["pauses"][PAUSE_LABELS[bisect_right(PAUSE_BUCKETS, pause)]] += 1
+            if isinstance(timestamp, (int, float)):
+                metrics["last_edit_ts"] = timestamp
+            metrics["last_edit"] = position
+            metrics["last_len"] = keylog.utf16_len(new)
+            content = new
+        elif idx == "v":
+            metrics["pastes"] += 1
+            metrics["pasted_chars"] += keylog.utf16_len(entry.get("content") or "")
+        elif idx in ("o", "e"):
+            metrics["runs"] += 1
+            metrics["run_errors"] += idx == "e"
+        elif idx == "s":
+            metrics["submits_success"] += 1
+            if metrics["first_success_ms"] is None and isinstance(timestamp, (int, float)):
+                metrics["first_success_ms"] = timestamp - metrics["first_ts"]
+        elif idx == "u":
+            metrics["submits_fail"] += 1
+        elif idx == "a":
+            metrics["switches"] += 1
+        metrics["n"] = position + 1
+
+    metrics["churn"] = metrics["inserted"] + metrics["deleted"]
+    typed = max(metrics["inserted"], metrics["pasted_chars"])
+    metrics["paste_ratio"] = round(metrics["pasted_chars"] / typed, 4) if typed else 0.0
+    return metrics
+
+
+def update(responses, chunks, response_id, reset=False):
+    """저장된 metrics 이후의 새 로그만 읽어 갱신. 반환값은 갱신된 metrics (도큐먼트가 없으면 None).
+    reset=True 면 처음부터 다시 계산한다 (로그 전체를 교체한 경우).
+    동시에 들어온 다른 저장이 먼저 갱신했으면 그쪽 결과를 두고 아무것도 하지 않는다 (다음 저장에서 따라잡음)."""
+    document = responses.find_one({"_id": response_id}, {"metrics": 1})
+    if document is None:
+        return None
+    stored = document.get("metrics")
+    current = bool(stored) and stored.get("version") == VERSION and not reset
+    metrics = stored if current else empty()
+
+    # 직전 키 입력부터 읽어야 첫 새 키 입력의 diff 기준(코드)을 알 수 있다
+    start = metrics["n"] if metrics["last_edit"] is None else metrics["last_edit"]
+    entries = logstore.iter_log(responses, chunks, response_id, from_idx=start)
+    if entries is None:
+        return None
+    base = None
+    fresh = []
+    for position, entry in entries:
+        if position < metrics["n"]:
+            if position == metrics["last_edit"] and keylog.is_edit(entry):
+                base = entry["content"]
+            continue
+        fresh.append((position, entry))
+    if not fresh and current:
+        return metrics
+    accumulate(metrics, fresh, base=base)
+
+    if stored is None:
+        guard = {"_id": response_id, "metrics": {"$exists": False}}
+    else:
+        guard = {"_id": response_id, "metrics.n": stored.get("n"), "metrics.version": stored.get("version")}
+    responses.update_one(guard, {"$set": {"metrics": metrics}})
+    return metrics
+
+
+def summary(metrics):
+    """저장된 metrics 에서 이어서 계산하기 위한 상태 필드를 뺀 것 (API 응답용)"""
+    if not metrics:
+        return None
+    return {k: v for k, v in metrics.items() if k not in ("n", "last_edit", "last_edit_ts", "last_len", "version")}
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Compute Responses.metrics for responses that have none or an old version")
+    parser.add_argument("--db", default="ACTIVE", help="env key of the MongoDB URI (ACTIVE, ARCHIVE, ...)")
+    parser.add_argument("--problem-alias", help="only this problem_alias")
+    args = parser.parse_args()
+
+    load_dotenv()
+    uri = os.getenv(args.db)
+    if not uri:
+        parser.error(f"{args.db} is not set in .env")
+    db = MongoClient(uri)['Codelog']
+    responses = db['Responses']
+    chunks = db[logstore.COLLECTION]
+
+    query = {"metrics.version": {"$ne": VERSION}}
+    if args.problem_alias:
+        query["problem_alias"] = args.problem_alias
+    total = responses.count_documents(query)
+    print(f"[metrics] {args.db}: {total} responses to compute")
+    done = 0
+    cursor = responses.find(query, {"_id": 1}, no_cursor_timeout=True)
+    try:
+        for document in cursor:
+            update(responses, chunks, document["_id"])
+            done += 1
+            if done % 100 == 0 or done == total:
+                print(f"[metrics] {done}/{total}")
+    finally:
+        cursor.close()
+
+
+if __name__ == '__main__':
+    main()
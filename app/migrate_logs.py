@@ -0,0 +1,60 @@
+# Responses.log (inline 로그)를 LogChunks 버킷으로 옮기는 스크립트
+#
+#   python migrate_logs.py --db ACTIVE
+#   python migrate_logs.py --db ARCHIVE --batch 100 --dry-run
+#
+# 도큐먼트 단위로 옮긴 뒤 Responses.log 를 지우므로 중간에 멈춰도 다시 실행하면 이어서 진행된다.
+# 운영 중인 DB 에서 돌려도 된다: 옮기는 사이 저장으로 log 가 늘어난 도큐먼트는 다시 읽어서 옮기고,
+# 계속 바뀌는 도큐먼트는 건너뛰었다가 다음 실행에서 옮긴다.
+import argparse
+import os
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+import logstore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move inline Responses.log arrays into the LogChunks collection")
+    parser.add_argument("--db", default="ACTIVE", help="env key of the MongoDB URI (ACTIVE, ARCHIVE, ...)")
+    parser.add_argument("--batch", type=int, default=50, help="documents fetched per round trip")
+    parser.add_argument("--dry-run", action="store_true", help="only count documents to migrate")
+    args = parser.parse_args()
+
+    load_dotenv()
+    uri = os.getenv(args.db)
+    if not uri:
+        parser.error(f"{args.db} is not set in .env")
+    db = MongoClient(uri)['Codelog']
+    responses = db['Responses']
+    chunks = db[logstore.COLLECTION]
+
+    query = {"log": {"$exists": True}}
+    total = responses.count_documents(query)
+    print(f"[migrate_logs] {args.db}: {total} documents with inline logs")
+    if args.dry_run or not total:
+        return
+
+    done = 0
+    skipped = 0
+    entries = 0
+    cursor = responses.find(query, {"log": 1}, batch_size=args.batch, no_cursor_timeout=True)
+    try:
+        for document in cursor:
+            try:
+                entries += logstore.migrate_document(responses, chunks, document)
+            except RuntimeError as e:
+                skipped += 1
+                print(f"[migrate_logs] skipped: {e}")
+                continue
+            done += 1
+            if done % 100 == 0 or done == total:
+                print(f"[migrate_logs] {done}/{total} documents, {entries} log entries moved")
+    finally:
+        cursor.close()
+    print(f"[migrate_logs] done: {done} documents, {entries} log entries, {skipped} skipped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+# ==== MongoClient 레지스트리 ====
+# 프로세스마다 DB 키(ACTIVE, ARCHIVE, DS_URI ...)당 MongoClient 하나만 만든다.
+#   - URI 가 ACTIVE 와 같은 키는 ACTIVE 클라이언트를 같이 쓴다.
+#   - connect=False 로 만들어 첫 쿼리 때 연결하므로 gunicorn --preload 로 import 한 뒤 fork 해도 안전하다.
+#     fork 된 자식에서는 lock 을 새로 만들고 부모가 쓰던 (ACTIVE 외) 클라이언트는 버린 뒤 다시 만든다.
+#   - 키별 옵션은 MONGO_CLIENT_OPTIONS (JSON). "*" 는 모든 키 공통, 키 이름 항목이 그 위에 덮어쓴다.
+#       MONGO_CLIENT_OPTIONS='{"*": {"maxPoolSize": 10}, "ARCHIVE": {"maxPoolSize": 4, "readPreference": "secondaryPreferred"}}'
+#   - ACTIVE 외 클라이언트는 MONGO_CLIENT_IDLE 초 동안 커넥션을 한 번도 쓰지 않으면 닫는다
+#     (관리자가 DB 를 바꿔 가며 볼 때 워커마다 연결이 계속 쌓이지 않도록).
+#   - 커넥션 풀 대기 시간/실패 수를 ConnectionPoolListener 로 모아 stats() 로 보여준다.
+import json
+import os
+import threading
+import time
+
+from pymongo import MongoClient
+from pymongo.monitoring import ConnectionPoolListener
+
+DB_NAME = 'Codelog'
+DEFAULT_KEY = 'ACTIVE'
+DEFAULT_OPTIONS = {
+    "maxPoolSize": 20,
+    "maxIdleTimeMS": 60000,
+    "waitQueueTimeoutMS": 10000,
+    "serverSelectionTimeoutMS": 10000,
+}
+
+
+class PoolStats(ConnectionPoolListener):
+    """클라이언트 하나의 커넥션 풀 통계"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()  # checkout 은 요청한 스레드에서 끝나므로 시작 시각을 스레드별로 둔다
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.in_use = 0
+        self.open = 0
+        self.last_used = time.monotonic()
+
+    def _waited(self):
+        started = getattr(self._local, 'started', None)
+        self._local.started = None
+        return time.monotonic() - started if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.monotonic()
+
+    def connection_checked_out(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.in_use += 1
+            self.last_used = time.monotonic()
+
+    def connection_check_out_failed(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.checkout_failures += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+            self.last_used = time.monotonic()
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open = max(self.open - 1, 0)
+
+    # 나머지 이벤트는 쓰지 않음
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def touch(self):
+        with self._lock:
+            self.last_used = time.monotonic()
+
+    def idle_for(self):
+        with self._lock:
+            return 0.0 if self.in_use else time.monotonic() - self.last_used
+
+    def stats(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'wait_avg_ms': round(1000 * self.wait_total / self.checkouts, 2) if self.checkouts else 0.0,
+                'wait_max_ms': round(1000 * self.wait_max, 2),
+                'in_use': self.in_use,
+                'open': self.open,
+            }
+
+
+def load_options(raw=None):
+    """MONGO_CLIENT_OPTIONS 파싱. 잘못된 JSON 이면 기본값만 쓴다."""
+    raw = os.getenv('MONGO_CLIENT_OPTIONS', '') if raw is None else raw
+    if not raw:
+        return {}
+    try:
+        options = json.loads(raw)
+    except ValueError as e:
+        print(f"[mongo] MONGO_CLIENT_OPTIONS is not valid JSON, ignored: {e}")
+        return {}
+    return options if isinstance(options, dict) else {}
+
+
+class ClientRegistry:
+    def __init__(self, options=None, idle_timeout=600, sweep_every=60):
+        self.options = load_options() if options is None else options
+        self.idle_timeout = idle_timeout
+        self.sweep_every = sweep_every
+        self._lock = threading.Lock()
+        self._clients = {}  # db_key -> (uri, MongoClient, PoolStats)
+        self._last_sweep = time.monotonic()
+        self.evicted = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # 부모의 lock 은 다른 스레드가 잡은 상태로 복사됐을 수 있으므로 새로 만든다.
+        # ACTIVE 는 import 시점에 connect=False 로 만들어져 부모에서 쓰이지 않았으므로 그대로 둔다.
+        self._lock = threading.Lock()
+        self._clients = {k: v for k, v in self._clients.items() if k == DEFAULT_KEY}
+        self._last_sweep = time.monotonic()
+
+    def resolve(self, db_key):
+        """(실제 사용할 키, URI). 설정되지 않은 키나 ACTIVE 와 같은 URI 는 ACTIVE 로."""
+        active = os.getenv(DEFAULT_KEY)
+        uri = os.getenv(db_key) if db_key else None
+        if not uri or uri == active:
+            return DEFAULT_KEY, active
+        return db_key, uri
+
+    def client_options(self, db_key):
+        return {**DEFAULT_OPTIONS, **self.options.get('*', {}), **self.options.get(db_key, {})}
+
+    def client(self, db_key=DEFAULT_KEY):
+        db_key, uri = self.resolve(db_key)
+        self._sweep()
+        with self._lock:
+            entry = self._clients.get(db_key)
+            if entry is None or entry[0] != uri:
+                listener = PoolStats()
+                client = MongoClient(uri, connect=False, event_listeners=[listener], **self.client_options(db_key))
+                entry = self._clients[db_key] = (uri, client, listener)
+            entry[2].touch()  # 받아 간 직후 evict 되지 않도록
+            return entry[1]
+
+    def db(self, db_key=DEFAULT_KEY):
+        return self.client(db_key)[DB_NAME]
+
+    def _sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_every:
+            return
+        self._last_sweep = now
+        self.evict_idle()
+
+    def evict_idle(self):
+        """idle_timeout 동안 커넥션을 쓰지 않은 클라이언트를 닫는다 (ACTIVE 제외)"""
+        idle = []
+        with self._lock:
+            for db_key, (uri, client, listener) in list(self._clients.items()):
+                if db_key != DEFAULT_KEY and listener.idle_for() >= self.idle_timeout:
+                    idle.append(client)
+                    del self._clients[db_key]
+        for client in idle:
+            client.close()
+        self.evicted += len(idle)
+        return len(idle)
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._clients.items())
+        return {
+            'pid': os.getpid(),
+            'evicted': self.evicted,
+            'clients': {
+                db_key: {
+                    **listener.stats(),
+                    'idle_seconds': round(listener.idle_for(), 1),
+                    'max_pool_size': client.options.pool_options.max_pool_size,
+                    'read_preference': client.read_preference.mongos_mode,
+                }
+                for db_key, (uri, client, listener) in entries
+            },
+        }
@@ -0,0 +1,126 @@
+# ==== 비밀번호 해시/검증 ====
+# bcrypt 는 한 번에 수백 ms 의 CPU 를 쓰므로 요청 처리 스레드 대신 별도 프로세스 풀에서 돌린다.
+#   - gunicorn 은 gthread 워커로 띄운다 (gunicorn.conf.py). 로그인 요청 스레드가 bcrypt 결과를 기다리는 동안
+#     같은 워커의 다른 스레드가 답안 저장 같은 요청을 계속 처리한다.
+#   - 한도는 워커 프로세스마다 따로 센다. 서버 전체 한도 PASSWORD_CONCURRENCY(동시에 도는 bcrypt),
+#     PASSWORD_MAX_PENDING(기다리는 것까지 합친 수)을 GUNICORN_WORKERS 로 나눠 워커마다 나눠 가진다.
+#     (워커가 죽어도 다른 워커의 한도가 줄지 않도록 프로세스 간 세마포어는 쓰지 않는다)
+#   - bcrypt 실행 자리는 풀의 작업이 실제로 끝날 때 돌려준다. 기다리다 시간이 지나 요청이 먼저 돌아가도
+#     아직 돌고 있는 bcrypt 는 자리를 차지하고 있으므로 동시 실행 한도가 지켜진다.
+#   - 한도를 넘거나 PASSWORD_TIMEOUT 안에 끝나지 않으면 PasswordBusy (잠시 뒤 다시 시도하도록 안내)
+#   - 저장된 해시의 cost 가 BCRYPT_ROUNDS 와 다르면 로그인 성공 시 새 cost 로 다시 해시한다.
+#   - 방금 검증한 (학번, 이름, 비밀번호) 는 VERIFIED_TTL 초 동안 기억해 다시 bcrypt 를 돌리지 않는다.
+#     캐시 키는 HMAC 이라 메모리에 비밀번호가 남지 않는다.
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from bcrypt import checkpw, gensalt, hashpw
+
+from cache import TTLCache
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+GUNICORN_WORKERS = int(os.getenv('GUNICORN_WORKERS', '4'))
+PASSWORD_CONCURRENCY = int(os.getenv('PASSWORD_CONCURRENCY', '4'))
+PASSWORD_MAX_PENDING = int(os.getenv('PASSWORD_MAX_PENDING', '32'))
+PASSWORD_TIMEOUT = float(os.getenv('PASSWORD_TIMEOUT', '30'))
+VERIFIED = TTLCache(int(os.getenv('VERIFIED_MAXSIZE', '4096')), float(os.getenv('VERIFIED_TTL', '300')))
+_SECRET = (os.getenv('SESSION_KEY') or '').encode() or os.urandom(32)
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _per_worker(total):
+    return max(1, -(-total // GUNICORN_WORKERS))
+
+
+RUNNING_LIMIT = _per_worker(PASSWORD_CONCURRENCY)
+_pending = threading.BoundedSemaphore(_per_worker(PASSWORD_MAX_PENDING))
+_running = threading.BoundedSemaphore(RUNNING_LIMIT)
+
+
+class PasswordBusy(Exception):
+    pass
+
+
+def _hash(password, rounds):
+    return hashpw(password.encode('utf-8'), gensalt(rounds)).decode('utf-8')
+
+
+def _verify(password, hashed, rounds):
+    """(일치 여부, cost 가 달라 새로 만든 해시 또는 None)"""
+    if not checkpw(password.encode('utf-8'), hashed.encode('utf-8')):
+        return False, None
+    if cost(hashed) != rounds:
+        return True, _hash(password, rounds)
+    return True, None
+
+
+def cost(hashed):
+    # "$2b$12$..." -> 12
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def _executor():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # 워커 스레드가 있는 프로세스에서 fork 하지 않도록 spawn 사용
+            _pool = ProcessPoolExecutor(max_workers=RUNNING_LIMIT, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _submit(fn, *args):
+    # 기다리는 요청이 이미 한도만큼 쌓였으면 줄 세우지 않고 바로 돌려보낸다
+    if not _pending.acquire(blocking=False):
+        raise PasswordBusy()
+    try:
+        if not _running.acquire(timeout=PASSWORD_TIMEOUT):
+            raise PasswordBusy()
+        try:
+            future = _executor().submit(fn, *args)
+        except BaseException:
+            _running.release()
+            raise
+        # 기다리기를 그만둬도 bcrypt 가 끝날 때까지는 자리를 돌려주지 않는다
+        future.add_done_callback(lambda _future: _running.release())
+        try:
+            return future.result(timeout=PASSWORD_TIMEOUT)
+        except FutureTimeout:
+            raise PasswordBusy()
+    finally:
+        _pending.release()
+
+
+def hash_password(password):
+    return _submit(_hash, password, BCRYPT_ROUNDS)
+
+
+def _verified_key(studentid, name, password):
+    message = '\0'.join((studentid, name, password)).encode('utf-8')
+    return hmac.new(_SECRET, message, hashlib.sha256).hexdigest()
+
+
+def check_login(studentid, name, password, hashed):
+    """로그인 검증 -> (일치 여부, 저장해야 할 새 해시 또는 None)"""
+    key = _verified_key(studentid, name, password)
+    if VERIFIED.get(key) == hashed:
+        return True, None
+    ok, new_hash = _submit(_verify, password, hashed, BCRYPT_ROUNDS)
+    if ok:
+        VERIFIED.set(key, new_hash or hashed)
+    return ok, new_hash
+
+
+def remember(studentid, name, password, hashed):
+    # 새로 가입한 계정도 바로 다시 로그인할 때 검증을 건너뛰도록
+    VERIFIED.set(_verified_key(studentid, name, password), hashed)
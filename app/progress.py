@@ -0,0 +1,142 @@
+# ==== 학생 × 문제 진행 상황 (Progress) ====
+# 학생(sid, name)의 문제(problem_alias)별 최신 응답 판정을 Responses 와 같은 DB 의 Progress 컬렉션에 한 줄씩 둔다.
+#   {sid, name, problem_alias, response_id, success, updated_at}
+# 판정이 저장될 때마다(save_response, 채점 스레드, 재채점) record() 로 갱신하고,
+# 더 최근 응답(_id 가 큰 것)의 판정이 이미 있으면 덮어쓰지 않는다.
+# 강사용 현황판은 시트들의 문제 목록에 대한 Progress 를 한 번에 읽어 시트 × 학생 상태를 만든다.
+#   danger  : 응답이 없는 문제가 있음
+#   warning : 최신 응답이 틀린("false") 문제가 있음
+#   secondary : 아직 채점 중(pending)인 문제가 있음
+#   success : 나머지
+#
+#   python progress.py --db ACTIVE       # Responses 에서 Progress 다시 만들기 (처음 한 번, 또는 어긋났을 때)
+import argparse
+import os
+from datetime import datetime
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+COLLECTION = 'Progress'
+PENDING = 'pending'  # grading.PENDING (grading 이 이 모듈을 import 하므로 값만 둔다)
+
+
+def record(progress, sid, name, problem_alias, response_id, success):
+    """응답 하나의 판정 반영. 같은 학생·문제에 더 최근 응답이 이미 기록돼 있으면 무시.
+    Progress 는 Responses 에서 다시 만들 수 있으므로(backfill) 실패해도 응답 저장은 실패시키지 않는다."""
+    if not sid or not problem_alias:
+        return
+    key = {"problem_alias": problem_alias, "sid": sid, "name": name}
+    try:
+        progress.update_one(
+            {**key, "response_id": {"$lte": response_id}},
+            {"$set": {"response_id": response_id, "success": success, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # (problem_alias, sid, name) 유일 인덱스: 더 최근 응답의 판정이 이미 있음
+        pass
+    except PyMongoError as e:
+        print(f"[progress] failed to record {sid}/{problem_alias}: {e}")
+
+
+def record_response(responses, document):
+    """Responses 도큐먼트(sid, name, problem_alias, success 포함)로 record"""
+    record(responses.database[COLLECTION], document.get("sid"), document.get("name"),
+           document.get("problem_alias"), document["_id"], document.get("success"))
+
+
+def status(successes, total):
+    """시트 하나의 상태. successes: 응답이 있는 문제들의 최신 success 값 목록"""
+    if len(successes) < total:
+        return "danger"
+    if "false" in successes:
+        return "warning"
+    if PENDING in successes:
+        return "secondary"
+    return "success"
+
+
+def matrix(progress, sheets, sids=None):
+    """sheets: [(시트 alias, 문제 목록)] -> {"aliases": [...], "students": [{sid, name, status: {alias: ...}}]}
+    Progress 는 모든 시트의 문제에 대해 한 번만 조회한다. sids 를 주면 그 학생만 (응답이 없어도 포함)."""
+    problems = sorted({p for _, problem_list in sheets for p in problem_list})
+    query = {"problem_alias": {"$in": problems}}
+    if sids:
+        query["sid"] = {"$in": list(sids)}
+
+    latest = {}  # (sid, name) -> {problem_alias: success}
+    for row in progress.find(query, {"_id": 0, "sid": 1, "name": 1, "problem_alias": 1, "success": 1}):
+        latest.setdefault((row["sid"], row.get("name")), {})[row["problem_alias"]] = row.get("success")
+    for sid in sids or []:
+        if not any(key[0] == sid for key in latest):
+            latest[(sid, None)] = {}
+
+    students = []
+    for (sid, name), answers in sorted(latest.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+        students.append({
+            "sid": sid,
+            "name": name,
+            "status": {
+                alias: status([answers[p] for p in problem_list if p in answers], len(problem_list))
+                for alias, problem_list in sheets
+            },
+        })
+    return {"aliases": [alias for alias, _ in sheets], "students": students}
+
+
+def backfill(responses):
+    """Responses 의 학생·문제별 최신 응답으로 Progress 를 채운다 (서버에서 $merge, 더 최근 기록은 유지)"""
+    responses.aggregate([
+        {"$match": {"sid": {"$exists": True}, "problem_alias": {"$exists": True}}},
+        {"$sort": {"problem_alias": 1, "sid": 1, "name": 1, "_id": -1}},
+        {"$group": {
+            "_id": {"problem_alias": "$problem_alias", "sid": "$sid", "name": "$name"},
+            "response_id": {"$first": "$_id"},
+            "success": {"$first": "$success"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "problem_alias": "$_id.problem_alias",
+            "sid": "$_id.sid",
+            "name": "$_id.name",
+            "response_id": 1,
+            "success": 1,
+            "updated_at": "$$NOW",
+        }},
+        {"$merge": {
+            "into": COLLECTION,
+            "on": ["problem_alias", "sid", "name"],
+            "whenMatched": [{"$replaceWith": {"$cond": [
+                {"$gte": ["$$new.response_id", "$response_id"]},
+                {"$mergeObjects": ["$$ROOT", "$$new"]},
+                "$$ROOT",
+            ]}}],
+            "whenNotMatched": "insert",
+        }},
+    ], allowDiskUse=True)
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    import indexes
+
+    parser = argparse.ArgumentParser(description="Rebuild the Progress collection from Responses")
+    parser.add_argument("--db", default="ACTIVE", help="env key of the MongoDB URI (ACTIVE, ARCHIVE, ...)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    uri = os.getenv(args.db)
+    if not uri:
+        parser.error(f"{args.db} is not set in .env")
+    db = MongoClient(uri)['Codelog']
+    # $merge 의 on 필드에는 유일 인덱스가 있어야 한다
+    for name, error in indexes.ensure(db, [COLLECTION]):
+        print(f"[progress] {args.db}.{name}: {error}")
+    backfill(db['Responses'])
+    print(f"[progress] {args.db}: {db[COLLECTION].estimated_document_count()} student/problem rows")
+
+
+if __name__ == '__main__':
+    main()
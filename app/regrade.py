@@ -0,0 +1,250 @@
+# ==== problem_alias 재채점 ====
+# Problems 의 테스트 케이스를 고친 뒤, 해당 문제의 저장된 응답(success/output)을 다시 채점한다.
+#   - 응답을 _id 순서로 batch 개씩 읽어 lambda-lite /invoke_batch 로 한 번에 보내고(실행기가 병렬 처리)
+#     결과를 bulk_write 로 씀
+#   - 진행 상황(last_id, processed, changed ...)을 RegradeJobs 에 batch 마다 저장하므로 중간에 멈춰도 이어서 실행 가능
+#   - 채점 중에 학생이 다시 저장한 응답은 content 가 달라지므로 덮어쓰지 않는다
+#   - 판정이 바뀐 응답은 Progress(학생·문제별 최신 판정)에도 반영한다
+#   - 실행기 오류(errorMessage, 시간 초과)로 끝난 결과는 판정으로 쓰지 않고 다시 보낸다.
+#     끝까지 실패하면 오류로 세고 기존 판정을 그대로 둔다 (실행기 장애로 맞은 답안이 틀림이 되지 않도록)
+#   - 결과를 받는 동안 LEASE 의 1/4 마다 lease 를 늘려, 느린 batch 를 다른 실행이 가져가 두 번 채점하지 않게 한다
+#
+#   python regrade.py --alias sm3-1                  # ACTIVE 의 Responses
+#   python regrade.py --alias sm3-1 --db ARCHIVE
+#   python regrade.py --resume <job id>
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+import grading
+from progress import record_response as record_progress
+
+COLLECTION = 'RegradeJobs'
+BATCH = 500
+LEASE = 120  # batch 하나를 처리하는 동안 다른 프로세스가 같은 작업을 가져가지 못하게 하는 시간(초)
+RETRIES = 5
+# 코드 자체가 거부된 경우 (다시 보내도 같은 결과이므로 판정으로 쓴다)
+POLICY_ERROR = 'Security policy violation'
+
+
+def create(jobs, problem_alias, db_key):
+    job_id = ObjectId()
+    jobs.insert_one({
+        "_id": job_id,
+        "problem_alias": problem_alias,
+        "db_key": db_key,
+        "state": "queued",
+        "last_id": None,
+        "total": None,
+        "processed": 0,
+        "changed": 0,
+        "errors": 0,
+        "lease_until": 0,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    })
+    return job_id
+
+
+def claim(jobs, job_id):
+    """실행 권한 획득 (다른 곳에서 실행 중이면 None). 끝난 작업도 None."""
+    now = time.time()
+    return jobs.find_one_and_update(
+        {"_id": job_id, "state": {"$in": ["queued", "running", "failed"]}, "lease_until": {"$lt": now}},
+        {"$set": {"state": "running", "lease_until": now + LEASE, "error": None, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def renew(jobs, job_id):
+    jobs.update_one({"_id": job_id}, {"$set": {"lease_until": time.time() + LEASE}})
+
+
+def run(jobs, job_id, responses, grader, batch=BATCH, progress=None):
+    """재채점 실행. grader 는 다음을 가진 객체:
+        client                  -> invoke_batch(jobs) 를 제공하는 실행기 클라이언트
+        payload(content)        -> (/invoke_batch 작업 dict, 케이스별 최종 코드)
+        verdict(result, codes)  -> (success 문자열, output)
+    반환값은 마지막 작업 상태 도큐먼트. 이미 실행 중이거나 끝난 작업이면 None."""
+    job = claim(jobs, job_id)
+    if job is None:
+        return None
+    query = {"problem_alias": job["problem_alias"]}
+    if job["total"] is None:
+        job["total"] = responses.count_documents(query)
+        jobs.update_one({"_id": job_id}, {"$set": {"total": job["total"]}})
+
+    try:
+        while True:
+            page = {**query, "_id": {"$gt": job["last_id"]}} if job["last_id"] else query
+            documents = list(responses.find(page, {"content": 1, "success": 1, "sid": 1, "name": 1, "problem_alias": 1})
+                             .sort("_id", 1).limit(batch))
+            if not documents:
+                break
+            updates, changed_updates, errors = _grade_batch(documents, grader, lambda: renew(jobs, job_id))
+            renew(jobs, job_id)
+            if updates:
+                responses.bulk_write(updates, ordered=False)
+            # 판정이 바뀐 응답은 하나씩 갱신해, content 조건이 맞아 실제로 바뀐 것만 현황판에 반영한다
+            # (그사이 학생이 다시 저장했으면 새 content 의 판정이 따로 기록된다)
+            changed = []
+            for document, success, (condition, update) in changed_updates:
+                if responses.update_one(condition, update).matched_count:
+                    record_progress(responses, {**document, "success": success})
+                    changed.append(document)
+            job["last_id"] = documents[-1]["_id"]
+            job["processed"] += len(documents)
+            job["changed"] += len(changed)
+            job["errors"] += errors
+            jobs.update_one({"_id": job_id}, {"$set": {
+                "last_id": job["last_id"], "processed": job["processed"], "changed": job["changed"],
+                "errors": job["errors"], "lease_until": time.time() + LEASE, "updated_at": datetime.utcnow(),
+            }})
+            if progress:
+                progress(job)
+    except Exception as e:
+        jobs.update_one({"_id": job_id}, {"$set": {"state": "failed", "error": str(e), "lease_until": 0,
+                                                   "updated_at": datetime.utcnow()}})
+        raise
+    jobs.update_one({"_id": job_id}, {"$set": {"state": "done", "lease_until": 0, "updated_at": datetime.utcnow()}})
+    job["state"] = "done"
+    return job
+
+
+def _executor_failed(result):
+    """실행기 쪽 오류(errorMessage, 시간 초과)로 끝나 판정을 믿을 수 없는 결과인지"""
+    for case in result.get("cases") or [result]:
+        if case.get("timeout"):
+            return True
+        message = case.get("errorMessage")
+        if message and not message.startswith(POLICY_ERROR):
+            return True
+    return False
+
+
+def _grade_batch(documents, grader, renew=None):
+    """batch 하나 채점 -> (판정이 그대로인 응답의 UpdateOne 목록,
+    판정이 바뀐 (도큐먼트, 새 success, (조건, 갱신)) 목록, 실행 오류 수).
+    실행기가 결과를 주지 않았거나 실행기 오류로 끝난 응답은 다시 보내고, 그래도 안 되면 오류로 세고 건너뛴다.
+    renew 는 결과를 받는 동안 LEASE/4 초마다 불린다."""
+    pending = {str(document["_id"]): (document, *grader.payload(document.get("content", ""))) for document in documents}
+
+    results = {}
+    renewed = time.monotonic()
+    for attempt in range(RETRIES):
+        missing = [key for key in pending if key not in results]
+        if not missing:
+            break
+        if attempt:
+            print(f"[regrade] {len(missing)} results missing or failed, retrying")
+            time.sleep(2 ** (attempt - 1))
+        try:
+            jobs = [{"id": key, **pending[key][1]} for key in missing]
+            for line in grader.client.invoke_batch(jobs):
+                if not _executor_failed(line["result"]):
+                    results[line["id"]] = line["result"]
+                if renew and time.monotonic() - renewed >= LEASE / 4:
+                    renew()
+                    renewed = time.monotonic()
+        except Exception as e:
+            # 실행기 과부하(429)/연결 오류: 받은 결과는 두고 나머지만 잠시 뒤 다시 보냄
+            if attempt == RETRIES - 1:
+                raise
+            print(f"[regrade] executor error ({e})")
+
+    updates = []
+    changed = []
+    errors = 0
+    for key, (document, _, codes) in pending.items():
+        result = results.get(key)
+        if result is None:
+            errors += 1
+            continue
+        success, output = grader.verdict(result, codes)
+        condition = {"_id": document["_id"], "content": document.get("content", "")}
+        update = {"$set": {"success": success, "output": output}}
+        if success != document.get("success"):
+            changed.append((document, success, (condition, update)))
+        else:
+            updates.append(UpdateOne(condition, update))
+    return updates, changed, errors
+
+
+def start_background(jobs, job_id, responses, grader):
+    """admin 엔드포인트용: 현재 프로세스의 스레드에서 실행"""
+    def target():
+        try:
+            run(jobs, job_id, responses, grader)
+        except Exception as e:
+            print(f"[regrade] job {job_id} failed: {e}")
+    threading.Thread(target=target, name=f'regrade-{job_id}', daemon=True).start()
+
+
+def status(job):
+    job = {k: (str(v) if isinstance(v, ObjectId) else v) for k, v in job.items()}
+    total = job.get("total") or 0
+    job["percent"] = round(100 * job["processed"] / total, 1) if total else (100.0 if job["state"] == "done" else 0.0)
+    return job
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-grade every stored response of a problem_alias")
+    parser.add_argument("--alias", help="problem_alias to re-grade")
+    parser.add_argument("--db", default="ACTIVE", help="env key of the MongoDB URI holding the Responses (ACTIVE, ARCHIVE, ...)")
+    parser.add_argument("--resume", help="RegradeJobs _id of an interrupted job")
+    parser.add_argument("--batch", type=int, default=BATCH, help="responses sent to the executor per batch")
+    args = parser.parse_args()
+    if not args.alias and not args.resume:
+        parser.error("--alias or --resume is required")
+
+    # Flask 앱은 불러오지 않는다 (시작할 때의 인덱스 적용·채점 스레드 없이 DB 와 실행기만 쓴다)
+    from dotenv import load_dotenv
+
+    from executor_client import ExecutorClient
+    from mongo_clients import ClientRegistry
+
+    load_dotenv()
+    mongo = ClientRegistry()
+    jobs = mongo.db()[COLLECTION]
+    if args.resume:
+        job_id = ObjectId(args.resume)
+        job = jobs.find_one({"_id": job_id})
+        if job is None:
+            parser.error(f"no regrade job {args.resume}")
+        alias, db_key = job["problem_alias"], job["db_key"]
+    else:
+        alias, db_key = args.alias, args.db
+        if not os.getenv(db_key):
+            parser.error(f"{db_key} is not set in .env")
+        job_id = None
+    client = ExecutorClient(
+        os.getenv("LAMBDA_BASE_URL"),
+        connect_timeout=float(os.getenv('LAMBDA_CONNECT_TIMEOUT', '2')),
+        read_timeout=float(os.getenv('LAMBDA_READ_TIMEOUT', '15')),
+        retries=int(os.getenv('LAMBDA_CONNECT_RETRIES', '2')),
+    )
+    grader = grading.make_grader(grading.test_data(mongo.db()['Problems'].find_one({"alias": alias})), client)
+    if grader is None:
+        parser.error(f"{alias} has no test data")
+    if job_id is None:
+        job_id = create(jobs, alias, db_key)
+
+    print(f"[regrade] job {job_id}: {alias} on {db_key}")
+    started = time.time()
+    job = run(jobs, job_id, mongo.db(db_key)['Responses'], grader, batch=args.batch,
+              progress=lambda j: print(f"[regrade] {j['processed']}/{j['total']} responses, "
+                                       f"{j['changed']} changed, {j['errors']} errors"))
+    if job is None:
+        print(f"[regrade] job {job_id} is already running or finished")
+        return
+    print(f"[regrade] done in {time.time() - started:.1f}s: {json.dumps(status(job), default=str)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+# ==== 제출 코드 유사도 색인 (MinHash + LSH) ====
+# 문제(problem_alias)별로 비슷한 제출을 찾을 때 모든 응답 쌍의 content 를 비교하지 않도록,
+# 응답마다 MinHash 서명을 만들어 Responses 와 같은 DB 의 Similarity 컬렉션에 둔다.
+#   {response_id, problem_alias, sid, name, digest, shingles, sig: [NUM_PERM 개], bands: ["밴드:해시", ...]}
+# - 토큰화: 주석을 버리고 식별자는 I, 문자열은 S, 숫자는 N 으로 바꾼다 (키워드·내장 함수·연산자는 그대로).
+#   변수 이름만 바꾼 코드도 같은 토큰열이 된다. 토큰 SHINGLE 개씩 묶은 것의 집합을 비교한다.
+# - 서명 NUM_PERM 칸 중 같은 칸의 비율이 Jaccard 유사도 추정치.
+#   서명을 BANDS 개 밴드로 나눠 밴드 해시가 하나라도 같은 응답만 후보로 읽는다 ((problem_alias, bands) 인덱스).
+#   BANDS=16, ROWS=4 면 유사도 0.5 부근부터 후보에 잡히기 시작하고 0.8 이상은 거의 다 잡힌다.
+# - save_response 마다 update() 로 갱신 (content 가 그대로면 다시 계산하지 않음).
+#
+#   python similarity.py --db ACTIVE                        # 색인이 없는 응답을 모두 색인
+#   python similarity.py --db ACTIVE --problem-alias sm3-1 --clusters 0.8
+import argparse
+import hashlib
+import os
+import random
+import re
+import zlib
+from datetime import datetime
+
+from pymongo import DeleteOne, UpdateOne
+
+import keylog
+import logstore
+
+COLLECTION = 'Similarity'
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 5            # 토큰 몇 개를 한 조각으로 볼지
+MIN_TOKENS = 20        # 이보다 짧은 코드(빈 템플릿 등)는 색인하지 않는다
+MAX_CANDIDATES = 2000  # 한 번에 비교하는 후보 상한
+THRESHOLD = 0.8
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20250301)  # 서명이 프로세스·배포와 무관하게 같아야 하므로 시드 고정
+PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+KEYWORDS = {
+    'python': set("""
+        False None True and as assert async await break class continue def del elif else except finally for from
+        global if import in is lambda nonlocal not or pass raise return try while with yield
+        print input int float str len range list dict set tuple map sorted sum min max abs enumerate zip open
+        """.split()),
+    'c': set("""
+        auto break case char const continue default do double else enum extern float for goto if inline int long
+        register return short signed sizeof static struct switch typedef union unsigned void volatile while
+        include define stdio stdlib string math printf scanf puts gets getchar putchar malloc calloc free
+        strlen strcpy strcmp strcat memset memcpy NULL main
+        """.split()),
+}
+_COMMON = r"""
+    |(?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+    |(?P<number>\d[\w.]*)
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<space>\s+)
+    |(?P<op>.)
+"""
+_TOKENS = {
+    'python': re.compile(r"""(?P<comment>\#[^\n]*|\"\"\"[\s\S]*?\"\"\"|'''[\s\S]*?''')""" + _COMMON, re.X),
+    'c': re.compile(r"""(?P<comment>//[^\n]*|/\*[\s\S]*?\*/)""" + _COMMON, re.X),
+}
+
+
+def tokenize(code, lang='python'):
+    """정규화한 토큰 목록. lang 은 Problems.lang ('c' 가 아니면 Python 으로 본다)"""
+    lang = 'c' if lang == 'c' else 'python'
+    keywords = KEYWORDS[lang]
+    tokens = []
+    for match in _TOKENS[lang].finditer(code or ""):
+        kind = match.lastgroup
+        if kind in ('comment', 'space'):
+            continue
+        if kind == 'string':
+            tokens.append('S')
+        elif kind == 'number':
+            tokens.append('N')
+        elif kind == 'name':
+            text = match.group()
+            tokens.append(text if text in keywords else 'I')
+        else:
+            tokens.append(match.group())
+    return tokens
+
+
+def shingles(tokens):
+    """토큰 SHINGLE 개짜리 조각들의 32비트 해시 집합"""
+    if len(tokens) < SHINGLE:
+        grams = [tokens] if tokens else []
+    else:
+        grams = [tokens[i:i + SHINGLE] for i in range(len(tokens) - SHINGLE + 1)]
+    return {zlib.crc32("\x1f".join(gram).encode('utf-8')) for gram in grams}
+
+
+def signature(hashes):
+    return [min((a * x + b) % _PRIME for x in hashes) for a, b in PERMUTATIONS]
+
+
+def band_keys(sig):
+    return [f"{band}:{zlib.crc32(repr(sig[band * ROWS:(band + 1) * ROWS]).encode()):08x}" for band in range(BANDS)]
+
+
+def estimate(sig_a, sig_b):
+    """Jaccard 유사도 추정치 (0 ~ 1)"""
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def containment(sig_a, size_a, sig_b, size_b):
+    """A 의 조각 중 B 에도 있는 비율 추정치. |A∩B| = J/(1+J) * (|A|+|B|)"""
+    similarity = estimate(sig_a, sig_b)
+    if not size_a:
+        return 0.0
+    return min(1.0, similarity / (1 + similarity) * (size_a + size_b) / size_a)
+
+
+def fingerprint(code, lang='python'):
+    """코드 -> (조각 수, 서명). 너무 짧으면 None"""
+    tokens = tokenize(code, lang)
+    if len(tokens) < MIN_TOKENS:
+        return None
+    hashes = shingles(tokens)
+    return len(hashes), signature(hashes)
+
+
+def _digest(code, lang):
+    return hashlib.sha1(f"{lang}\0{code or ''}".encode('utf-8')).hexdigest()
+
+
+def update(index, response_id, problem_alias, sid, name, content, lang='python'):
+    """응답 하나의 색인 갱신. content 가 지난번과 같으면 아무것도 하지 않는다.
+    너무 짧은 코드는 색인에서 뺀다. 반환값은 다시 계산했는지 여부."""
+    digest = _digest(content, lang)
+    if index.find_one({"response_id": response_id, "digest": digest}, {"_id": 1}):
+        return False
+    result = fingerprint(content, lang)
+    if result is None:
+        index.delete_one({"response_id": response_id})
+        return True
+    size, sig = result
+    index.update_one({"response_id": response_id}, {"$set": {
+        "problem_alias": problem_alias, "sid": sid, "name": name, "digest": digest,
+        "shingles": size, "sig": sig, "bands": band_keys(sig), "updated_at": datetime.utcnow(),
+    }}, upsert=True)
+    return True
+
+
+def _match(entry, score, **extra):
+    return {"response_id": str(entry["response_id"]), "sid": entry.get("sid"), "name": entry.get("name"),
+            "similarity": round(score, 4), **extra}
+
+
+def _candidates(index, problem_alias, bands, exclude=None):
+    query = {"problem_alias": problem_alias, "bands": {"$in": bands}}
+    if exclude is not None:
+        query["response_id"] = {"$ne": exclude}
+    return index.find(query, {"_id": 0, "response_id": 1, "sid": 1, "name": 1, "sig": 1, "shingles": 1}) \
+        .limit(MAX_CANDIDATES)
+
+
+def similar(index, response_id, k=10, threshold=0.0):
+    """같은 문제에서 이 응답과 비슷한 다른 학생의 응답 상위 k 개 (LSH 후보만 비교). 색인이 없으면 None"""
+    entry = index.find_one({"response_id": response_id})
+    if entry is None:
+        return None
+    same_student = (entry.get("sid"), entry.get("name"))
+    matches = []
+    for other in _candidates(index, entry["problem_alias"], entry["bands"], exclude=response_id):
+        if (other.get("sid"), other.get("name")) == same_student:
+            continue
+        score = estimate(entry["sig"], other["sig"])
+        if score >= threshold:
+            matches.append(_match(other, score))
+    matches.sort(key=lambda m: -m["similarity"])
+    return matches[:k]
+
+
+def clusters(index, problem_alias, threshold=THRESHOLD):
+    """문제 하나에서 서로 threshold 이상 비슷한 응답 묶음 (크기 순).
+    밴드 해시가 같은 응답들(버킷)은 Mongo 에서 묶고, 버킷 안에서는 이미 만든 묶음의 대표하고만 비교한다."""
+    buckets = index.aggregate([
+        {"$match": {"problem_alias": problem_alias}},
+        {"$unwind": "$bands"},
+        {"$group": {"_id": "$bands", "ids": {"$push": "$response_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True)
+    buckets = [sorted(bucket["ids"]) for bucket in buckets]
+    ids = sorted({response_id for bucket in buckets for response_id in bucket})
+    entries = {e["response_id"]: e for e in index.find({"response_id": {"$in": ids}},
+                                                       {"_id": 0, "response_id": 1, "sid": 1, "name": 1, "sig": 1})}
+    parent = {response_id: response_id for response_id in entries}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for bucket in buckets:
+        leaders = []
+        for response_id in bucket:
+            if response_id not in entries:
+                continue
+            for leader in leaders:
+                if find(leader) == find(response_id) or \
+                        estimate(entries[leader]["sig"], entries[response_id]["sig"]) >= threshold:
+                    parent[find(response_id)] = find(leader)
+                    break
+            else:
+                leaders.append(response_id)
+
+    groups = {}
+    for response_id in entries:
+        groups.setdefault(find(response_id), []).append(response_id)
+    result = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        members.sort()
+        result.append({
+            "size": len(members),
+            "students": len({(entries[m].get("sid"), entries[m].get("name")) for m in members}),
+            "members": [_match(entries[m], estimate(entries[members[0]]["sig"], entries[m]["sig"]))
+                        for m in members],
+        })
+    result.sort(key=lambda c: -c["size"])
+    return result
+
+
+def paste_check(responses, chunks, index, response_id, lang='python', threshold=0.5):
+    """응답의 붙여넣기(idx "v") 항목마다 같은 문제의 다른 학생 응답에 그 내용이 얼마나 들어 있는지.
+    붙여넣은 조각은 제출 전체보다 작아 Jaccard 로는 LSH 후보에 잘 안 걸리므로,
+    문제의 서명 전부(최대 MAX_CANDIDATES 개, content 는 읽지 않음)와 포함 비율을 비교한다."""
+    document = responses.find_one({"_id": response_id}, {"problem_alias": 1, "sid": 1, "name": 1})
+    if document is None:
+        return None
+    entries = logstore.iter_log(responses, chunks, response_id)
+    pastes = [(position, entry) for position, entry in entries or []
+              if entry.get("idx") == "v" and isinstance(entry.get("content"), str)]
+    if not pastes:
+        return []
+    others = [o for o in index.find({"problem_alias": document.get("problem_alias")},
+                                    {"_id": 0, "response_id": 1, "sid": 1, "name": 1, "sig": 1, "shingles": 1})
+              .limit(MAX_CANDIDATES)
+              if (o.get("sid"), o.get("name")) != (document.get("sid"), document.get("name"))]
+
+    result = []
+    for position, entry in pastes:
+        found = fingerprint(entry["content"], lang)
+        if found is None:
+            continue
+        size, sig = found
+        matches = []
+        for other in others:
+            contained = containment(sig, size, other["sig"], other.get("shingles") or 0)
+            if contained >= threshold:
+                matches.append(_match(other, estimate(sig, other["sig"]), containment=round(contained, 4)))
+        matches.sort(key=lambda m: -m["containment"])
+        result.append({"position": position, "timestamp": entry.get("timestamp"),
+                       "chars": keylog.utf16_len(entry["content"]), "matches": matches[:10]})
+    return result
+
+
+def backfill(responses, index, langs, problem_alias=None, progress=None):
+    """색인이 없거나 content 가 바뀐 응답을 색인. langs: {problem_alias: lang}"""
+    query = {"content": {"$type": "string"}}
+    if problem_alias:
+        query["problem_alias"] = problem_alias
+    digests = {e["response_id"]: e.get("digest") for e in index.find(
+        {"problem_alias": problem_alias} if problem_alias else {}, {"_id": 0, "response_id": 1, "digest": 1})}
+    done = changed = 0
+    batch = []
+    cursor = responses.find(query, {"problem_alias": 1, "sid": 1, "name": 1, "content": 1}, no_cursor_timeout=True)
+    try:
+        for document in cursor:
+            done += 1
+            lang = langs.get(document.get("problem_alias"), 'python')
+            digest = _digest(document["content"], lang)
+            if digests.get(document["_id"]) == digest:
+                continue
+            found = fingerprint(document["content"], lang)
+            if found is not None:
+                size, sig = found
+                batch.append(UpdateOne({"response_id": document["_id"]}, {"$set": {
+                    "problem_alias": document.get("problem_alias"), "sid": document.get("sid"),
+                    "name": document.get("name"), "digest": digest, "shingles": size, "sig": sig,
+                    "bands": band_keys(sig), "updated_at": datetime.utcnow(),
+                }}, upsert=True))
+                changed += 1
+            elif document["_id"] in digests:
+                # update() 와 같이: 너무 짧아진 코드는 예전 서명을 지운다
+                batch.append(DeleteOne({"response_id": document["_id"]}))
+                changed += 1
+            if len(batch) >= 500:
+                index.bulk_write(batch, ordered=False)
+                batch = []
+            if progress and done % 1000 == 0:
+                progress(done, changed)
+        if batch:
+            index.bulk_write(batch, ordered=False)
+    finally:
+        cursor.close()
+    return done, changed
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    import indexes
+
+    parser = argparse.ArgumentParser(description="Build the MinHash similarity index for Responses")
+    parser.add_argument("--db", default="ACTIVE", help="env key of the MongoDB URI (ACTIVE, ARCHIVE, ...)")
+    parser.add_argument("--problem-alias", help="only this problem_alias")
+    parser.add_argument("--clusters", type=float, metavar="THRESHOLD",
+                        help="print clusters of --problem-alias above this similarity after indexing")
+    args = parser.parse_args()
+    if args.clusters is not None and not args.problem_alias:
+        parser.error("--clusters needs --problem-alias")
+
+    load_dotenv()
+    uri = os.getenv(args.db)
+    if not uri:
+        parser.error(f"{args.db} is not set in .env")
+    db = MongoClient(uri)['Codelog']
+    for name, error in indexes.ensure(db, [COLLECTION]):
+        print(f"[similarity] {args.db}.{name}: {error}")
+    # 문제 언어는 ACTIVE 의 Problems 기준
+    problems = MongoClient(os.getenv('ACTIVE') or uri)['Codelog']['Problems']
+    langs = {p["alias"]: p.get("lang") for p in problems.find({}, {"_id": 0, "alias": 1, "lang": 1})}
+
+    done, changed = backfill(db['Responses'], db[COLLECTION], langs, args.problem_alias,
+                             progress=lambda d, c: print(f"[similarity] {d} responses read, {c} indexed"))
+    print(f"[similarity] {args.db}: {done} responses read, {changed} indexed")
+    if args.clusters is not None:
+        for cluster in clusters(db[COLLECTION], args.problem_alias, args.clusters):
+            members = ", ".join(f"{m['sid']}({m['similarity']})" for m in cluster["members"])
+            print(f"[similarity] {cluster['size']} responses / {cluster['students']} students: {members}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+# app/ 의 모듈은 패키지가 아니라 app 디렉터리에서 바로 import 하는 구조라 경로를 추가한다
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db():
+    """테스트마다 새로 만들고 지우는 MongoDB 데이터베이스 (TEST_MONGO_URI 가 없으면 건너뜀).
+    logstore 는 find 의 집계 식 projection($isArray 등)을 쓰므로 mongomock 대신 실제 서버로 돌린다."""
+    uri = os.getenv('TEST_MONGO_URI')
+    if not uri:
+        pytest.skip("TEST_MONGO_URI is not set")
+    from pymongo import MongoClient
+
+    client = MongoClient(uri, serverSelectionTimeoutMS=3000)
+    name = f"codelog_test_{uuid.uuid4().hex[:12]}"
+    try:
+        yield client[name]
+    finally:
+        client.drop_database(name)
+        client.close()
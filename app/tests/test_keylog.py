@@ -0,0 +1,131 @@
+import random
+
+import pytest
+
+import keylog
+
+
+def snapshots(contents, start=0):
+    """코드 목록 -> 예전(전체 스냅샷) 형식의 로그 항목"""
+    return [{"idx": start + i, "timestamp": 1000 * (start + i), "time interval": 1000, "content": content}
+            for i, content in enumerate(contents)]
+
+
+def random_edits(seed, steps, alphabet="abc xyz\n"):
+    rng = random.Random(seed)
+    content = ""
+    contents = []
+    for _ in range(steps):
+        pos = rng.randint(0, len(content))
+        if content and rng.random() < 0.3:
+            end = rng.randint(pos, min(len(content), pos + 10))
+            content = content[:pos] + content[end:]
+        else:
+            content = content[:pos] + "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) + content[pos:]
+        contents.append(content)
+    return contents
+
+
+def roundtrip(entries, **kwargs):
+    return list(keylog.decode_log(keylog.encode_log(entries, **kwargs)))
+
+
+def test_empty_log():
+    assert keylog.encode_log([]) == []
+    assert list(keylog.decode_log([])) == []
+    assert keylog.snapshot_at([], 0) is None
+
+
+def test_roundtrip_keeps_every_snapshot_and_char_entries():
+    entries = snapshots(random_edits(1, 300))
+    entries.insert(10, {"idx": "v", "timestamp": 10500, "content": "pasted"})
+    entries.insert(50, {"idx": "o", "timestamp": 49500, "content": "output"})
+    encoded = keylog.encode_log(entries)
+    assert sum("delta" in e for e in encoded) > 250
+    assert list(keylog.decode_log(encoded)) == entries
+
+
+def test_keyframe_every_interval():
+    encoded = keylog.encode_log(snapshots(random_edits(2, 120)), keyframe_interval=50)
+    keyframes = [i for i, e in enumerate(encoded) if "content" in e]
+    assert keyframes == [0, 51, 102]
+
+
+def test_astral_characters_use_utf16_offsets():
+    # JS 문자열 기준: 😀 은 두 코드 단위
+    assert keylog.diff("a😀b", "a😀cb") == [[3, 0, "c"]]
+    assert keylog.apply_delta("a😀b", [[3, 0, "c"]]) == "a😀cb"
+    assert keylog.utf16_len("a😀b") == 4
+
+
+def test_astral_edits_never_split_surrogate_pairs():
+    contents = ["", "😀", "😀😁", "😁", "x😁", "x😂", "x😂y", "𝔘😂y", "𝔘y", "", "한글😀", "한😀"]
+    assert roundtrip(snapshots(contents)) == snapshots(contents)
+    for old, new in zip(contents, contents[1:]):
+        for _pos, _length, ins in keylog.diff(old, new):
+            ins.encode("utf-8")  # 짝 잃은 서로게이트가 있으면 UnicodeEncodeError
+
+
+def test_random_astral_roundtrip():
+    entries = snapshots(random_edits(3, 200, alphabet="a😀b𝔘\n"))
+    assert roundtrip(entries) == entries
+
+
+def test_deletions_across_keyframe_boundaries():
+    # keyframe 직전·직후에 큰 구간을 지우는 편집
+    contents = []
+    content = ""
+    for step in range(40):
+        if step % 5 == 4:
+            content = content[len(content) // 3:]  # 앞부분 삭제
+        elif step % 7 == 6:
+            content = ""
+        else:
+            content += f"line {step}\n"
+        contents.append(content)
+    entries = snapshots(contents)
+    encoded = keylog.encode_log(entries, keyframe_interval=4)
+    assert list(keylog.decode_log(encoded)) == entries
+    for position in range(len(encoded)):
+        assert keylog.snapshot_at(encoded, position) == contents[position]
+
+
+def test_batches_encoded_separately_decode_as_one_log():
+    # save_response 는 증분 저장 때마다 새 항목만 encode_log 하므로 batch 마다 keyframe 으로 시작한다
+    entries = snapshots(random_edits(4, 150))
+    encoded = keylog.encode_log(entries[:37]) + keylog.encode_log(entries[37:90]) + keylog.encode_log(entries[90:])
+    assert "content" in encoded[37] and "content" in encoded[90]
+    assert list(keylog.decode_log(encoded)) == entries
+
+
+def test_decode_from_mid_stream_with_base():
+    # LogChunks 버킷처럼 중간부터 읽을 때는 직전 코드(base)부터 푼다
+    entries = snapshots(random_edits(5, 150))
+    encoded = keylog.encode_log(entries)
+    start = 77
+    assert "delta" in encoded[start]
+    base = keylog.snapshot_at(encoded, start - 1)
+    assert list(keylog.decode_log(encoded[start:], base=base)) == entries[start:]
+
+
+def test_delta_without_keyframe_is_an_error():
+    encoded = keylog.encode_log(snapshots(["a", "ab"]))
+    with pytest.raises(keylog.LogFormatError):
+        list(keylog.decode_log(encoded[1:]))
+
+
+def test_already_encoded_entries_pass_through():
+    entries = snapshots(random_edits(6, 80))
+    encoded = keylog.encode_log(entries)
+    assert keylog.encode_log(encoded) == encoded
+
+
+def test_validate_log():
+    keylog.validate_log(keylog.encode_log(snapshots(["a", "ab"])))
+    with pytest.raises(keylog.LogFormatError):
+        keylog.validate_log([{"idx": 0, "timestamp": 0}])
+    with pytest.raises(keylog.LogFormatError):
+        keylog.validate_log([{"idx": 0, "timestamp": 0, "content": "a"},
+                             {"idx": 1, "timestamp": 1, "delta": [[5, 1, ""]]}])
+    with pytest.raises(keylog.LogFormatError):
+        keylog.validate_log([{"idx": 0, "timestamp": "0", "content": "a"}])
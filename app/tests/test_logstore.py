@@ -0,0 +1,128 @@
+import keylog
+import logstore
+from logstore import BUCKET_SIZE
+
+
+class Racing:
+    """update_one 직전에 한 번 hook 을 실행하는 컬렉션 래퍼 (동시 요청이 끼어드는 상황을 재현)"""
+
+    def __init__(self, collection, hook):
+        self._collection = collection
+        self._hook = hook
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def update_one(self, *args, **kwargs):
+        hook, self._hook = self._hook, None
+        if hook is not None:
+            hook()
+        return self._collection.update_one(*args, **kwargs)
+
+
+def entries_for(contents, start=0):
+    return keylog.encode_log([{"idx": start + i, "timestamp": 1000 * (start + i), "time interval": 1000,
+                               "content": content} for i, content in enumerate(contents)])
+
+
+def contents(n, start=0):
+    return [f"code {i}" for i in range(start, start + n)]
+
+
+def stored(db, response_id):
+    return [e["content"] for e in keylog.decode_log(logstore.load_log(db.Responses, db.LogChunks, response_id))]
+
+
+def test_append_is_idempotent_across_buckets(db):
+    db.Responses.insert_one({"_id": "r", "log_len": 0})
+    first = entries_for(contents(BUCKET_SIZE + 10))
+    assert logstore.append(db.Responses, db.LogChunks, "r", 0, first, {"content": "x"}) == ("ok", BUCKET_SIZE + 10)
+    # 응답을 받지 못한 클라이언트가 같은 요청을 다시 보냄
+    assert logstore.append(db.Responses, db.LogChunks, "r", 0, first, {"content": "x"}) == ("ok", BUCKET_SIZE + 10)
+    assert stored(db, "r") == contents(BUCKET_SIZE + 10)
+    buckets = list(db.LogChunks.find({"response_id": "r"}).sort("b", 1))
+    assert [(b["b"], b["n"]) for b in buckets] == [(0, BUCKET_SIZE), (1, 10)]
+    assert buckets[1]["base"] == f"code {BUCKET_SIZE - 1}"
+
+
+def test_append_overlapping_resend_adds_only_new_entries(db):
+    db.Responses.insert_one({"_id": "r", "log_len": 0})
+    logstore.append(db.Responses, db.LogChunks, "r", 0, entries_for(contents(5)), {})
+    # 5 번째까지는 이미 저장됨 — 3 번째부터 보낸 요청은 뒤의 새 항목만 붙는다
+    batch = entries_for(contents(6, start=3), start=3)
+    assert logstore.append(db.Responses, db.LogChunks, "r", 3, batch, {}) == ("ok", 9)
+    assert stored(db, "r") == contents(9)
+
+
+def test_append_with_gap_is_a_conflict(db):
+    db.Responses.insert_one({"_id": "r", "log_len": 0})
+    logstore.append(db.Responses, db.LogChunks, "r", 0, entries_for(contents(3)), {})
+    assert logstore.append(db.Responses, db.LogChunks, "r", 5, entries_for(["later"]), {}) == ("conflict", 3)
+    assert stored(db, "r") == contents(3)
+
+
+def test_inline_append_retries_after_concurrent_save(db):
+    db.Responses.insert_one({"_id": "r", "log": entries_for(contents(2)), "log_len": 2})
+
+    def concurrent_save():
+        # 다른 요청이 같은 3 번째 항목부터 먼저 저장
+        db.Responses.update_one({"_id": "r"}, {"$push": {"log": {"$each": entries_for(["code 2"])}},
+                                               "$set": {"log_len": 3}})
+
+    responses = Racing(db.Responses, concurrent_save)
+    batch = entries_for(contents(2, start=2))
+    assert logstore.append(responses, db.LogChunks, "r", 2, batch, {}) == ("ok", 4)
+    assert stored(db, "r") == contents(4)
+
+
+def test_append_to_deleted_response_cleans_up_chunks(db):
+    db.Responses.insert_one({"_id": "r", "log_len": 0})
+    logstore.append(db.Responses, db.LogChunks, "r", 0, entries_for(contents(BUCKET_SIZE - 2)), {})
+
+    responses = Racing(db.Responses, lambda: db.Responses.delete_one({"_id": "r"}))
+    batch = entries_for(contents(5, start=BUCKET_SIZE - 2), start=BUCKET_SIZE - 2)
+    assert logstore.append(responses, db.LogChunks, "r", BUCKET_SIZE - 2, batch, {}) == ("missing", BUCKET_SIZE - 2)
+    buckets = list(db.LogChunks.find({"response_id": "r"}))
+    assert [(b["b"], b["n"], len(b["entries"])) for b in buckets] == [(0, BUCKET_SIZE - 2, BUCKET_SIZE - 2)]
+
+
+def test_append_to_missing_response(db):
+    assert logstore.append(db.Responses, db.LogChunks, "none", 0, entries_for(["a"]), {}) == ("missing", 0)
+    assert db.LogChunks.count_documents({}) == 0
+
+
+def test_replace_resets_log_and_keyframes(db):
+    db.Responses.insert_one({"_id": "r", "log_len": 0})
+    logstore.append(db.Responses, db.LogChunks, "r", 0, entries_for(contents(200)), {})
+    assert logstore.snapshot(db.Responses, db.LogChunks, db.LogKeyframes, "r", idx=150)["content"] == "code 150"
+    assert db.LogKeyframes.count_documents({"response_id": "r"}) > 0
+
+    assert logstore.replace(db.Responses, db.LogChunks, "r", entries_for(["new 0", "new 1"]), {"content": "new 1"})
+    assert stored(db, "r") == ["new 0", "new 1"]
+    assert db.LogKeyframes.count_documents({"response_id": "r"}) == 0
+    assert "keyframes_upto" not in db.Responses.find_one({"_id": "r"})
+    assert logstore.snapshot(db.Responses, db.LogChunks, db.LogKeyframes, "r", idx=1)["content"] == "new 1"
+    assert not logstore.replace(db.Responses, db.LogChunks, "none", [], {})
+
+
+def test_iter_log_range_spans_buckets(db):
+    db.Responses.insert_one({"_id": "r", "log_len": 0})
+    logstore.append(db.Responses, db.LogChunks, "r", 0, entries_for(contents(2 * BUCKET_SIZE + 5)), {})
+    got = list(logstore.iter_log(db.Responses, db.LogChunks, "r", from_idx=BUCKET_SIZE - 3, to_idx=BUCKET_SIZE + 4))
+    assert [(p, e["content"]) for p, e in got] == [(p, f"code {p}") for p in range(BUCKET_SIZE - 3, BUCKET_SIZE + 4)]
+    by_time = list(logstore.iter_log(db.Responses, db.LogChunks, "r", from_ts=1000 * 300, to_ts=1000 * 302))
+    assert [p for p, _e in by_time] == [300, 301, 302]
+    assert logstore.iter_log(db.Responses, db.LogChunks, "none") is None
+
+
+def test_migrate_keeps_entries_appended_during_migration(db):
+    db.Responses.insert_one({"_id": "r", "log": entries_for(contents(3))})
+    document = db.Responses.find_one({"_id": "r"})
+
+    def concurrent_save():
+        assert logstore.append(db.Responses, db.LogChunks, "r", 3, entries_for(["code 3"], start=3), {}) == ("ok", 4)
+
+    responses = Racing(db.Responses, concurrent_save)
+    assert logstore.migrate_document(responses, db.LogChunks, document) == 4
+    assert "log" not in db.Responses.find_one({"_id": "r"})
+    assert stored(db, "r") == contents(4)
@@ -1,6 +1,13 @@
 db = db.getSiblingDB('Codelog'); // DB명을 서비스에 맞게 설정
+// 인덱스는 app/indexes.py 한곳에서 정의하고 앱(gunicorn)이 시작할 때 만든다 (python indexes.py 로도 가능)
 db.createCollection('Responses');
 db.createCollection('Students');
 db.createCollection('Sheets');
 db.createCollection('Problems');
+db.createCollection('LogChunks'); // 키 입력 로그 버킷
+db.createCollection('LogKeyframes'); // 재생 탐색용 keyframe 색인
+db.createCollection('Progress'); // 학생·문제별 최신 판정 (현황판)
+db.createCollection('Similarity'); // 코드 유사도 MinHash 색인
+db.createCollection('GradeCache'); // 공유 채점 결과 캐시
+db.createCollection('GradeJobs'); // 비동기 채점 작업 큐
 print("Archive DB: Backup collection initialized.");
\ No newline at end of file
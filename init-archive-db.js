@@ -1,3 +1,8 @@
 db = db.getSiblingDB('Codelog');
+// 인덱스는 app/indexes.py 한곳에서 정의하고 앱(gunicorn)이 시작할 때 만든다 (python indexes.py --db ARCHIVE 로도 가능)
 db.createCollection('Responses'); // 아카이브용 Responses만 존재
+db.createCollection('LogChunks'); // Responses 의 키 입력 로그 버킷
+db.createCollection('LogKeyframes'); // 재생 탐색용 keyframe 색인
+db.createCollection('Progress'); // 학생·문제별 최신 판정 (현황판)
+db.createCollection('Similarity'); // 코드 유사도 MinHash 색인
 print("Archive DB: Backup collection initialized.");
\ No newline at end of file
@@ -1,15 +1,20 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import json
+import asyncio
 
 # ==== 런타임/보안 로직 ====
 import subprocess
 import tempfile
 tempfile.tempdir = "/tmp"   # 임시파일 위치 고정
-from os import unlink
+from os import unlink, getenv, cpu_count, geteuid
+import pwd
 import json as _json
 import re
+from warm_pool import WarmPythonPool
+from compile_cache import CompileCache
+from scheduler import ExecutionScheduler, SchedulerBusy
 
 # FastAPI 앱: 단 한 번만 생성!
 app = FastAPI()
@@ -39,6 +44,39 @@ FORBIDDEN_REGEXES = [
     r'\b(Popen|call|run)\s*\('
 ]
 
+# Python 워커 풀 설정 (PY_POOL_SIZE=0 이면 매 요청마다 python3 를 새로 실행)
+PY_POOL_SIZE = int(getenv("PY_POOL_SIZE", cpu_count() or 1))
+PY_POOL_MAX_RUNS = int(getenv("PY_POOL_MAX_RUNS", 100))
+PY_RUN_TIMEOUT = int(getenv("PY_RUN_TIMEOUT", 5))
+PY_POOL_WAIT = float(getenv("PY_POOL_WAIT", 30))  # 빈 워커를 기다리는 최대 시간(초)
+
+PY_POOL = WarmPythonPool(PY_POOL_SIZE, max_runs=PY_POOL_MAX_RUNS, timeout=PY_RUN_TIMEOUT, wait=PY_POOL_WAIT) if PY_POOL_SIZE > 0 else None
+
+# 실행 스케줄러 설정: 동시 실행 수와 대기열 길이
+LAMBDA_CONCURRENCY = int(getenv("LAMBDA_CONCURRENCY", cpu_count() or 1))
+LAMBDA_MAX_QUEUE = int(getenv("LAMBDA_MAX_QUEUE", LAMBDA_CONCURRENCY * 8))
+SCHEDULER = ExecutionScheduler(LAMBDA_CONCURRENCY, LAMBDA_MAX_QUEUE)
+
+# C 컴파일 캐시 설정
+C_COMPILER = "gcc"
+C_FLAGS = []
+C_CACHE = CompileCache(getenv("C_CACHE_DIR", "/tmp/c-cache"), int(getenv("C_CACHE_MAX_BYTES", 256 * 1024 * 1024)))
+# 컴파일된 학생 프로그램을 실행할 계정. 캐시 디렉터리(서버 계정 소유, 0700)에 쓸 수 없어야 한다.
+# 서버가 root 가 아니면 계정을 바꿀 수 없으므로 그대로 실행한다 (캐시는 sha256 확인으로만 보호).
+C_RUN_USER = getenv("C_RUN_USER", "sandbox")
+
+def _c_run_user():
+    if geteuid() != 0 or not C_RUN_USER:
+        return None
+    try:
+        pwd.getpwnam(C_RUN_USER)
+    except KeyError:
+        print(f"[lambda] C_RUN_USER {C_RUN_USER!r} does not exist; running C programs as root")
+        return None
+    return C_RUN_USER
+
+C_RUN_AS = _c_run_user()
+
 def contains_forbidden_keywords(code):
     lowered = code.lower()
     violations = []
@@ -47,12 +85,16 @@ def contains_forbidden_keywords(code):
             violations.append(f"[regex] matched: {pattern}")
     return violations
 
-def run_with_timeout(command, timeout):
+def run_with_timeout(command, timeout, user=None):
     proc = subprocess.Popen(
         command,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        text=True
+        text=True,
+        user=user,
+        group=user,
+        extra_groups=[] if user else None,
+        cwd="/tmp" if user else None,
     )
     try:
         _stdout, _stderr = proc.communicate(timeout=timeout)
@@ -85,30 +127,42 @@ def lambda_handler(event, context):
             return {'statusCode': 200, 'body': _json.dumps({'stdout': '', 'stderr': f"Forbidden keyword(s) detected: {', '.join(violations)}", 'errorMessage': 'Security policy violation. Please remove these keywords and try again.'})}
 
         if language == 'python':
-            with tempfile.NamedTemporaryFile(suffix=".py", delete=False) as tmp_py_file:
-                tmp_py_file.write(code.encode()); tmp_py_file.flush()
-                exec_result = run_with_timeout(["python3", tmp_py_file.name], timeout=5)
-            unlink(tmp_py_file.name)
+            if PY_POOL:
+                exec_result = PY_POOL.run(code, timeout=PY_RUN_TIMEOUT)
+            else:
+                with tempfile.NamedTemporaryFile(suffix=".py", delete=False) as tmp_py_file:
+                    tmp_py_file.write(code.encode()); tmp_py_file.flush()
+                    exec_result = run_with_timeout(["python3", tmp_py_file.name], timeout=PY_RUN_TIMEOUT)
+                unlink(tmp_py_file.name)
             if exec_result.get('timeout'):
-                exec_result['lambda_error'] = 'Task timed out after 5.00 seconds'
+                exec_result['lambda_error'] = f'Task timed out after {PY_RUN_TIMEOUT:.2f} seconds'
             return {'statusCode': 200, 'body': _json.dumps(exec_result)}
 
         elif language == 'c':
-            with tempfile.NamedTemporaryFile(suffix=".c", delete=False) as tmp_c_file:
-                tmp_c_file.write(code.encode()); tmp_c_file.flush()
-                output_file = tempfile.NamedTemporaryFile(delete=False); output_file.close()
-                compile_result = run_with_timeout(["gcc", tmp_c_file.name, "-o", output_file.name], timeout=10)
+            cache_key = C_CACHE.key(code, [C_COMPILER] + C_FLAGS)
+            binary = C_CACHE.lookup(cache_key)
+            cache_status = 'hit' if binary else 'miss'
+            if not binary:
+                with tempfile.NamedTemporaryFile(suffix=".c", delete=False) as tmp_c_file:
+                    tmp_c_file.write(code.encode()); tmp_c_file.flush()
+                output_path = C_CACHE.reserve()
+                compile_result = run_with_timeout([C_COMPILER, tmp_c_file.name, *C_FLAGS, "-o", output_path], timeout=10)
                 unlink(tmp_c_file.name)
 
-                if compile_result['returncode'] == 0:
-                    exec_result = run_with_timeout([output_file.name], timeout=5)
-                    unlink(output_file.name)
-                    if exec_result.get('timeout'):
-                        exec_result['lambda_error'] = 'Task timed out after 5.00 seconds'
-                    return {'statusCode': 200, 'body': _json.dumps(exec_result)}
-                else:
-                    unlink(output_file.name)
-                    return {'statusCode': 200, 'body': _json.dumps({'stdout': '', 'stderr': compile_result['stderr'], 'returncode': compile_result['returncode']})}
+                if compile_result['returncode'] != 0:
+                    unlink(output_path)
+                    return {'statusCode': 200, 'body': _json.dumps({'stdout': '', 'stderr': compile_result['stderr'], 'returncode': compile_result['returncode'], 'compile_cache': cache_status})}
+                binary = C_CACHE.store(cache_key, output_path)
+
+            # binary 는 이번 실행용 사본 (실행 중 캐시에서 지워져도 상관없음)
+            try:
+                exec_result = run_with_timeout([binary], timeout=5, user=C_RUN_AS)
+            finally:
+                C_CACHE.release(binary)
+            if exec_result.get('timeout'):
+                exec_result['lambda_error'] = 'Task timed out after 5.00 seconds'
+            exec_result['compile_cache'] = cache_status
+            return {'statusCode': 200, 'body': _json.dumps(exec_result)}
 
         else:
             return {'statusCode': 200, 'body': _json.dumps({'stdout': '', 'stderr': '', 'errorMessage': 'Unsupported language.'})}
@@ -116,12 +170,132 @@ def lambda_handler(event, context):
     except Exception as e:
         return {'statusCode': 200, 'body': _json.dumps({'stdout': '', 'stderr': '', 'errorMessage': str(e)})}
 
+# === 여러 테스트 케이스 실행 ===
+def normalize_output(text):
+    # 공백/줄바꿈을 모두 지운 뒤 비교 (Flask 앱의 단일 케이스 채점과 같은 규칙)
+    return re.sub(r'\s+', '', text or '')
+
+def case_passed(result, expected):
+    if result.get('timeout') or result.get('errorMessage'):
+        return False
+    return normalize_output(result.get('stdout')).endswith(normalize_output(expected))
+
+async def run_case(language, case):
+    event = {"body": json.dumps({"code": case.get("code"), "language": language})}
+    try:
+        # 배치를 admit(케이스 수) 로 받아들였으므로 개별 케이스는 대기열 한도 없이 기다린다
+        result = await SCHEDULER.run(lambda_handler, event, None, wait=True)
+        body = json.loads(result.get("body", "{}"))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        body = {'stdout': '', 'stderr': '', 'errorMessage': str(e)}
+    if "expected" in case:
+        body["passed"] = case_passed(body, case["expected"])
+    return body
+
+async def run_cases(payload):
+    """cases 를 스케줄러 슬롯에 나눠 병렬 실행. early_exit 이면 첫 실패에서 남은 케이스를 취소한다."""
+    cases = payload.get("cases") or []
+    language = payload.get("language")
+    early_exit = bool(payload.get("early_exit"))
+    tasks = [asyncio.ensure_future(run_case(language, case)) for case in cases]
+    position = {task: i for i, task in enumerate(tasks)}
+    results = [None] * len(cases)
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            failed = False
+            for task in done:
+                results[position[task]] = task.result()
+                failed = failed or task.result().get("passed") is False
+            if early_exit and failed:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+    for i, result in enumerate(results):
+        if result is None:
+            results[i] = {'stdout': '', 'stderr': '', 'skipped': True}
+    return {
+        "cases": results,
+        "passed": sum(1 for result in results if result.get("passed")),
+        "total": len(results),
+    }
+
+# === 배치 실행 ===
+async def run_job(job):
+    if "cases" in job:
+        return await run_cases(job)
+    return await run_case(job.get("language"), job)
+
+def batch_window():
+    return SCHEDULER.concurrency * 2
+
+def batch_load(jobs):
+    # 작업들이 차지하는 실행 수 (케이스 묶음은 케이스마다 하나)
+    return sum(len(job.get("cases") or []) if "cases" in job else 1 for job in jobs)
+
+async def stream_batch(jobs):
+    """jobs 를 스케줄러에 나눠 실행하고 끝나는 순서대로 NDJSON 한 줄씩 내보낸다.
+    한 번에 concurrency * 2 개까지만 띄워 두어 큰 배치도 대기열/메모리를 차지하지 않는다."""
+    window = batch_window()
+    remaining = iter(enumerate(jobs))
+    running = {}
+
+    def start_next():
+        for i, job in remaining:
+            running[asyncio.ensure_future(run_job(job))] = i
+            return
+
+    try:
+        for _ in range(window):
+            start_next()
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                i = running.pop(task)
+                yield json.dumps({"index": i, "id": jobs[i].get("id"), "result": task.result()}) + "\n"
+                start_next()
+    finally:
+        # 클라이언트가 연결을 끊으면 남은 작업 취소
+        for task in running:
+            task.cancel()
+
+def busy_response():
+    return JSONResponse(
+        content={'stdout': '', 'stderr': '', 'error': 'busy', 'errorMessage': 'Server is busy. Please try again shortly.'},
+        status_code=429,
+        headers={"Retry-After": "1"},
+    )
+
 # === 라우트 ===
+@app.on_event("startup")
+def start_pool():
+    if PY_POOL:
+        PY_POOL.start()
+
+@app.on_event("shutdown")
+def stop_pool():
+    if PY_POOL:
+        PY_POOL.shutdown()
+
 @app.post("/invoke")
 async def invoke(request: Request):
     payload = await request.json()
+    if "cases" in payload:
+        # 테스트 케이스 묶음: {"language", "cases": [{"code", "expected"}], "early_exit"}
+        try:
+            SCHEDULER.admit(len(payload.get("cases") or []))
+        except SchedulerBusy:
+            return busy_response()
+        return JSONResponse(content=await run_cases(payload))
     event = {"body": json.dumps(payload)}
-    result = lambda_handler(event, None)
+    try:
+        result = await SCHEDULER.run(lambda_handler, event, None)
+    except SchedulerBusy:
+        return busy_response()
     status = result.get("statusCode", 200)
     body = result.get("body", "{}")
     try:
@@ -130,6 +304,21 @@ async def invoke(request: Request):
         body_json = {"raw": body}
     return JSONResponse(content=body_json, status_code=status)
 
+@app.post("/invoke_batch")
+async def invoke_batch(request: Request):
+    # {"jobs": [{"id", "code", "language", "expected"?} 또는 {"id", "language", "cases", "early_exit"}]}
+    # 응답: 작업이 끝나는 순서대로 {"index", "id", "result"} NDJSON
+    payload = await request.json()
+    jobs = payload.get("jobs")
+    if not isinstance(jobs, list):
+        return JSONResponse(content={'error': "'jobs' must be a list"}, status_code=400)
+    try:
+        # 한 번에 띄우는 것은 window 개 (케이스 묶음 작업은 그 케이스 수만큼 실행을 차지한다)
+        SCHEDULER.admit(batch_load(jobs[:batch_window()]))
+    except SchedulerBusy:
+        return busy_response()
+    return StreamingResponse(stream_batch(jobs), media_type="application/x-ndjson")
+
 @app.get("/healthz")
 def health():
-    return {"ok": True}
+    return {"ok": True, "compile_cache": C_CACHE.stats(), "scheduler": SCHEDULER.stats()}
@@ -0,0 +1,151 @@
+# ==== C 컴파일 캐시 ====
+# 소스 + 컴파일러 플래그의 해시를 키로 컴파일된 바이너리를 디스크에 보관한다.
+# 같은 코드를 다시 실행하면 gcc 를 건너뛴다. 전체 크기가 max_bytes 를 넘으면
+# 가장 오래 사용하지 않은(mtime 기준) 바이너리부터 지운다.
+# - 캐시 디렉터리는 서버 계정만 쓸 수 있다(0700). 학생 프로그램은 다른 계정(C_RUN_USER)으로 실행한다.
+# - 저장할 때 바이너리의 sha256 을 메모리에 기억해 두고, 꺼낼 때 다시 계산해 다르면 버린다(miss).
+#   기억하지 않은 파일(서버 재시작 전에 만든 것)도 miss 로 본다.
+# - 실행할 바이너리는 실행 전용 디렉터리에 hard link 로 꺼내 준다. 실행 중에 evict 가 캐시 파일을
+#   지워도 꺼낸 파일은 남아 있다. 다 쓰면 release() 로 지운다.
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+
+class CompileCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0    # 저장한 뒤 내용이 바뀌어 버린 수
+        self._digests = {}   # key -> 저장할 때의 sha256
+        self._lock = threading.Lock()
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.chmod(directory, 0o700)
+        # 실행용 사본을 두는 곳 (같은 파일시스템이라 hard link 가능). 실행 계정은 지나가기만 할 수 있다.
+        self.run_directory = directory.rstrip('/') + '-run'
+        os.makedirs(self.run_directory, exist_ok=True)
+        os.chmod(self.run_directory, 0o711)
+
+    def key(self, code, flags):
+        h = hashlib.sha256()
+        h.update('\0'.join(flags).encode())
+        h.update(b'\0\0')
+        h.update(code.encode())
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    @staticmethod
+    def _sha256(path):
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                h.update(block)
+        return h.hexdigest()
+
+    def _link(self, source):
+        """source 를 새 실행 디렉터리에 꺼낸 경로 (source 가 없으면 FileNotFoundError)"""
+        run_dir = tempfile.mkdtemp(dir=self.run_directory)
+        os.chmod(run_dir, 0o711)
+        copy = os.path.join(run_dir, 'a.out')
+        try:
+            try:
+                os.link(source, copy)
+            except FileNotFoundError:
+                raise
+            except OSError:
+                # hard link 를 못 쓰는 파일시스템이면 복사
+                shutil.copy2(source, copy)
+        except BaseException:
+            shutil.rmtree(run_dir, ignore_errors=True)
+            raise
+        return copy
+
+    def lookup(self, key):
+        """캐시된 바이너리의 실행용 사본 경로 (없거나 내용이 바뀌었으면 None). 사용 시각을 갱신한다."""
+        path = self.path(key)
+        with self._lock:
+            expected = self._digests.get(key)
+        copy = None
+        if expected is not None:
+            try:
+                copy = self._link(path)
+                os.utime(path)
+            except FileNotFoundError:
+                # 그 사이 evict 로 지워짐
+                copy = None
+        if copy is not None and self._sha256(copy) != expected:
+            self.release(copy)
+            self._discard(key)
+            copy = None
+            with self._lock:
+                self.rejected += 1
+        with self._lock:
+            if copy is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return copy
+
+    def release(self, copy):
+        shutil.rmtree(os.path.dirname(copy), ignore_errors=True)
+
+    def _discard(self, key):
+        with self._lock:
+            self._digests.pop(key, None)
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def reserve(self):
+        """컴파일 결과를 쓸 임시 경로 (같은 디렉터리라 store 에서 rename 가능)"""
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.build-')
+        os.close(fd)
+        return tmp
+
+    def store(self, key, tmp_path):
+        """컴파일 결과를 캐시에 넣고 실행용 사본 경로를 반환 (사본은 넣기 전에 꺼내므로 evict 와 경합하지 않음)"""
+        path = self.path(key)
+        # 읽기·실행만 (hard link 사본도 같은 inode 라 실행 계정이 고쳐 쓸 수 없다)
+        os.chmod(tmp_path, 0o555)
+        digest = self._sha256(tmp_path)
+        copy = self._link(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._digests[key] = digest
+        self.evict(keep=path)
+        return copy
+
+    def evict(self, keep=None):
+        with self._lock:
+            entries = []
+            total = 0
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.startswith('.') or not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+            entries.sort()
+            for _mtime, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                self._digests.pop(os.path.basename(path), None)
+                total -= size
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'rejected': self.rejected}
@@ -0,0 +1,125 @@
+# 미리 띄워두는 Python 워커 (warm_pool.py 에서 실행)
+#
+# 인터프리터 기동/임포트 비용을 한 번만 치르고, stdin 으로 한 줄짜리 JSON 요청
+# {"code": ..., "timeout": ..., "filename": ...} 을 받을 때마다 fork 한 자식
+# 프로세스에서 코드를 실행한다. 실행 결과 {"stdout", "stderr", "returncode"(, "timeout")}
+# 는 stdout 으로 한 줄 JSON 으로 돌려준다.
+# 자식은 실행 한 번 후 종료하므로 제출 코드끼리 전역 상태를 공유하지 않는다.
+import json
+import linecache
+import os
+import selectors
+import signal
+import sys
+import time
+import traceback
+import types
+
+
+def run_child(code, filename):
+    # 자식 프로세스: 새 __main__ 모듈에서 `python3 <file>` 과 같은 방식으로 실행
+    main = types.ModuleType('__main__')
+    main.__file__ = filename
+    sys.modules['__main__'] = main
+    sys.argv = [filename]
+    linecache.cache[filename] = (len(code), None, code.splitlines(True), filename)
+    returncode = 0
+    try:
+        exec(compile(code, filename, 'exec'), main.__dict__)
+    except SystemExit as e:
+        if e.code is None:
+            returncode = 0
+        elif isinstance(e.code, int):
+            returncode = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            returncode = 1
+    except BaseException as e:
+        # run_child 프레임은 빼고 출력 (python3 file.py 와 같은 모양)
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        returncode = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(returncode & 0xff)
+
+
+def execute(code, timeout, filename):
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.dup2(out_w, 1)
+            os.dup2(err_w, 2)
+            for fd in (devnull, out_r, out_w, err_r, err_w):
+                os.close(fd)
+            sys.stdin = open(0, 'r', closefd=False)
+            sys.stdout = open(1, 'w', closefd=False)
+            sys.stderr = open(2, 'w', closefd=False)
+            run_child(code, filename)
+        finally:
+            os._exit(1)
+
+    os.close(out_w)
+    os.close(err_w)
+    chunks = {out_r: [], err_r: []}
+    sel = selectors.DefaultSelector()
+    sel.register(out_r, selectors.EVENT_READ)
+    sel.register(err_r, selectors.EVENT_READ)
+    deadline = time.monotonic() + timeout
+    timed_out = False
+    open_fds = 2
+    while open_fds:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        for key, _ in sel.select(remaining):
+            data = os.read(key.fd, 65536)
+            if data:
+                chunks[key.fd].append(data)
+            else:
+                sel.unregister(key.fd)
+                open_fds -= 1
+
+    if timed_out:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    _, status = os.waitpid(pid, 0)
+    sel.close()
+    os.close(out_r)
+    os.close(err_r)
+
+    stdout = b''.join(chunks[out_r]).decode('utf-8', errors='replace')
+    stderr = b''.join(chunks[err_r]).decode('utf-8', errors='replace')
+    if timed_out:
+        return {'stdout': '', 'stderr': f'Execution time exceeded {timeout} seconds.\n{stderr}', 'returncode': -1, 'timeout': True}
+    return {'stdout': stdout, 'stderr': stderr, 'returncode': os.waitstatus_to_exitcode(status)}
+
+
+def main():
+    # 프로토콜 채널은 원래 stdin/stdout; 자식에게는 새 파이프를 물려준다
+    proto_in = sys.stdin.buffer
+    proto_out = sys.stdout.buffer
+    for line in proto_in:
+        if not line.strip():
+            continue
+        try:
+            req = json.loads(line)
+            result = execute(req['code'], req.get('timeout', 5), req.get('filename', '/tmp/main.py'))
+        except Exception as e:
+            result = {'stdout': '', 'stderr': f'An error occurred: {str(e)}', 'returncode': -1}
+        proto_out.write(json.dumps(result).encode() + b'\n')
+        proto_out.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# ==== 실행 스케줄러 ====
+# 블로킹 실행(lambda_handler)을 스레드 풀에서 돌려 이벤트 루프를 막지 않는다.
+# 동시 실행 수는 concurrency 로 제한하고, 대기 요청은 도착 순서(FIFO)대로 처리한다.
+# 대기열이 max_queue 를 넘으면 SchedulerBusy 를 던져 즉시 거절한다.
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SchedulerBusy(Exception):
+    pass
+
+
+class ExecutionScheduler:
+    def __init__(self, concurrency, max_queue):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='exec')
+        self._waiters = deque()
+        self._running = 0
+        self.rejected = 0
+
+    # 아래 메서드들은 모두 이벤트 루프 스레드에서만 호출되므로 별도 lock 이 필요 없다
+    async def _acquire(self, wait):
+        if self._running < self.concurrency and not self._waiters:
+            self._running += 1
+            return
+        if not wait and len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerBusy()
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release()  # 넘겨받은 슬롯 반납
+            else:
+                self._waiters.remove(fut)
+            raise
+
+    def _release(self):
+        # 슬롯을 다음 대기자에게 그대로 넘긴다 (running 수는 유지)
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._running -= 1
+
+    def admit(self, n=1):
+        """실행 n 개를 더 받을 자리가 없으면 SchedulerBusy. 여러 개를 wait=True 로 넣기 전에 한 번 확인하는 용도.
+        빈 슬롯에서 바로 시작할 수 있는 것은 대기열을 차지하지 않으므로 빼고 센다."""
+        free = max(self.concurrency - self._running, 0) if not self._waiters else 0
+        if len(self._waiters) + max(n - free, 0) > self.max_queue:
+            self.rejected += 1
+            raise SchedulerBusy()
+
+    async def run(self, fn, *args, wait=False):
+        """fn(*args) 를 워커 스레드에서 실행. wait=True 면 대기열 한도를 무시하고 기다린다."""
+        await self._acquire(wait)
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(self._executor, fn, *args)
+        try:
+            result = await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            # 이미 돌고 있는 실행은 멈출 수 없으니 끝난 뒤에 슬롯을 반납한다
+            fut.add_done_callback(lambda _: self._release())
+            raise
+        except BaseException:
+            self._release()
+            raise
+        self._release()
+        return result
+
+    def stats(self):
+        return {
+            'concurrency': self.concurrency,
+            'running': self._running,
+            'queued': len(self._waiters),
+            'max_queue': self.max_queue,
+            'rejected': self.rejected,
+        }
@@ -0,0 +1,5 @@
+# lambda/ 의 모듈은 패키지가 아니라 lambda 디렉터리에서 바로 import 하는 구조라 경로를 추가한다
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,72 @@
+import os
+import stat
+
+from compile_cache import CompileCache
+
+
+def build(cache, data):
+    tmp = cache.reserve()
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    return tmp
+
+
+def test_store_and_lookup(tmp_path):
+    cache = CompileCache(str(tmp_path / 'cache'), max_bytes=1 << 20)
+    key = cache.key('int main(){}', ['-O2'])
+    assert key != cache.key('int main(){}', ['-O0'])
+    assert cache.lookup(key) is None
+
+    copy = cache.store(key, build(cache, b'binary'))
+    with open(copy, 'rb') as f:
+        assert f.read() == b'binary'
+    cache.release(copy)
+    assert not os.path.exists(copy)
+
+    copy = cache.lookup(key)
+    with open(copy, 'rb') as f:
+        assert f.read() == b'binary'
+    cache.release(copy)
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'rejected': 0}
+
+
+def test_directory_is_private(tmp_path):
+    cache = CompileCache(str(tmp_path / 'cache'), max_bytes=1 << 20)
+    assert stat.S_IMODE(os.stat(cache.directory).st_mode) == 0o700
+
+
+def test_tampered_binary_is_rejected(tmp_path):
+    cache = CompileCache(str(tmp_path / 'cache'), max_bytes=1 << 20)
+    key = cache.key('code', [])
+    cache.release(cache.store(key, build(cache, b'original')))
+    path = cache.path(key)
+    os.chmod(path, 0o755)
+    with open(path, 'wb') as f:
+        f.write(b'replaced')
+    assert cache.lookup(key) is None
+    assert cache.stats()['rejected'] == 1
+    assert not os.path.exists(path)
+
+
+def test_files_from_before_restart_are_misses(tmp_path):
+    directory = str(tmp_path / 'cache')
+    cache = CompileCache(directory, max_bytes=1 << 20)
+    key = cache.key('code', [])
+    cache.release(cache.store(key, build(cache, b'binary')))
+    restarted = CompileCache(directory, max_bytes=1 << 20)
+    assert restarted.lookup(key) is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = CompileCache(str(tmp_path / 'cache'), max_bytes=25)
+    keys = [cache.key(str(i), []) for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.release(cache.store(key, build(cache, b'x' * 10)))
+        os.utime(cache.path(key), (1000 + i, 1000 + i))
+    cache.release(cache.store(keys[2], build(cache, b'x' * 10)))
+    assert not os.path.exists(cache.path(keys[0]))
+    assert cache.lookup(keys[0]) is None
+    for key in keys[1:]:
+        copy = cache.lookup(key)
+        assert copy is not None
+        cache.release(copy)
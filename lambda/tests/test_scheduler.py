@@ -0,0 +1,97 @@
+import asyncio
+import threading
+
+import pytest
+
+from scheduler import ExecutionScheduler, SchedulerBusy
+
+
+async def started(scheduler, gate, name, order, wait=False):
+    def job():
+        order.append(name)
+        gate.wait(5)
+        return name
+    return await scheduler.run(job, wait=wait)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0.01)
+
+
+def test_waiters_run_in_arrival_order():
+    async def main():
+        scheduler = ExecutionScheduler(concurrency=1, max_queue=5)
+        gate = threading.Event()
+        order = []
+        tasks = [asyncio.create_task(started(scheduler, gate, 0, order))]
+        await settle()
+        for i in range(1, 5):
+            tasks.append(asyncio.create_task(started(scheduler, gate, i, order)))
+            await asyncio.sleep(0)
+        await settle()
+        assert scheduler.stats()["queued"] == 4
+        gate.set()
+        assert await asyncio.gather(*tasks) == [0, 1, 2, 3, 4]
+        assert order == [0, 1, 2, 3, 4]
+        assert scheduler.stats()["running"] == 0
+    asyncio.run(main())
+
+
+def test_full_queue_is_rejected_unless_waiting():
+    async def main():
+        scheduler = ExecutionScheduler(concurrency=1, max_queue=1)
+        gate = threading.Event()
+        order = []
+        tasks = [asyncio.create_task(started(scheduler, gate, i, order)) for i in range(2)]
+        await settle()
+        with pytest.raises(SchedulerBusy):
+            await started(scheduler, gate, 2, order)
+        assert scheduler.rejected == 1
+        # wait=True (invoke_batch 의 나머지 항목) 는 한도를 넘어도 기다린다
+        tasks.append(asyncio.create_task(started(scheduler, gate, 3, order, wait=True)))
+        await settle()
+        gate.set()
+        assert await asyncio.gather(*tasks) == [0, 1, 3]
+    asyncio.run(main())
+
+
+def test_admit_counts_free_slots():
+    async def main():
+        scheduler = ExecutionScheduler(concurrency=4, max_queue=2)
+        scheduler.admit(6)
+        with pytest.raises(SchedulerBusy):
+            scheduler.admit(7)
+        gate = threading.Event()
+        order = []
+        tasks = [asyncio.create_task(started(scheduler, gate, i, order)) for i in range(3)]
+        await settle()
+        scheduler.admit(3)
+        with pytest.raises(SchedulerBusy):
+            scheduler.admit(4)
+        gate.set()
+        await asyncio.gather(*tasks)
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def main():
+        scheduler = ExecutionScheduler(concurrency=1, max_queue=1)
+        gate = threading.Event()
+        order = []
+        running = asyncio.create_task(started(scheduler, gate, 0, order))
+        await settle()
+        waiting = asyncio.create_task(started(scheduler, gate, 1, order))
+        await settle()
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert scheduler.stats()["queued"] == 0
+        after = asyncio.create_task(started(scheduler, gate, 2, order))
+        await settle()
+        gate.set()
+        assert await running == 0
+        assert await after == 2
+        assert order == [0, 2]
+        assert scheduler.stats()["running"] == 0
+    asyncio.run(main())
@@ -0,0 +1,146 @@
+# ==== Python 워커 풀 ====
+# pyworker.py 프로세스를 미리 띄워두고 제출 코드를 넘겨준다.
+# 워커는 실행마다 fork 한 자식에서 코드를 돌리므로 제출끼리 격리되며,
+# max_runs 번 사용한 워커는 새 프로세스로 교체(recycle)한다.
+# 새 워커를 띄우지 못하면(fork 실패, EMFILE, 메모리 부족 ...) 빈 자리(None)를 돌려놓고 다음 run 에서 다시 띄운다.
+# 빈 워커를 wait 초 안에 얻지 못하면 오류 결과를 돌려준다 (스케줄러 스레드가 무한정 막히지 않도록).
+import json
+import os
+import queue
+import secrets
+import selectors
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyworker.py')
+
+# 워커가 스스로 timeout 을 처리하지 못했을 때 추가로 기다리는 시간(초)
+WORKER_GRACE = 2
+
+
+class WorkerError(Exception):
+    pass
+
+
+class _Worker:
+    def __init__(self):
+        self.proc = subprocess.Popen(
+            ["python3", WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,  # 워커와 실행 중인 자식을 한 번에 kill 하기 위함
+        )
+        self.runs = 0
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def run(self, code, timeout, filename):
+        request = {'code': code, 'timeout': timeout, 'filename': filename}
+        try:
+            self.proc.stdin.write(json.dumps(request).encode() + b'\n')
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerError(f'worker unavailable: {e}')
+        self.runs += 1
+
+        fd = self.proc.stdout.fileno()
+        deadline = time.monotonic() + timeout + WORKER_GRACE
+        buf = b''
+        with selectors.DefaultSelector() as sel:
+            sel.register(fd, selectors.EVENT_READ)
+            while not buf.endswith(b'\n'):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not sel.select(remaining):
+                    raise WorkerError('worker did not respond')
+                data = os.read(fd, 65536)
+                if not data:
+                    raise WorkerError('worker exited unexpectedly')
+                buf += data
+        return json.loads(buf)
+
+    def close(self):
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.proc.wait()
+        for f in (self.proc.stdin, self.proc.stdout):
+            if f:
+                f.close()
+
+
+class WarmPythonPool:
+    def __init__(self, size, max_runs=100, timeout=5, wait=30):
+        self.size = size
+        self.max_runs = max_runs
+        self.timeout = timeout
+        self.wait = wait
+        self.spawn_failures = 0
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+            self._started = True
+
+    def _spawn(self):
+        """새 워커. 띄우지 못하면 None (빈 자리)"""
+        try:
+            return _Worker()
+        except Exception as e:
+            self.spawn_failures += 1
+            print(f"[warm_pool] failed to start a worker: {e}")
+            return None
+
+    def _release(self, worker, broken=False):
+        # 어떤 경우에도 자리는 돌려놓는다 (교체하다 실패하면 빈 자리)
+        try:
+            if broken or worker.runs >= self.max_runs or not worker.alive():
+                replaced, worker = worker, None
+                replaced.close()
+                worker = self._spawn()
+        finally:
+            self._idle.put(worker)
+
+    def run(self, code, timeout=None):
+        """코드를 워커에서 실행하고 run_with_timeout 과 같은 모양의 dict 를 반환"""
+        self.start()
+        timeout = timeout or self.timeout
+        filename = os.path.join(tempfile.gettempdir(), f'tmp{secrets.token_hex(4)}.py')
+        try:
+            worker = self._idle.get(timeout=self.wait)
+        except queue.Empty:
+            return {'stdout': '', 'stderr': 'An error occurred: no Python worker available', 'returncode': -1}
+        if worker is None:
+            worker = self._spawn()
+            if worker is None:
+                self._idle.put(None)
+                return {'stdout': '', 'stderr': 'An error occurred: could not start a Python worker', 'returncode': -1}
+        try:
+            result = worker.run(code, timeout, filename)
+        except Exception as e:
+            self._release(worker, broken=True)
+            return {'stdout': '', 'stderr': f'An error occurred: {str(e)}', 'returncode': -1}
+        self._release(worker)
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            while True:
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if worker is not None:
+                    worker.close()
+            self._started = False